@@ -1,5 +1,5 @@
-from motor.motor_asyncio import AsyncIOMotorClient
 from config.settings import settings
+from core.database import get_database
 from services.llm_service import LLMService
 from services.embeddings_service import EmbeddingsService
 from services.rag_service import RAGService
@@ -7,14 +7,13 @@ from services.document_service import DocumentService
 from services.storage_service import StorageService
 
 async def get_db():
-    client = AsyncIOMotorClient(settings.MONGO_URI)
-    return client[settings.DB_NAME]
+    return get_database()
 
 def get_llm_service():
     return LLMService(settings.get_models_config())
 
-def get_embeddings_service(embeddings_config=None):
-    return EmbeddingsService(embeddings_config)
+def get_embeddings_service(embeddings_config=None, vector_storage=None):
+    return EmbeddingsService(embeddings_config, vector_storage)
 
 def get_storage_service(s3_config=None):
     return StorageService(s3_config)
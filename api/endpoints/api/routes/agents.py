@@ -1,15 +1,18 @@
 from fastapi import APIRouter, HTTPException, Depends
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List
+import asyncio
 from core.models import RAGAgent
 from ..dependencies import get_db
-from config.settings import Settings
+from config.settings import settings
+from services.chain_cache import chain_cache
+from services.agent_cache import agent_config_cache
+from services.sql_registry import sql_database_registry
+from services.semantic_cache import semantic_cache
+from services.vector_store_registry import vector_store_registry
 
 router = APIRouter()
 
-settings = Settings()
-MODELS_CONFIG = settings.get_models_config()
-
 @router.post("", response_model=RAGAgent)
 async def create_agent(
     agent: RAGAgent,
@@ -55,6 +58,10 @@ async def update_agent(
     if result.modified_count == 0:
         raise HTTPException(status_code=400, detail="Update failed")
     
+    chain_cache.invalidate(agent_id)
+    agent_config_cache.invalidate(agent_id)
+    semantic_cache.invalidate(agent_id)
+    
     updated_agent = await db.agents.find_one({"id": agent_id})
     return RAGAgent(**updated_agent)
 
@@ -76,12 +83,41 @@ async def delete_agent(
     if result.deleted_count == 0:
         raise HTTPException(status_code=400, detail="Delete failed")
     
+    chain_cache.invalidate(agent_id)
+    agent_config_cache.invalidate(agent_id)
+    semantic_cache.invalidate(agent_id)
+    
     # Also delete related data
     await db.metrics.delete_many({"agent_id": agent_id})
     await db.evaluations.delete_many({"agent_id": agent_id})
+    # The documents go too, unless another agent shares the collection
+    collection = (existing_agent.get("config") or {}).get("collection")
+    if collection and not await db.agents.count_documents({"config.collection": collection}):
+        try:
+            await asyncio.to_thread(vector_store_registry.drop_collection, collection)
+        except Exception as e:
+            print(f"Error dropping collection {collection}: {str(e)}")
     
     return {"message": "Agent deleted successfully"}
 
+@router.post("/{agent_id}/sql/schema/refresh")
+async def refresh_sql_schema(
+    agent_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Reloads the cached table/column summary of the agent's SQL database"""
+    rag_config = await agent_config_cache.get_config(db, agent_id)
+    if not rag_config:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    if not rag_config.sql_config:
+        raise HTTPException(status_code=400, detail="Agent has no SQL database configured")
+
+    try:
+        schema = await asyncio.to_thread(sql_database_registry.refresh, rag_config.sql_config)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"tables": len(schema)}
+
 @router.get("/models")
 async def get_models(db: AsyncIOMotorDatabase = Depends(get_db)):
     """Returns available models as a dictionary with model IDs as keys and display names as values"""
@@ -95,7 +131,7 @@ async def get_models(db: AsyncIOMotorDatabase = Depends(get_db)):
     try:
         return {
             model_id: config.get("name", default_models.get(model_id, model_id))
-            for model_id, config in MODELS_CONFIG.items()
+            for model_id, config in settings.get_models_config().items()
         }
     except Exception:
         # Fallback to default models if there's any error
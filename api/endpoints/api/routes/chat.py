@@ -1,6 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Request
 from fastapi.responses import StreamingResponse
-from datetime import datetime
 import time
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorDatabase
@@ -8,8 +7,19 @@ from core.models import ChatRequest, RAGAgent, RAGConfig, ChatRequestWithID
 from services.rag_service import RAGService
 from services.llm_service import LLMService
 from services.embeddings_service import EmbeddingsService
+from services.chain_cache import chain_cache
+from services.agent_cache import agent_config_cache
+from services.semantic_cache import semantic_cache
+from services.chat_stream import ChatStream, StreamCallbackHandler, STREAM_MODES
+from services.history_manager import history_manager
+from services.chat_store import chat_store
+from services.metrics_aggregator import metrics_aggregator
+from services.request_coalescer import request_coalescer, request_key
+from services.llm_scheduler import llm_scheduler, AdmissionRejected, PRIORITY_CHAT
+from services.instrumentation import StageMetricsCallbackHandler, observe_stage, count_request
+from config.settings import settings
 from ..dependencies import get_db, get_llm_service, get_embeddings_service, get_rag_service
-from langchain_core.messages import AIMessage, HumanMessage
+from typing import Dict, List, Optional
 
 router = APIRouter()
 
@@ -18,49 +28,212 @@ async def chat(
     agent_id: str,
     request: ChatRequest,
     background_tasks: BackgroundTasks,
+    http_request: Request = None,
+    stream: str = "text",
     db: AsyncIOMotorDatabase = Depends(get_db),
     llm_service: LLMService = Depends(get_llm_service)
 ):
+    """
+    Streams the agent's answer. stream=text (default) writes plain answer text;
+    stream=sse or stream=ndjson (or Accept: text/event-stream) writes typed
+    retrieval, first_token, token and done events.
+    """
+    # Only here: chatwithid stores the plain text it streams
+    if http_request is not None and "text/event-stream" in http_request.headers.get("accept", ""):
+        stream = "sse"
+    return await stream_chat(
+        agent_id,
+        [message.model_dump() for message in request.messages],
+        background_tasks,
+        http_request,
+        stream,
+        db,
+        llm_service
+    )
+
+async def stream_chat(
+    agent_id: str,
+    messages: List[Dict[str, str]],
+    background_tasks: BackgroundTasks,
+    http_request: Optional[Request],
+    stream: str,
+    db: AsyncIOMotorDatabase,
+    llm_service: LLMService,
+    history_summary: Optional[str] = None
+):
+    """
+    Answers the last message of messages. Earlier messages are fitted into the
+    agent's history token budget, with history_summary standing in for turns
+    that were already folded away.
+    """
     start_time = time.time()
-    agent = await db.agents.find_one({"id": agent_id})
-    if not agent:
+    if stream not in STREAM_MODES:
+        raise HTTPException(status_code=400, detail=f"stream must be one of {', '.join(STREAM_MODES)}")
+
+    lookup_start = time.perf_counter()
+    rag_config = await agent_config_cache.get_config(db, agent_id)
+    if not rag_config:
         raise HTTPException(status_code=404, detail="Agent not found")
+    chain_type = RAGService.resolve_chain_type(rag_config)
+    observe_stage(agent_id, chain_type, "mongo", time.perf_counter() - lookup_start)
 
     try:
         # Initialize services with agent configuration
-        rag_config = RAGConfig(**agent["config"])
-        embeddings_service = get_embeddings_service(rag_config.advancedEmbeddingsConfig)
+        build_start = time.perf_counter()
+        embeddings_service = get_embeddings_service(rag_config.advancedEmbeddingsConfig, rag_config.vector_storage)
         rag_service = get_rag_service(llm_service, embeddings_service)
-        rag_chain = rag_service.get_chain(rag_config)
+        rag_chain = chain_cache.get_or_build(
+            agent_id, rag_config, lambda: rag_service.get_chain(rag_config)
+        )
+        observe_stage(agent_id, chain_type, "chain_build", time.perf_counter() - build_start)
 
-        chat_history = [
-            HumanMessage(content=msg.content) if msg.role == "user" 
-            else AIMessage(content=msg.content)
-            for msg in request.messages[:-1]
-        ]
+        chat_history = history_manager.build(messages[:-1], rag_config, history_summary)
         
+        question = messages[-1]["content"]
+
+        # Without history the question is already standalone, so near-duplicate
+        # first messages can be answered from the semantic cache. Answers are
+        # only stored after a lookup, so SQL agents are neither read nor written
+        cached_answer = None
+        question_vector = None
+        if settings.SEMANTIC_CACHE_ENABLED and not chat_history and semantic_cache.applies_to(rag_config):
+            try:
+                cached_answer, question_vector = await semantic_cache.lookup(
+                    agent_id, rag_config, embeddings_service.get_embeddings(), question
+                )
+            except Exception as e:
+                print(f"Error looking up semantic cache: {str(e)}")
+
+        key = request_key(agent_id, rag_config, messages, history_summary)
+        endpoint, endpoint_limit = llm_service.get_endpoint(rag_config)
         metrics_queue = asyncio.Queue()
         
-        async def generate_response():
+        chat_stream = ChatStream(stream, settings.CHAT_STREAM_FLUSH_MS / 1000)
+        ticket = None
+        async def produce(publish):
+            # Runs once per flight, holding the leader's LLM slot; every
+            # coalesced request reads its events
+            callback_handler = StreamCallbackHandler()
+            stage_handler = StageMetricsCallbackHandler(agent_id, chain_type)
+            answer_parts = []
+            chunks = rag_chain.astream(
+                {"input": question, "chat_history": chat_history},
+                config={"callbacks": [callback_handler, stage_handler], "metadata": {"agent_id": agent_id}}
+            )
             try:
-                is_first_token = True
-                async for chunk in rag_chain.astream({
-                    "input": request.messages[-1].content,
-                    "chat_history": chat_history
-                }):
-                    if is_first_token:
-                        await metrics_queue.put(time.time())
-                        is_first_token = False
+                async for chunk in chunks:
+                    documents = callback_handler.take_documents()
+                    if documents is not None:
+                        publish("retrieval", list(documents))
                     if isinstance(chunk, dict):
                         answer = chunk.get("answer", "")
                     else:
                         answer = str(chunk)
-                    yield answer
-                
-                await metrics_queue.put(None)
-            except Exception as e:
+                    if answer:
+                        answer_parts.append(answer)
+                        publish("answer", answer)
+            finally:
+                await chunks.aclose()
+                ticket.release()
+            publish("usage", callback_handler.usage)
+
+            if question_vector is not None:
+                semantic_cache.store(
+                    agent_id, rag_config, question, question_vector,
+                    "".join(answer_parts), time.time() - start_time
+                )
+
+        # Cached answers need no LLM slot. Everyone else joins the flight before
+        # the response starts, so rejections are still a 429/503: a request that
+        # would lead is admitted first, and joining right after the in_flight
+        # check leaves no await in which that flight could end
+        events = None
+        coalesced = False
+        if not cached_answer:
+            if not request_coalescer.in_flight(key):
+                try:
+                    ticket = await llm_scheduler.acquire(
+                        endpoint, agent_id, PRIORITY_CHAT, endpoint_limit=endpoint_limit
+                    )
+                except AdmissionRejected as e:
+                    count_request(agent_id, chain_type, "rejected")
+                    raise HTTPException(
+                        status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)}
+                    )
+            # produce frees the slot as soon as the answer is done; the flight
+            # frees it too in case it is cancelled before produce runs
+            events, leader = request_coalescer.join(key, produce, ticket.release if ticket else None)
+            coalesced = not leader
+            # A flight for the same key may have started while this one queued
+            if coalesced and ticket is not None:
+                ticket.release()
+
+        async def leave_unstreamed_flight():
+            # Stops the generation if the response was never streamed
+            if events is not None:
+                await events.aclose()
+
+        async def generate_response():
+            first_token_time = None
+            retrieval_time = None
+            cancelled = False
+            usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+            status = "error"
+            try:
+                if cached_answer:
+                    first_token_time = time.time()
+                    await metrics_queue.put(first_token_time)
+                    for output in chat_stream.first_token(first_token_time - start_time):
+                        yield output
+                    for output in chat_stream.token(cached_answer.answer) + chat_stream.flush():
+                        yield output
+                else:
+                    async for kind, payload in events:
+                        if http_request is not None and await http_request.is_disconnected():
+                            cancelled = True
+                            break
+                        if kind == "retrieval":
+                            retrieval_time = time.time()
+                            for output in chat_stream.retrieval(payload):
+                                yield output
+                        elif kind == "usage":
+                            usage = payload
+                        else:
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                                await metrics_queue.put(first_token_time)
+                                for output in chat_stream.first_token(first_token_time - start_time):
+                                    yield output
+                            for output in chat_stream.token(payload):
+                                yield output
+
+                if not cancelled:
+                    end_time = time.time()
+                    status = "cached" if cached_answer else "coalesced" if coalesced else "ok"
+                    for output in chat_stream.done({
+                        "cached": cached_answer is not None,
+                        "coalesced": coalesced,
+                        "usage": usage,
+                        "timing": {
+                            "retrieval": retrieval_time - start_time if retrieval_time else None,
+                            "first_token": first_token_time - start_time if first_token_time else None,
+                            "total": end_time - start_time
+                        }
+                    }):
+                        yield output
+                else:
+                    status = "cancelled"
+            finally:
+                # Leaving the flight cancels the generation once no client is listening
+                if events is not None:
+                    await events.aclose()
+                if first_token_time is not None:
+                    observe_stage(agent_id, chain_type, "first_token", first_token_time - start_time)
+                observe_stage(agent_id, chain_type, "total", time.time() - start_time)
+                count_request(agent_id, chain_type, status)
+                if coalesced:
+                    metrics_aggregator.increment(agent_id, "coalesced_requests")
                 await metrics_queue.put(None)
-                raise e
 
         async def update_metrics():
             try:
@@ -68,69 +241,31 @@ async def chat(
                 if first_token_time is not None:
                     await metrics_queue.get()
                     end_time = time.time()
-                    
-                    current_date = datetime.utcnow().replace(
-                        hour=0, minute=0, second=0, microsecond=0
-                    )
-                    
-                    first_token_latency = first_token_time - start_time
                     total_response_time = end_time - start_time
+                    metrics_aggregator.record_call(
+                        agent_id,
+                        first_token_latency=first_token_time - start_time,
+                        total_response_time=total_response_time
+                    )
 
-                    current_metrics = await db.metrics.find_one({
-                        "agent_id": agent_id,
-                        "date": current_date
-                    })
-
-                    if current_metrics:
-                        current_calls = current_metrics.get("calls", 0)
-                        current_ftl_avg = current_metrics.get("first_token_latency", 0)
-                        current_trt_avg = current_metrics.get("total_response_time", 0)
-                        
-                        new_calls = current_calls + 1
-                        new_ftl_avg = ((current_ftl_avg * current_calls) + first_token_latency) / new_calls
-                        new_trt_avg = ((current_trt_avg * current_calls) + total_response_time) / new_calls
-
-                        await db.metrics.update_one(
-                            {
-                                "agent_id": agent_id,
-                                "date": current_date
-                            },
-                            {
-                                "$set": {
-                                    "calls": new_calls,
-                                    "first_token_latency": new_ftl_avg,
-                                    "total_response_time": new_trt_avg
-                                }
-                            }
-                        )
-                    else:
-                        await db.metrics.insert_one({
-                            "agent_id": agent_id,
-                            "date": current_date,
-                            "calls": 1,
-                            "first_token_latency": first_token_latency,
-                            "total_response_time": total_response_time
-                        })
+                    if question_vector is not None:
+                        metrics_aggregator.increment(agent_id, "semantic_cache.lookups")
+                        if cached_answer:
+                            saved_latency = max(cached_answer.generation_time - total_response_time, 0.0)
+                            semantic_cache.record_saved_latency(saved_latency)
+                            metrics_aggregator.increment(agent_id, "semantic_cache.hits")
+                            metrics_aggregator.increment(agent_id, "semantic_cache.saved_latency", saved_latency)
                 else:
-                    current_date = datetime.utcnow().replace(
-                        hour=0, minute=0, second=0, microsecond=0
-                    )
-                    await db.metrics.update_one(
-                        {
-                            "agent_id": agent_id,
-                            "date": current_date
-                        },
-                        {
-                            "$inc": {"calls": 1}
-                        },
-                        upsert=True
-                    )
+                    metrics_aggregator.record_call(agent_id)
             except Exception as e:
                 print(f"Error updating metrics: {str(e)}")
 
+        background_tasks.add_task(leave_unstreamed_flight)
         background_tasks.add_task(update_metrics)
-        return StreamingResponse(generate_response(), media_type="text/plain")
+        return StreamingResponse(generate_response(), media_type=chat_stream.media_type)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -140,41 +275,44 @@ async def chatwithid(
     agent_id: str,
     request: ChatRequestWithID,
     background_tasks: BackgroundTasks,
+    http_request: Request,
     db: AsyncIOMotorDatabase = Depends(get_db),
     llm_service: LLMService = Depends(get_llm_service)
 ):
-    # Check for existing messages
-    existing_chat = await db.chats.find_one({"uid": uid})
-    
-    if existing_chat:
-        messages = existing_chat.get("messages", [])
+    # Only the turns not yet folded into the summary are loaded
+    session = await chat_store.get_session(db, uid)
+    if session:
+        summary = session.get("summary")
+        summarized_count = session.get("summarized_count", 0)
+        messages = await chat_store.get_messages(db, session, skip=summarized_count)
     else:
+        summary = None
+        summarized_count = 0
         messages = []
     
     # Add the new message to the list
     new_message = {"role": "user", "content": request.message}
     messages.append(new_message)
     
-    # Create a ChatRequest object with all messages
-    chat_request = ChatRequest(messages=messages)
-    
     # Create a queue to capture the AI response
     response_queue = asyncio.Queue()
     
     async def capture_response(response_stream):
-        full_response = ""
+        response_parts = []
         async for chunk in response_stream:
-            full_response += chunk
+            response_parts.append(chunk)
             yield chunk
-        await response_queue.put(full_response)
-
-    # Get streaming response from the original chat endpoint
-    stream_response = await chat(
-        agent_id=agent_id,
-        request=chat_request,
-        background_tasks=background_tasks,
-        db=db,
-        llm_service=llm_service
+        await response_queue.put("".join(response_parts))
+
+    stream_response = await stream_chat(
+        agent_id,
+        messages,
+        background_tasks,
+        http_request,
+        "text",
+        db,
+        llm_service,
+        history_summary=summary
     )
     
     # Define background task to update chat history
@@ -183,19 +321,38 @@ async def chatwithid(
         ai_message = {"role": "assistant", "content": ai_response}
         messages.append(ai_message)
         
-        # Update or insert the chat history
-        await db.chats.update_one(
-            {"uid": uid},
-            {
-                "$set": {
-                    "uid": uid,
-                    "agent_id": agent_id,
-                    "messages": messages,
-                    "last_updated": datetime.utcnow()
+        # Append only the new turn to the session
+        await chat_store.append(db, uid, agent_id, [new_message, ai_message])
+        await update_summary()
+
+    async def update_summary():
+        # Folds turns that no longer fit the budget into the rolling summary,
+        # after the reply has been sent so the chat never waits on it
+        try:
+            rag_config = await agent_config_cache.get_config(db, agent_id)
+            if not rag_config:
+                return
+            overflow, _ = history_manager.split(
+                messages, history_manager.budget_for(rag_config), summary
+            )
+            if overflow == 0:
+                return
+            new_summary = await history_manager.fold(
+                llm_service.get_llm(rag_config), summary, messages[:overflow]
+            )
+            # Guard against a concurrent turn that already moved the summary on;
+            # before the first fold the field is 0 or missing ($in matches both)
+            await db.chats.update_one(
+                {"uid": uid, "summarized_count": summarized_count or {"$in": [0, None]}},
+                {
+                    "$set": {
+                        "summary": new_summary,
+                        "summarized_count": summarized_count + overflow
+                    }
                 }
-            },
-            upsert=True
-        )
+            )
+        except Exception as e:
+            print(f"Error updating chat summary: {str(e)}")
     
     # Add the update task to background tasks
     background_tasks.add_task(update_chat_history)
@@ -205,4 +362,30 @@ async def chatwithid(
         capture_response(stream_response.body_iterator),
         media_type="text/plain"
     )
-    
\ No newline at end of file
+
+
+@router.get("/agents/{agent_id}/chat/{uid}/messages")
+async def get_chat_messages(
+    uid: str,
+    agent_id: str,
+    skip: int = 0,
+    limit: int = 50,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Returns a page of a chat session's messages, oldest first"""
+    if skip < 0 or limit < 1:
+        raise HTTPException(status_code=400, detail="skip must be >= 0 and limit >= 1")
+    session = await chat_store.get_session(db, uid)
+    if not session or session.get("agent_id") != agent_id:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    if "messages" in session:
+        await chat_store.migrate_legacy(db, uid)
+        session = await chat_store.get_session(db, uid)
+    messages = await chat_store.get_messages(db, session, skip=skip, limit=limit)
+    return {
+        "uid": uid,
+        "total": session.get("message_count", 0),
+        "skip": skip,
+        "limit": limit,
+        "messages": messages
+    }
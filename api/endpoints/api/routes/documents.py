@@ -10,6 +10,7 @@ from services.storage_service import StorageService
 from services.embeddings_service import EmbeddingsService
 from ..dependencies import get_db, get_document_service, get_embeddings_service, get_storage_service
 from config.settings import settings
+from services.semantic_cache import semantic_cache
 import aiofiles
 
 router = APIRouter()
@@ -18,8 +19,7 @@ router = APIRouter()
 async def add_document(
     agent_id: str,
     file: UploadFile,
-    db: AsyncIOMotorDatabase = Depends(get_db),
-    embeddings_service: EmbeddingsService = Depends(get_embeddings_service)
+    db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     agent = await db.agents.find_one({"id": agent_id})
     if not agent:
@@ -44,7 +44,10 @@ async def add_document(
         "created_at": datetime.utcnow()
     })
 
-    storage_service = get_storage_service()
+    # Initialize services with agent configuration
+    rag_config = RAGConfig(**agent["config"])
+    embeddings_service = get_embeddings_service(rag_config.advancedEmbeddingsConfig, rag_config.vector_storage)
+    storage_service = get_storage_service(rag_config.s3_config)
     document_service = get_document_service(embeddings_service, storage_service)
     
     try:
@@ -56,6 +59,7 @@ async def add_document(
         
         # Clean up the temporary file
         os.remove(file_path)
+        semantic_cache.invalidate(agent_id)
         
         await db.jobs.update_one(
             {"_id": job_id},
@@ -128,7 +132,7 @@ async def bulk_add_documents(
 
     # Initialize services with agent configuration
     rag_config = RAGConfig(**agent["config"])
-    embeddings_service = get_embeddings_service(rag_config.advancedEmbeddingsConfig)
+    embeddings_service = get_embeddings_service(rag_config.advancedEmbeddingsConfig, rag_config.vector_storage)
     storage_service = get_storage_service(rag_config.s3_config)
     document_service = get_document_service(embeddings_service, storage_service)
 
@@ -145,6 +149,7 @@ async def bulk_add_documents(
                     # Clean up the temporary file
                     if os.path.exists(file_info["path"]):
                         os.remove(file_info["path"])
+                    semantic_cache.invalidate(agent_id)
 
                     # Update progress
                     await db.jobs.update_one(
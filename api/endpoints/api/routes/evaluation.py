@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, UploadFile
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, UploadFile, Form
 from fastapi.responses import StreamingResponse
 from datetime import datetime
 import time
@@ -11,6 +11,12 @@ from core.models import ChatRequest, RAGConfig, LLMConfig
 from services.rag_service import RAGService
 from services.llm_service import LLMService
 from services.embeddings_service import EmbeddingsService
+from services.chain_cache import chain_cache
+from services.agent_cache import agent_config_cache
+from services.chat_store import chat_store
+from services.instrumentation import StageMetricsCallbackHandler
+from services.llm_scheduler import llm_scheduler, PRIORITY_EVALUATION
+from services.retrieval_tuner import profile_grid, evaluate_profile, recommend, SWEPT_PARAMETERS, MAX_PROFILES
 from ..dependencies import get_db, get_llm_service, get_embeddings_service, get_rag_service
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate
@@ -18,6 +24,7 @@ from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict
 from config.settings import settings 
+from core.database import get_database
 import os
 
 class UserResponse(BaseModel):
@@ -56,15 +63,16 @@ async def get_bot_response(message: str, chat_history: List[Dict[str, str]], age
             for msg in chat_history
         ] + [Message(role="user", content=message)])
         
-        agent = await get_db().agents.find_one({"id": agent_id})
-        if not agent:
+        rag_config = await agent_config_cache.get_config(get_database(), agent_id)
+        if not rag_config:
             raise HTTPException(status_code=404, detail="Agent not found")
 
         # Initialize services with agent configuration
-        rag_config = RAGConfig(**agent["config"])
-        embeddings_service = get_embeddings_service(rag_config.advancedEmbeddingsConfig)
+        embeddings_service = get_embeddings_service(rag_config.advancedEmbeddingsConfig, rag_config.vector_storage)
         rag_service = get_rag_service(get_llm_service(), embeddings_service)
-        rag_chain = rag_service.get_chain(rag_config)
+        rag_chain = chain_cache.get_or_build(
+            agent_id, rag_config, lambda: rag_service.get_chain(rag_config)
+        )
 
         chat_history_messages = [
             HumanMessage(content=msg["content"]) if msg["role"] == "user"
@@ -73,26 +81,28 @@ async def get_bot_response(message: str, chat_history: List[Dict[str, str]], age
         ]
 
         # Generate response using RAG chain
-        response = await rag_chain.ainvoke({
-            "input": message,
-            "chat_history": chat_history_messages
-        })
+        stage_handler = StageMetricsCallbackHandler(agent_id, RAGService.resolve_chain_type(rag_config))
+        # Evaluation turns queue behind interactive chat for the same LLM slots
+        endpoint, endpoint_limit = get_llm_service().get_endpoint(rag_config)
+        ticket = await llm_scheduler.acquire(
+            endpoint,
+            agent_id,
+            PRIORITY_EVALUATION,
+            timeout=settings.LLM_EVALUATION_QUEUE_TIMEOUT_SECONDS,
+            endpoint_limit=endpoint_limit
+        )
+        try:
+            response = await rag_chain.ainvoke({
+                "input": message,
+                "chat_history": chat_history_messages
+            }, config={"callbacks": [stage_handler], "metadata": {"agent_id": agent_id}})
+        finally:
+            ticket.release()
 
         # Store the conversation in the database
         ai_message = {"role": "assistant", "content": response["answer"]}
-        updated_history = chat_history + [{"role": "user", "content": message}, ai_message]
-        
-        await get_db().chats.update_one(
-            {"uid": uid},
-            {
-                "$set": {
-                    "uid": uid,
-                    "agent_id": agent_id,
-                    "messages": updated_history,
-                    "last_updated": datetime.utcnow()
-                }
-            },
-            upsert=True
+        await chat_store.append(
+            get_database(), uid, agent_id, [{"role": "user", "content": message}, ai_message]
         )
 
         return response["answer"]
@@ -380,21 +390,32 @@ async def evaluate(
         try:
             # Initialize services
             rag_config = RAGConfig(**agent["config"])
-            embeddings_service = get_embeddings_service(rag_config.advancedEmbeddingsConfig)
+            embeddings_service = get_embeddings_service(rag_config.advancedEmbeddingsConfig, rag_config.vector_storage)
             rag_service = get_rag_service(llm_service, embeddings_service)
             rag_chain = rag_service.get_rag_chain(rag_config)
             embeddings = embeddings_service.get_embeddings()
+            endpoint, endpoint_limit = llm_service.get_endpoint(rag_config)
 
             evaluation_results = []
             total_questions = len(eval_data)
 
             for idx, qa_pair in enumerate(eval_data):
                 try:
-                    # Generate RAG response
-                    response = await rag_chain.ainvoke({
-                        "input": qa_pair["question"],
-                        "chat_history": []
-                    })
+                    # Generate RAG response, queued behind interactive chat
+                    ticket = await llm_scheduler.acquire(
+                        endpoint,
+                        agent_id,
+                        PRIORITY_EVALUATION,
+                        timeout=settings.LLM_EVALUATION_QUEUE_TIMEOUT_SECONDS,
+                        endpoint_limit=endpoint_limit
+                    )
+                    try:
+                        response = await rag_chain.ainvoke({
+                            "input": qa_pair["question"],
+                            "chat_history": []
+                        })
+                    finally:
+                        ticket.release()
                     generated_answer = response.get("answer", "")
 
                     # Generate embeddings for both answers
@@ -489,6 +510,122 @@ async def evaluate(
     background_tasks.add_task(process_evaluation)
     return {"job_id": job_id}
 
+@router.post("/{agent_id}/tune-retrieval")
+async def tune_retrieval(
+    agent_id: str,
+    evaluation_set: UploadFile,
+    background_tasks: BackgroundTasks,
+    grid: Optional[str] = Form(None),
+    tolerance: float = Form(0.02),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """
+    Sweeps retrieval profiles against a Q/A set without calling the LLM and
+    reports answer recall against context tokens and retrieval latency per
+    profile, recommending the cheapest one within tolerance of the best recall.
+    """
+    agent = await db.agents.find_one({"id": agent_id})
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+
+    try:
+        content = await evaluation_set.read()
+        eval_data = json.loads(content)
+        if not isinstance(eval_data, list) or not all(isinstance(item, dict) and "question" in item and "answer" in item for item in eval_data):
+            raise ValueError("Invalid evaluation set format")
+        if not eval_data:
+            raise ValueError("Evaluation set must contain at least one Q/A pair")
+        parameter_grid = json.loads(grid) if grid else None
+        if parameter_grid is not None and (
+            not isinstance(parameter_grid, dict)
+            or any(name not in SWEPT_PARAMETERS or not isinstance(values, list) for name, values in parameter_grid.items())
+        ):
+            raise ValueError(f"grid must map {', '.join(SWEPT_PARAMETERS)} to lists of values")
+        rag_config = RAGConfig(**agent["config"])
+        profiles = profile_grid(parameter_grid, rag_config.retrieval)
+        if len(profiles) > MAX_PROFILES:
+            raise ValueError(f"grid expands to {len(profiles)} profiles, at most {MAX_PROFILES} are allowed")
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON format")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job_id = str(uuid.uuid4())
+    await db.evaluation_jobs.insert_one({
+        "_id": job_id,
+        "agent_id": agent_id,
+        "type": "retrieval_tuning",
+        "status": "processing",
+        "progress": 0.0,
+        "total_profiles": len(profiles),
+        "processed_profiles": 0,
+        "created_at": datetime.utcnow()
+    })
+
+    async def process_tuning():
+        results = []
+        try:
+            embeddings_service = get_embeddings_service(rag_config.advancedEmbeddingsConfig, rag_config.vector_storage)
+            rag_service = get_rag_service(llm_service, embeddings_service)
+
+            for idx, profile in enumerate(profiles):
+                results.append(await evaluate_profile(rag_service, rag_config, profile, eval_data))
+                await db.evaluation_jobs.update_one(
+                    {"_id": job_id},
+                    {
+                        "$inc": {"processed_profiles": 1},
+                        "$set": {"progress": (idx + 1) / len(profiles)}
+                    }
+                )
+
+            await db.evaluations.insert_one({
+                "agent_id": agent_id,
+                "job_id": job_id,
+                "timestamp": datetime.utcnow(),
+                "type": "retrieval_tuning",
+                "current_profile": rag_config.retrieval.model_dump(exclude_none=True) if rag_config.retrieval else {},
+                "results": results,
+                "recommended": recommend(results, tolerance),
+                "status": "completed"
+            })
+
+            await db.evaluation_jobs.update_one(
+                {"_id": job_id},
+                {
+                    "$set": {
+                        "status": "completed",
+                        "progress": 1.0,
+                        "completion_time": datetime.utcnow()
+                    }
+                }
+            )
+
+        except Exception as e:
+            await db.evaluation_jobs.update_one(
+                {"_id": job_id},
+                {
+                    "$set": {
+                        "status": "failed",
+                        "error": str(e),
+                        "completion_time": datetime.utcnow()
+                    }
+                }
+            )
+
+            await db.evaluations.insert_one({
+                "agent_id": agent_id,
+                "job_id": job_id,
+                "timestamp": datetime.utcnow(),
+                "type": "retrieval_tuning",
+                "results": results,
+                "status": "failed",
+                "error": str(e)
+            })
+
+    background_tasks.add_task(process_tuning)
+    return {"job_id": job_id, "profiles": len(profiles)}
+
 @router.get("/evaluation-jobs/{job_id}")
 async def get_evaluation_status(
     job_id: str,
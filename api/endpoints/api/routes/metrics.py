@@ -5,6 +5,21 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import json_util
 import json
 from ..dependencies import get_db
+from services.chain_cache import chain_cache
+from services.metrics_aggregator import summarize
+from services.agent_cache import agent_config_cache
+from services.vector_store_registry import vector_store_registry
+from services.embedding_model_manager import embedding_model_manager
+from services.llm_client_pool import llm_client_pool
+from services.sql_registry import sql_database_registry
+from services.branch_timer import branch_latency
+from services.semantic_cache import semantic_cache
+from services.question_contextualizer import question_contextualizer
+from services.request_coalescer import request_coalescer
+from services.llm_scheduler import llm_scheduler
+from services.context_packer import context_packer
+from services.bm25_index import bm25_registry
+from services.reranker import reranker
 
 router = APIRouter()
 
@@ -21,6 +36,7 @@ async def get_agent_metrics(
     end_date: datetime,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
+    """Returns per-day calls, mean and p50/p95/p99 latencies for the agent"""
     metrics = await db.metrics.find({
         "agent_id": agent_id,
         "date": {
@@ -28,5 +44,89 @@ async def get_agent_metrics(
             "$lte": end_date
         }
     }).to_list(None)
+    metrics = [summarize(document) for document in metrics]
     
     return json.loads(json.dumps(metrics, cls=JSONEncoder))
+
+
+@router.get("/chain-cache")
+async def get_chain_cache_metrics():
+    """Returns hit/miss/build-time counters of the in-process RAG chain cache"""
+    return chain_cache.stats()
+
+
+@router.get("/agent-cache")
+async def get_agent_cache_metrics():
+    """Returns hit/miss counters of the agent config cache and whether the change stream is active"""
+    return agent_config_cache.stats()
+
+@router.get("/vector-stores")
+async def get_vector_store_metrics():
+    """Returns open Chroma clients, cached collection handles and their estimated memory"""
+    return vector_store_registry.stats()
+
+
+@router.get("/embedding-models")
+async def get_embedding_model_metrics():
+    """Returns resident HuggingFace embedding models, their memory and batching counters"""
+    return embedding_model_manager.stats()
+
+
+@router.get("/llm-clients")
+async def get_llm_client_metrics():
+    """Returns pooled LLM clients and connection reuse per endpoint"""
+    return llm_client_pool.stats()
+
+
+@router.get("/sql-databases")
+async def get_sql_database_metrics():
+    """Returns pooled SQL engines and schema cache counters"""
+    return sql_database_registry.stats()
+
+
+@router.get("/branches")
+async def get_branch_metrics():
+    """Returns per-branch latency, timeouts and errors of the RAG + SQL chain"""
+    return branch_latency.stats()
+
+
+@router.get("/semantic-cache")
+async def get_semantic_cache_metrics():
+    """Returns lookups, hits and saved latency of the semantic answer cache"""
+    return semantic_cache.stats()
+
+
+@router.get("/contextualization")
+async def get_contextualization_metrics():
+    """Returns how often the question rewrite was skipped, served from cache or sent to the LLM"""
+    return question_contextualizer.stats()
+
+
+@router.get("/coalescing")
+async def get_coalescing_metrics():
+    """Returns how many chat requests shared an in-flight generation instead of starting their own"""
+    return request_coalescer.stats()
+
+
+@router.get("/llm-scheduler")
+async def get_llm_scheduler_metrics():
+    """Returns active LLM slots, queue depth, admissions, rejections and average queue wait"""
+    return llm_scheduler.stats()
+
+
+@router.get("/context-packing")
+async def get_context_packing_metrics():
+    """Returns retrieved context tokens before and after packing, overall and per agent"""
+    return context_packer.stats()
+
+
+@router.get("/bm25-indexes")
+async def get_bm25_index_metrics():
+    """Returns the loaded BM25 indexes with their document and term counts"""
+    return bm25_registry.stats()
+
+
+@router.get("/reranker")
+async def get_reranker_metrics():
+    """Returns cross-encoder rerank calls, fallbacks to retrieval order and average scoring time"""
+    return reranker.stats()
@@ -0,0 +1,71 @@
+from core.models import ModelEntry
+from types import MappingProxyType
+from typing import Any, Callable, List, Mapping, Optional
+import asyncio
+import json
+import os
+import threading
+
+class ModelsConfigStore:
+    """
+    Holds an immutable, validated snapshot of models_config.json in memory.
+    The snapshot is swapped atomically when the file's mtime changes or on
+    an explicit reload (SIGHUP), so requests never read the file.
+    """
+
+    def __init__(self, path: str, poll_interval: float):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._snapshot: Optional[Mapping[str, Mapping[str, Any]]] = None
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[], None]] = []
+
+    def get(self) -> Mapping[str, Mapping[str, Any]]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.reload()
+            snapshot = self._snapshot
+        return snapshot
+
+    def add_listener(self, listener: Callable[[], None]):
+        self._listeners.append(listener)
+
+    def reload(self) -> bool:
+        """Loads and validates the file. Keeps the previous snapshot if it is invalid."""
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+                with open(self.path, 'r') as f:
+                    raw = json.load(f)
+                snapshot = MappingProxyType({
+                    model_id: MappingProxyType(ModelEntry(**entry).model_dump(exclude_none=True))
+                    for model_id, entry in raw.items()
+                })
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                print(f"Error reloading models config, keeping previous version: {str(e)}")
+                return False
+            changed = self._snapshot is not None
+            self._snapshot = snapshot
+            self._mtime = mtime
+        if changed:
+            print(f"Reloaded models config from {self.path}")
+            for listener in self._listeners:
+                listener()
+        return True
+
+    def reload_if_modified(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            print(f"Error checking models config: {str(e)}")
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await asyncio.to_thread(self.reload_if_modified)
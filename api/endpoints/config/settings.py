@@ -1,8 +1,8 @@
 from pathlib import Path
-from typing import Dict, Any
-import json
+from typing import Any, Mapping
 import os
 from dotenv import load_dotenv
+from config.models_config import ModelsConfigStore
 
 load_dotenv()
 
@@ -10,11 +10,83 @@ class Settings:
     UPLOAD_DIR: Path = Path("uploads")
     MONGO_URI: str = os.getenv("MONGO_URI", "mongodb://localhost:27017")
     DB_NAME: str = "rag_db"
+    MODELS_CONFIG_PATH: str = os.getenv("MODELS_CONFIG_PATH", "/app/models_config.json")
+    MODELS_CONFIG_POLL_SECONDS: float = float(os.getenv("MODELS_CONFIG_POLL_SECONDS", 5))
+    MONGO_MAX_POOL_SIZE: int = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+    MONGO_MIN_POOL_SIZE: int = int(os.getenv("MONGO_MIN_POOL_SIZE", 5))
+    MONGO_MAX_IDLE_TIME_MS: int = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    AGENT_CACHE_TTL_SECONDS: float = float(os.getenv("AGENT_CACHE_TTL_SECONDS", 60))
+    METRICS_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("METRICS_FLUSH_INTERVAL_SECONDS", 10))
+    CHAIN_CACHE_SIZE: int = int(os.getenv("CHAIN_CACHE_SIZE", 128))
+    CHROMA_PERSIST_DIR: str = os.getenv("CHROMA_PERSIST_DIR", "./db")
+    CHROMA_MEMORY_LIMIT_BYTES: int = int(os.getenv("CHROMA_MEMORY_LIMIT_BYTES", 2 * 1024 ** 3))
+    CHROMA_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("CHROMA_IDLE_TIMEOUT_SECONDS", 1800))
+    VECTOR_STORAGE_MODE: str = os.getenv("VECTOR_STORAGE_MODE", "chroma")
+    NUMPY_STORE_DIR: str = os.getenv("NUMPY_STORE_DIR", "./db_numpy")
+    # Stores written by the earlier quantized backend; still read in place
+    QUANTIZED_STORE_DIR: str = os.getenv("QUANTIZED_STORE_DIR", "./db_quantized")
+    QUANTIZED_RESCORE_MULTIPLIER: int = int(os.getenv("QUANTIZED_RESCORE_MULTIPLIER", 4))
+    VECTOR_COMPACTION_THRESHOLD: float = float(os.getenv("VECTOR_COMPACTION_THRESHOLD", 0.2))
+    EMBEDDING_MODEL_MEMORY_BUDGET_BYTES: int = int(os.getenv("EMBEDDING_MODEL_MEMORY_BUDGET_BYTES", 2 * 1024 ** 3))
+    EMBEDDING_BATCH_MAX_SIZE: int = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 32))
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", 5))
+    SQL_MAX_ENGINES: int = int(os.getenv("SQL_MAX_ENGINES", 32))
+    SQL_POOL_SIZE: int = int(os.getenv("SQL_POOL_SIZE", 5))
+    SQL_MAX_OVERFLOW: int = int(os.getenv("SQL_MAX_OVERFLOW", 10))
+    SQL_POOL_RECYCLE_SECONDS: int = int(os.getenv("SQL_POOL_RECYCLE_SECONDS", 1800))
+    SQL_SCHEMA_TTL_SECONDS: float = float(os.getenv("SQL_SCHEMA_TTL_SECONDS", 600))
+    SQL_SCHEMA_PRUNE_THRESHOLD: int = int(os.getenv("SQL_SCHEMA_PRUNE_THRESHOLD", 30))
+    SQL_SCHEMA_MAX_TABLES: int = int(os.getenv("SQL_SCHEMA_MAX_TABLES", 15))
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+    SEMANTIC_CACHE_TTL_SECONDS: float = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 3600))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 256))
+    CONTEXTUALIZE_SKIP_STANDALONE: bool = os.getenv("CONTEXTUALIZE_SKIP_STANDALONE", "true").lower() == "true"
+    CONTEXTUALIZE_CACHE_SIZE: int = int(os.getenv("CONTEXTUALIZE_CACHE_SIZE", 1024))
+    RETRIEVAL_K: int = int(os.getenv("RETRIEVAL_K", 4))
+    HYBRID_SEARCH_ENABLED: bool = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+    HYBRID_FETCH_K: int = int(os.getenv("HYBRID_FETCH_K", 20))
+    HYBRID_RRF_K: int = int(os.getenv("HYBRID_RRF_K", 60))
+    BM25_INDEX_DIR: str = os.getenv("BM25_INDEX_DIR", "./bm25")
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_FETCH_K: int = int(os.getenv("RERANK_FETCH_K", 20))
+    RERANK_TOP_N: int = int(os.getenv("RERANK_TOP_N", 4))
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", 16))
+    RERANK_TIMEOUT_MS: float = float(os.getenv("RERANK_TIMEOUT_MS", 300))
+    RERANK_MAX_PENDING: int = int(os.getenv("RERANK_MAX_PENDING", 4))
+    CONTEXT_PACKING_ENABLED: bool = os.getenv("CONTEXT_PACKING_ENABLED", "true").lower() == "true"
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+    CONTEXT_DUPLICATE_THRESHOLD: float = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", 0.8))
+    CONTEXT_MIN_OVERLAP_CHARS: int = int(os.getenv("CONTEXT_MIN_OVERLAP_CHARS", 50))
+    COALESCE_ENABLED: bool = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+    COALESCE_MAX_BUFFERED_EVENTS: int = int(os.getenv("COALESCE_MAX_BUFFERED_EVENTS", 2048))
+    CHAT_BUCKET_SIZE: int = int(os.getenv("CHAT_BUCKET_SIZE", 50))
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", 2000))
+    HISTORY_MIN_RECENT_MESSAGES: int = int(os.getenv("HISTORY_MIN_RECENT_MESSAGES", 2))
+    CHAT_STREAM_FLUSH_MS: float = float(os.getenv("CHAT_STREAM_FLUSH_MS", 50))
+    RETRIEVAL_BRANCH_TIMEOUT_SECONDS: float = float(os.getenv("RETRIEVAL_BRANCH_TIMEOUT_SECONDS", 10))
+    SQL_BRANCH_TIMEOUT_SECONDS: float = float(os.getenv("SQL_BRANCH_TIMEOUT_SECONDS", 15))
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "true").lower() == "true"
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", 50))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", 60))
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", 120))
+    LLM_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", 10))
+    LLM_MAX_CLIENTS: int = int(os.getenv("LLM_MAX_CLIENTS", 128))
+    LLM_MAX_ENDPOINTS: int = int(os.getenv("LLM_MAX_ENDPOINTS", 32))
+    LLM_ENDPOINT_IDLE_SECONDS: float = float(os.getenv("LLM_ENDPOINT_IDLE_SECONDS", 900))
+    LLM_ENDPOINT_MAX_CONCURRENCY: int = int(os.getenv("LLM_ENDPOINT_MAX_CONCURRENCY", 32))
+    LLM_AGENT_MAX_CONCURRENCY: int = int(os.getenv("LLM_AGENT_MAX_CONCURRENCY", 8))
+    LLM_QUEUE_MAX_SIZE: int = int(os.getenv("LLM_QUEUE_MAX_SIZE", 256))
+    LLM_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", 10))
+    LLM_EVALUATION_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("LLM_EVALUATION_QUEUE_TIMEOUT_SECONDS", 120))
     
     @staticmethod
-    def get_models_config() -> Dict[str, Any]:
-        with open('/app/models_config.json', 'r') as f:
-            return json.load(f)
+    def get_models_config() -> Mapping[str, Mapping[str, Any]]:
+        return models_config_store.get()
+
+models_config_store = ModelsConfigStore(Settings.MODELS_CONFIG_PATH, Settings.MODELS_CONFIG_POLL_SECONDS)
 
 settings = Settings()
 print(settings.MONGO_URI)
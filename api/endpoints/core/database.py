@@ -0,0 +1,118 @@
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from typing import Optional
+from config.settings import settings
+
+# One client (and therefore one connection pool) per process. Created and
+# closed by the lifespan hook in main.py.
+_client: Optional[AsyncIOMotorClient] = None
+
+# Server error codes for an index that exists with other options
+INDEX_OPTIONS_CONFLICT = (85, 86)
+
+# Each entry is a key list, or (keys, options) for unique indexes
+INDEXES = {
+    "agents": [
+        [("id", ASCENDING)],
+        [("user_id", ASCENDING)],
+    ],
+    "metrics": [
+        [("agent_id", ASCENDING), ("date", ASCENDING)],
+    ],
+    "chats": [
+        # Upserts on uid rely on it to never create two headers for a session
+        ([("uid", ASCENDING)], {"unique": True}),
+    ],
+    "chat_buckets": [
+        ([("uid", ASCENDING), ("bucket", ASCENDING)], {"unique": True}),
+    ],
+    "jobs": [
+        [("_id", ASCENDING), ("agent_id", ASCENDING)],
+    ],
+    "evaluation_jobs": [
+        [("_id", ASCENDING), ("agent_id", ASCENDING)],
+    ],
+    "evaluations": [
+        [("agent_id", ASCENDING), ("timestamp", DESCENDING)],
+    ],
+}
+
+async def connect_to_mongo() -> AsyncIOMotorClient:
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            settings.MONGO_URI,
+            maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+            serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        )
+    return _client
+
+def close_mongo_connection():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+def get_database() -> AsyncIOMotorDatabase:
+    if _client is None:
+        raise RuntimeError("MongoDB client is not initialized")
+    return _client[settings.DB_NAME]
+
+async def find_duplicate(collection, keys) -> Optional[dict]:
+    """Returns one group of documents sharing the values of keys, if any."""
+    group = {field: f"${field}" for field, _ in keys}
+    cursor = collection.aggregate([
+        {"$group": {"_id": group, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": 1},
+    ], allowDiskUse=True)
+    duplicates = await cursor.to_list(length=1)
+    return duplicates[0] if duplicates else None
+
+async def rebuild_index(collection, keys, options: dict):
+    """
+    Replaces an index created with other options. The old index is only
+    dropped once the data allows the new one, and put back if the rebuild
+    fails anyway.
+    """
+    if options.get("unique"):
+        duplicate = await find_duplicate(collection, keys)
+        if duplicate is not None:
+            raise RuntimeError(
+                f"{duplicate['count']} documents share {duplicate['_id']}; "
+                "remove the duplicates and restart to make the index unique"
+            )
+    await collection.drop_index(keys)
+    try:
+        await collection.create_index(keys, **options)
+    except Exception:
+        # Writes since the check may have added duplicates
+        await collection.create_index(keys)
+        raise
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+    """
+    Creates the indexes used by the hot queries. Safe to run on every startup.
+    Fails if a unique index is missing, since upserts rely on it.
+    """
+    missing_unique = []
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            keys, options = index if isinstance(index, tuple) else (index, {})
+            try:
+                try:
+                    await db[collection].create_index(keys, **options)
+                except OperationFailure as e:
+                    if e.code not in INDEX_OPTIONS_CONFLICT:
+                        raise
+                    # An older deployment created the index without these options
+                    await rebuild_index(db[collection], keys, options)
+            except Exception as e:
+                print(f"Error creating index {keys} on {collection}: {str(e)}")
+                if options.get("unique"):
+                    missing_unique.append(f"{collection} {keys}")
+    if missing_unique:
+        raise RuntimeError(f"Unique indexes could not be created: {', '.join(missing_unique)}")
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 import uuid
 
 class S3Config(BaseModel):
@@ -22,6 +22,14 @@ class SQLConfig(BaseModel):
     password: str
     db_name: str
 
+class ModelEntry(BaseModel):
+    api_type: str
+    api_key_env: str
+    base_url: Optional[str] = None
+    temperature: Optional[float] = None
+    name: Optional[str] = None
+    limits: Optional[Dict[str, Any]] = None
+
 class LLMConfig(BaseModel):
     model: str
     base_url: Optional[str] = None
@@ -29,6 +37,13 @@ class LLMConfig(BaseModel):
     temperature: Optional[float] = None
     api_type: str
 
+class RetrievalProfile(BaseModel):
+    k: Optional[int] = None
+    fetch_k: Optional[int] = None
+    mmr_lambda: Optional[float] = None
+    score_threshold: Optional[float] = None
+    filter: Optional[Dict[str, Any]] = None
+
 class RAGConfig(BaseModel):
     llm: str
     embeddings_model: str
@@ -40,6 +55,12 @@ class RAGConfig(BaseModel):
     advancedEmbeddingsConfig: Optional[EmbeddingsConfig] = None
     sql_config: Optional[SQLConfig] = None 
     s3_config: Optional[S3Config] = None
+    history_token_budget: Optional[int] = None
+    context_token_budget: Optional[int] = None
+    rerank: bool = False
+    rerank_top_n: Optional[int] = None
+    retrieval: Optional[RetrievalProfile] = None
+    vector_storage: Optional[Literal["chroma", "float32", "int8", "binary"]] = None
 
 class Message(BaseModel):
     role: str
@@ -1,18 +1,57 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from contextlib import asynccontextmanager
+from config.settings import models_config_store
 from fastapi.middleware.cors import CORSMiddleware
 from api.routes import agents, chat, documents, metrics, users, evaluation
 from config.firebase import initialize_firebase
+from core.database import connect_to_mongo, close_mongo_connection, get_database, ensure_indexes
+from services.llm_client_pool import llm_client_pool
+from services.chain_cache import chain_cache
+from services.agent_cache import agent_config_cache
+from services.metrics_aggregator import metrics_aggregator
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+import asyncio
+import signal
 import os
 from dotenv import load_dotenv
 
 load_dotenv('.backend.env')
 initialize_firebase()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_to_mongo()
+    await ensure_indexes(get_database())
+    models_config_store.reload()
+    # Built chains hold clients created from the old model entries
+    models_config_store.add_listener(chain_cache.clear)
+    # ...and so do chains whose LLM endpoint was dropped as idle
+    llm_client_pool.add_eviction_listener(chain_cache.clear)
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, models_config_store.reload)
+    except (NotImplementedError, AttributeError):
+        pass
+    config_watcher = asyncio.create_task(models_config_store.watch())
+    agent_watcher = asyncio.create_task(agent_config_cache.watch(get_database()))
+    metrics_flusher = asyncio.create_task(metrics_aggregator.run(get_database()))
+    yield
+    metrics_flusher.cancel()
+    try:
+        # Cancelling runs a final flush of the buffered metrics
+        await metrics_flusher
+    except asyncio.CancelledError:
+        pass
+    agent_watcher.cancel()
+    config_watcher.cancel()
+    await llm_client_pool.aclose()
+    close_mongo_connection()
+
 app = FastAPI(
     title="RAG Chat API",
     description="Enhanced RAG API with agent management and metrics tracking",
     version="2.0.0",
     docs_url="/",
+    lifespan=lifespan,
 )
 
 url = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
@@ -33,6 +72,10 @@ app.include_router(metrics.router, prefix="/api/metrics", tags=["metrics"])
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(evaluation.router, prefix="/api/agents", tags=["evaluation"])
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     import uvicorn
     host = os.environ.get('HOST', '0.0.0.0')
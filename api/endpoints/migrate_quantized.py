@@ -0,0 +1,7 @@
+from migrate_vectors import main
+from services.numpy_vector_store import QUANTIZED_MODES
+
+# Kept for existing scripts: migrate_vectors.py limited to the quantized modes.
+# Run from api/endpoints: python migrate_quantized.py --mode int8 [--drop-source] [collection ...]
+if __name__ == "__main__":
+    main(QUANTIZED_MODES, "int8", "Migrate Chroma collections to quantized storage")
@@ -0,0 +1,71 @@
+import argparse
+import numpy as np
+import shutil
+from config.settings import settings
+from services.numpy_vector_store import NUMPY_MODES, NumpyIndex, numpy_store_path
+from services.vector_store_registry import vector_store_registry
+from services.bm25_index import bm25_registry
+
+# Copies existing Chroma collections into NumPy stores, reusing the stored
+# embeddings so nothing is re-embedded. Stop the API first: it keeps serving a
+# collection from Chroma until it is restarted.
+# Run from api/endpoints: python migrate_vectors.py --mode int8 [--drop-source] [collection ...]
+BATCH_SIZE = 2000
+
+def collection_names(client) -> list:
+    # Older chromadb returns Collection objects, newer ones plain names
+    return [getattr(collection, "name", collection) for collection in client.list_collections()]
+
+def migrate(client, collection_name: str, mode: str, drop_source: bool) -> int:
+    target = numpy_store_path(collection_name)
+    if target.exists():
+        print(f"{collection_name}: already migrated, skipping")
+        return 0
+    collection = client.get_collection(collection_name)
+    total = collection.count()
+    # Copied into a staging directory: the API serves any store directory it finds
+    staging = target.with_name(target.name + ".migrating")
+    shutil.rmtree(staging, ignore_errors=True)
+    index = NumpyIndex(staging, mode)
+    offset = 0
+    while offset < total:
+        batch = collection.get(
+            include=["embeddings", "documents", "metadatas"], limit=BATCH_SIZE, offset=offset
+        )
+        if not batch["ids"]:
+            break
+        index.add_vectors(
+            batch["ids"],
+            np.asarray(batch["embeddings"], dtype=np.float32),
+            [text or "" for text in batch["documents"]],
+            [metadata or {} for metadata in batch["metadatas"]]
+        )
+        offset += len(batch["ids"])
+        print(f"{collection_name}: {offset}/{total}")
+    if len(index) != total:
+        raise RuntimeError(f"{collection_name}: copied {len(index)} of {total} vectors, keeping the Chroma collection")
+    if not total:
+        print(f"{collection_name}: empty, skipping")
+        return 0
+    staging.rename(target)
+    if drop_source:
+        client.delete_collection(collection_name)
+        # Rebuilt from the NumPy store on first use, so it matches what is served
+        bm25_registry.drop(collection_name)
+    print(f"{collection_name}: {total} vectors, {index.resident_bytes} bytes resident ({mode})")
+    return total
+
+def main(modes=NUMPY_MODES, default_mode: str = "float32", description: str = "Migrate Chroma collections to NumPy storage"):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("collections", nargs="*", help="Collections to migrate; all of them when omitted")
+    parser.add_argument("--mode", choices=modes, default=default_mode)
+    parser.add_argument("--persist-dir", default=settings.CHROMA_PERSIST_DIR)
+    parser.add_argument("--drop-source", action="store_true", help="Delete each Chroma collection once it is copied")
+    args = parser.parse_args()
+
+    client = vector_store_registry.get_client(args.persist_dir)
+    for collection_name in args.collections or collection_names(client):
+        migrate(client, collection_name, args.mode, args.drop_source)
+
+if __name__ == "__main__":
+    main()
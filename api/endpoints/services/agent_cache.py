@@ -0,0 +1,110 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+from core.models import RAGConfig
+from config.settings import settings
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import time
+
+# Server error code for change streams on a standalone mongod
+CHANGE_STREAMS_UNSUPPORTED = 40573
+CHANGE_STREAM_MIN_BACKOFF_SECONDS = 1.0
+CHANGE_STREAM_MAX_BACKOFF_SECONDS = 60.0
+
+class AgentConfigCache:
+    """
+    TTL'd read-through cache of parsed agent configs for the chat and
+    evaluation hot paths. Entries are dropped by the agent routes and, on
+    replica sets, by a change-stream listener so every worker stays coherent.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # agent_id -> (expires_at, mongo _id, RAGConfig)
+        self._entries: Dict[str, Tuple[float, Any, RAGConfig]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.change_stream_active = False
+        self.change_stream_restarts = 0
+
+    async def get_config(self, db: AsyncIOMotorDatabase, agent_id: str) -> Optional[RAGConfig]:
+        entry = self._entries.get(agent_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[2]
+        self.misses += 1
+
+        agent = await db.agents.find_one({"id": agent_id}, {"_id": True, "config": True})
+        if not agent:
+            self._entries.pop(agent_id, None)
+            return None
+        config = RAGConfig(**agent["config"])
+        self._entries[agent_id] = (time.monotonic() + self.ttl, agent["_id"], config)
+        return config
+
+    def invalidate(self, agent_id: str):
+        if self._entries.pop(agent_id, None) is not None:
+            self.invalidations += 1
+
+    def _invalidate_document(self, document_id):
+        for agent_id, entry in list(self._entries.items()):
+            if entry[1] == document_id:
+                self.invalidate(agent_id)
+
+    async def watch(self, db: AsyncIOMotorDatabase):
+        """
+        Invalidates entries on agent changes made by any worker. Needs a
+        replica set. Transient errors (e.g. an election) restart the stream
+        with backoff, resuming after the last change seen.
+        """
+        resume_token = None
+        backoff = CHANGE_STREAM_MIN_BACKOFF_SECONDS
+        while True:
+            try:
+                async with db.agents.watch(
+                    [{"$match": {"operationType": {"$in": ["update", "replace", "delete"]}}}],
+                    resume_after=resume_token
+                ) as stream:
+                    self.change_stream_active = True
+                    backoff = CHANGE_STREAM_MIN_BACKOFF_SECONDS
+                    async for change in stream:
+                        self._invalidate_document(change["documentKey"]["_id"])
+                        resume_token = stream.resume_token
+            except asyncio.CancelledError:
+                self.change_stream_active = False
+                raise
+            except OperationFailure as e:
+                self.change_stream_active = False
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    print(f"Agent change stream unavailable, relying on TTL: {str(e)}")
+                    self._entries.clear()
+                    return
+                print(f"Agent change stream failed, restarting in {backoff:.0f}s: {str(e)}")
+                # The resume point may be gone from the oplog; start over
+                resume_token = None
+            except PyMongoError as e:
+                self.change_stream_active = False
+                print(f"Agent change stream stopped, restarting in {backoff:.0f}s: {str(e)}")
+            self.change_stream_active = False
+            self.change_stream_restarts += 1
+            if resume_token is None:
+                # Changes made while the stream was down cannot be replayed
+                self._entries.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, CHANGE_STREAM_MAX_BACKOFF_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "change_stream_active": self.change_stream_active,
+            "change_stream_restarts": self.change_stream_restarts
+        }
+
+agent_config_cache = AgentConfigCache(settings.AGENT_CACHE_TTL_SECONDS)
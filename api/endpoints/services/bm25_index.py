@@ -0,0 +1,248 @@
+from langchain_core.documents import Document
+from config.settings import settings
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import heapq
+import json
+import math
+import re
+import threading
+
+# Keeps SKUs, versions and prices like "ab-120", "v2.1" or "9.99" whole;
+# their parts are indexed as well
+TOKEN = re.compile(r"\w+(?:[-./]\w+)*")
+PART = re.compile(r"[-./]")
+BACKFILL_BATCH_SIZE = 5000
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        tokens.append(token)
+        if PART.search(token):
+            tokens.extend(part for part in PART.split(token) if part)
+    return tokens
+
+class BM25Index:
+    """
+    Sparse BM25 index over one collection's chunks. Postings live in memory;
+    the chunks themselves are persisted as an append-only JSON lines file and
+    the postings are rebuilt from it on load.
+    """
+
+    def __init__(self, path: Path, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._ids: List[str] = []
+        self._documents: List[Tuple[str, Dict[str, Any]]] = []
+        self._lengths: List[int] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._positions: Dict[str, int] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+        # Chunks added before the index is built are held back, so a first
+        # write cannot pass for a complete index file
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_lock = threading.Lock()
+        self._closed = False
+        # Set once the index is built; searches find nothing until then
+        self.ready = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def terms(self) -> int:
+        return len(self._postings)
+
+    def load(self) -> bool:
+        if not self.path.exists():
+            return False
+        with self._lock, self.path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self._index(record["id"], record["text"], record.get("metadata") or {})
+        return True
+
+    def build(self, vector_store: Optional[Any] = None):
+        """
+        Loads the index from its file, or backfills it from vector_store when
+        there is none, then applies the chunks added in the meantime.
+        """
+        try:
+            if vector_store is not None and self.path.exists() and is_empty(vector_store):
+                # The collection was dropped and recreated since the file was written
+                self.path.unlink()
+            if not self.load() and vector_store is not None:
+                self._backfill(vector_store)
+        finally:
+            with self._pending_lock:
+                pending, self._pending = self._pending, []
+                self.ready.set()
+            if pending:
+                with self._lock:
+                    self._append(pending)
+
+    def _backfill(self, vector_store: Any):
+        offset = 0
+        while True:
+            batch = vector_store.get(include=["documents", "metadatas"], limit=BACKFILL_BATCH_SIZE, offset=offset)
+            if not batch["ids"]:
+                break
+            with self._lock:
+                self._append([
+                    {"id": document_id, "text": text or "", "metadata": metadata or {}}
+                    for document_id, text, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"])
+                ])
+            offset += len(batch["ids"])
+        if not offset:
+            # Nothing to backfill; an empty file marks the index as built
+            with self._lock:
+                self._append([])
+
+    def _index(self, document_id: str, text: str, metadata: Dict[str, Any]):
+        if document_id in self._positions:
+            return
+        position = len(self._ids)
+        terms = Counter(tokenize(text))
+        self._ids.append(document_id)
+        self._documents.append((text, metadata))
+        self._positions[document_id] = position
+        length = sum(terms.values())
+        self._lengths.append(length)
+        self._total_length += length
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, []).append((position, frequency))
+
+    def _append(self, records: List[Dict[str, Any]]):
+        if self._closed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        for record in records:
+            self._index(record["id"], record["text"], record["metadata"])
+
+    def add(self, ids: List[str], documents: List[Document]):
+        records = [
+            {"id": document_id, "text": document.page_content, "metadata": document.metadata}
+            for document_id, document in zip(ids, documents)
+        ]
+        with self._pending_lock:
+            if not self.ready.is_set():
+                self._pending.extend(records)
+                return
+        with self._lock:
+            self._append(records)
+
+    def close(self):
+        """Deletes the index file and ignores later writes, e.g. from a build still running."""
+        with self._lock:
+            self._closed = True
+            self.path.unlink(missing_ok=True)
+
+    def search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        if not self.ready.is_set():
+            return []
+        with self._lock:
+            count = len(self._ids)
+            if not count:
+                return []
+            average_length = self._total_length / count
+            scores: Dict[int, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for position, frequency in postings:
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / average_length)
+                    scores[position] = scores.get(position, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [
+                (Document(page_content=self._documents[position][0], metadata=self._documents[position][1], id=self._ids[position]), score)
+                for position, score in top
+            ]
+
+def is_empty(vector_store: Any) -> bool:
+    return not vector_store.get(include=[], limit=1)["ids"]
+
+def check_collection_name(collection_name: str):
+    # Collection names become file names under the index directory
+    if not collection_name or ".." in collection_name or "/" in collection_name or "\\" in collection_name:
+        raise ValueError(f"Invalid collection name: {collection_name!r}")
+
+class BM25IndexRegistry:
+    """
+    One lazily loaded BM25 index per collection, persisted under index_dir.
+    Indexes are loaded or backfilled on a background thread so the event loop
+    never waits on them; until an index is ready, hybrid search is dense only.
+    """
+
+    def __init__(self, index_dir: str, build_workers: int = 2):
+        self.index_dir = Path(index_dir)
+        self._indexes: Dict[str, BM25Index] = {}
+        self._builds: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._builder = ThreadPoolExecutor(max_workers=build_workers, thread_name_prefix="bm25")
+
+    def path(self, collection_name: str) -> Path:
+        check_collection_name(collection_name)
+        return self.index_dir / f"{collection_name}.jsonl"
+
+    def get(self, collection_name: str, vector_store: Optional[Any] = None) -> BM25Index:
+        """
+        Returns the collection's index, scheduling its build on first use.
+        Collections ingested before the index existed are backfilled from
+        vector_store.
+        """
+        path = self.path(collection_name)
+        with self._lock:
+            index = self._indexes.get(collection_name)
+            if index is None:
+                index = BM25Index(path)
+                self._indexes[collection_name] = index
+                self._builds[collection_name] = self._builder.submit(
+                    self._build, collection_name, index, vector_store
+                )
+            return index
+
+    def wait(self, collection_name: str, timeout: Optional[float] = None):
+        """Blocks until the collection's index is built; for scripts and tests."""
+        with self._lock:
+            build = self._builds.get(collection_name)
+        if build is not None:
+            build.result(timeout)
+
+    def _build(self, collection_name: str, index: BM25Index, vector_store: Optional[Any]):
+        try:
+            index.build(vector_store)
+        except Exception as e:
+            print(f"Error building BM25 index for {collection_name}: {str(e)}")
+
+    def drop(self, collection_name: str):
+        """Forgets the collection's index and deletes its file; call when the collection is deleted."""
+        path = self.path(collection_name)
+        with self._lock:
+            index = self._indexes.pop(collection_name, None)
+            self._builds.pop(collection_name, None)
+        if index is not None:
+            index.close()
+        else:
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "index_dir": str(self.index_dir),
+                "collections": {
+                    name: {"documents": len(index), "terms": index.terms, "ready": index.ready.is_set()}
+                    for name, index in self._indexes.items()
+                }
+            }
+
+bm25_registry = BM25IndexRegistry(settings.BM25_INDEX_DIR)
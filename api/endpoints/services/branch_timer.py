@@ -0,0 +1,87 @@
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextvars import copy_context
+from typing import Any, Callable, Dict
+import asyncio
+import threading
+import time
+
+# Runs branches invoked synchronously, so the caller can stop waiting at the
+# deadline; a branch that times out keeps its thread until it returns
+_sync_branch_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="branch")
+
+class BranchLatency:
+    """Running latency counters per chain branch, e.g. 'sql' and 'retrieval'."""
+
+    def __init__(self):
+        self._branches: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, branch: str, seconds: float, timed_out: bool = False, failed: bool = False):
+        with self._lock:
+            stats = self._branches.setdefault(branch, {
+                "calls": 0, "total_time": 0.0, "max_time": 0.0, "last_time": 0.0,
+                "timeouts": 0, "errors": 0
+            })
+            stats["calls"] += 1
+            stats["total_time"] += seconds
+            stats["max_time"] = max(stats["max_time"], seconds)
+            stats["last_time"] = seconds
+            stats["timeouts"] += int(timed_out)
+            stats["errors"] += int(failed)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                branch: {**stats, "avg_time": stats["total_time"] / stats["calls"]}
+                for branch, stats in self._branches.items()
+            }
+
+branch_latency = BranchLatency()
+
+def timed_branch(
+    name: str,
+    runnable: Runnable,
+    timeout: float,
+    fallback: Callable[[Dict[str, Any]], Any]
+) -> Runnable:
+    """
+    Wraps one branch of a parallel chain with a deadline. On timeout or error
+    the branch returns fallback(inputs) so the answer can still be generated.
+    """
+
+    def run(inputs: Dict[str, Any], config: RunnableConfig):
+        start_time = time.perf_counter()
+        timed_out = failed = False
+        future = _sync_branch_executor.submit(copy_context().run, runnable.invoke, inputs, config)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            timed_out = True
+            future.cancel()
+            print(f"{name} branch timed out after {timeout}s, answering without it")
+            return fallback(inputs)
+        except Exception as e:
+            failed = True
+            print(f"Error in {name} branch: {str(e)}")
+            return fallback(inputs)
+        finally:
+            branch_latency.record(name, time.perf_counter() - start_time, timed_out, failed)
+
+    async def arun(inputs: Dict[str, Any], config: RunnableConfig):
+        start_time = time.perf_counter()
+        timed_out = failed = False
+        try:
+            return await asyncio.wait_for(runnable.ainvoke(inputs, config), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            print(f"{name} branch timed out after {timeout}s, answering without it")
+            return fallback(inputs)
+        except Exception as e:
+            failed = True
+            print(f"Error in {name} branch: {str(e)}")
+            return fallback(inputs)
+        finally:
+            branch_latency.record(name, time.perf_counter() - start_time, timed_out, failed)
+
+    return RunnableLambda(run, afunc=arun, name=f"{name}_branch")
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from core.models import RAGConfig
+from config.settings import settings
+import hashlib
+import threading
+import time
+
+def config_hash(config: RAGConfig) -> str:
+    return hashlib.sha256(config.model_dump_json().encode()).hexdigest()
+
+class ChainCache:
+    """In-process LRU of built RAG chains keyed by agent id, chain type and config hash."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._chains: "OrderedDict[Tuple[str, Optional[str], str], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.total_build_time = 0.0
+
+    def get_or_build(
+        self,
+        agent_id: str,
+        config: RAGConfig,
+        build: Callable[[], Any],
+        chain_type: Optional[str] = None
+    ):
+        key = (agent_id, chain_type, config_hash(config))
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is not None:
+                self._chains.move_to_end(key)
+                self.hits += 1
+                return chain
+            self.misses += 1
+
+        start_time = time.perf_counter()
+        chain = build()
+        build_time = time.perf_counter() - start_time
+
+        with self._lock:
+            self.total_build_time += build_time
+            if chain is None:
+                return chain
+            # Drop chains built from an older config of the same agent
+            for stale_key in [k for k in self._chains if k[0] == agent_id and k[2] != key[2]]:
+                del self._chains[stale_key]
+            self._chains[key] = chain
+            self._chains.move_to_end(key)
+            while len(self._chains) > self.max_size:
+                self._chains.popitem(last=False)
+                self.evictions += 1
+        return chain
+
+    def invalidate(self, agent_id: str):
+        with self._lock:
+            for key in [k for k in self._chains if k[0] == agent_id]:
+                del self._chains[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._chains)
+            self._chains.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._chains),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "total_build_time": self.total_build_time,
+                "avg_build_time": self.total_build_time / self.misses if self.misses else 0.0
+            }
+
+chain_cache = ChainCache(settings.CHAIN_CACHE_SIZE)
@@ -0,0 +1,131 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config.settings import settings
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Concurrent upserts of the same document race; the unique index rejects
+# the loser, and its retry then updates the winner's document
+UPSERT_ATTEMPTS = 3
+
+async def upsert_with_retry(operation: Callable[[], Awaitable[Any]]) -> Any:
+    for attempt in range(UPSERT_ATTEMPTS):
+        try:
+            return await operation()
+        except DuplicateKeyError:
+            if attempt == UPSERT_ATTEMPTS - 1:
+                raise
+
+class ChatStore:
+    """
+    Stores chat sessions as a header document in `chats` plus fixed-size
+    message buckets in `chat_buckets`. A turn is appended with $push into
+    the bucket(s) its positions fall in, so write cost does not grow with
+    the length of the conversation and no document approaches 16MB.
+    """
+
+    def __init__(self, bucket_size: int):
+        self.bucket_size = bucket_size
+
+    async def get_session(self, db: AsyncIOMotorDatabase, uid: str) -> Optional[Dict[str, Any]]:
+        # An empty `messages` key in the result marks a legacy inline session
+        return await db.chats.find_one({"uid": uid}, {"messages": {"$slice": 0}})
+
+    async def migrate_legacy(self, db: AsyncIOMotorDatabase, uid: str):
+        # Sessions written before bucketing keep their messages inline
+        legacy = await db.chats.find_one({"uid": uid, "messages": {"$exists": True}})
+        if not legacy:
+            return
+        messages = [
+            {"role": message["role"], "content": message["content"], "position": position}
+            for position, message in enumerate(legacy.get("messages", []))
+        ]
+        for start in range(0, len(messages), self.bucket_size):
+            await upsert_with_retry(lambda: db.chat_buckets.update_one(
+                {"uid": uid, "bucket": start // self.bucket_size},
+                {"$set": {"messages": messages[start:start + self.bucket_size]}},
+                upsert=True
+            ))
+        await db.chats.update_one(
+            {"uid": uid, "messages": {"$exists": True}},
+            {"$set": {"message_count": len(messages)}, "$unset": {"messages": ""}}
+        )
+
+    async def append(
+        self,
+        db: AsyncIOMotorDatabase,
+        uid: str,
+        agent_id: str,
+        messages: List[Dict[str, str]]
+    ) -> int:
+        """Appends messages to the session and returns the new message count."""
+        await self.migrate_legacy(db, uid)
+        now = datetime.utcnow()
+        # Reserve positions atomically so concurrent turns never interleave
+        header = await upsert_with_retry(lambda: db.chats.find_one_and_update(
+            {"uid": uid},
+            {
+                "$inc": {"message_count": len(messages)},
+                "$set": {"agent_id": agent_id, "last_updated": now},
+                "$setOnInsert": {"uid": uid, "created_at": now}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            projection={"message_count": True}
+        ))
+        end = header["message_count"]
+        start = end - len(messages)
+
+        buckets: Dict[int, List[Dict[str, Any]]] = {}
+        for position, message in enumerate(messages, start=start):
+            buckets.setdefault(position // self.bucket_size, []).append({
+                **message,
+                "position": position,
+                "timestamp": now
+            })
+        for bucket, bucket_messages in buckets.items():
+            await upsert_with_retry(lambda: db.chat_buckets.update_one(
+                {"uid": uid, "bucket": bucket},
+                {"$push": {"messages": {"$each": bucket_messages, "$sort": {"position": 1}}}},
+                upsert=True
+            ))
+        return end
+
+    async def get_messages(
+        self,
+        db: AsyncIOMotorDatabase,
+        session: Dict[str, Any],
+        skip: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """Returns messages[skip:skip + limit] reading only the buckets that cover them."""
+        uid = session["uid"]
+        if "messages" in session:
+            legacy = await db.chats.find_one(
+                {"uid": uid},
+                {"messages": {"$slice": [skip, limit]} if limit is not None else {"$slice": [skip, 2 ** 31 - 1]}}
+            )
+            return [
+                {"role": message["role"], "content": message["content"]}
+                for message in legacy.get("messages", [])
+            ]
+
+        query: Dict[str, Any] = {"uid": uid, "bucket": {"$gte": skip // self.bucket_size}}
+        if limit is not None:
+            query["bucket"]["$lte"] = (skip + limit - 1) // self.bucket_size
+        buckets = await db.chat_buckets.find(query, {"messages": True}).sort("bucket", 1).to_list(None)
+        messages = [
+            {"role": message["role"], "content": message["content"]}
+            for bucket in buckets
+            for message in bucket.get("messages", [])
+            if message["position"] >= skip
+            and (limit is None or message["position"] < skip + limit)
+        ]
+        return messages
+
+    async def delete(self, db: AsyncIOMotorDatabase, uid: str):
+        await db.chat_buckets.delete_many({"uid": uid})
+        await db.chats.delete_one({"uid": uid})
+
+chat_store = ChatStore(settings.CHAT_BUCKET_SIZE)
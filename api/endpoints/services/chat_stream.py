@@ -0,0 +1,111 @@
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.outputs import LLMResult
+from typing import Any, Dict, List, Optional
+import json
+import time
+
+STREAM_MODES = ("text", "sse", "ndjson")
+
+class StreamCallbackHandler(AsyncCallbackHandler):
+    """Collects retrieved documents and token usage while a chain is streaming."""
+
+    def __init__(self):
+        self.documents: List[Document] = []
+        self.retrieval_time: Optional[float] = None
+        self.usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        self._pending_documents = False
+
+    async def on_retriever_end(self, documents, **kwargs: Any):
+        self.documents.extend(documents)
+        if self.retrieval_time is None:
+            self.retrieval_time = time.time()
+        self._pending_documents = True
+
+    async def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    for key in self.usage:
+                        self.usage[key] += usage.get(key, 0)
+                    return
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        self.usage["input_tokens"] += token_usage.get("prompt_tokens", 0)
+        self.usage["output_tokens"] += token_usage.get("completion_tokens", 0)
+        self.usage["total_tokens"] += token_usage.get("total_tokens", 0)
+
+    def take_documents(self) -> Optional[List[Document]]:
+        if not self._pending_documents:
+            return None
+        self._pending_documents = False
+        return self.documents
+
+def source_ids(documents: List[Document]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": getattr(document, "id", None),
+            "source": document.metadata.get("source"),
+            "page": document.metadata.get("page")
+        }
+        for document in documents
+    ]
+
+class ChatStream:
+    """
+    Formats chat output for one response. In 'text' mode only answer text is
+    written; 'sse' and 'ndjson' write typed events and coalesce token deltas
+    over the flush interval.
+    """
+
+    def __init__(self, mode: str, flush_interval: float):
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+
+    def event(self, name: str, data: Dict[str, Any]) -> str:
+        if self.mode == "sse":
+            return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+        return json.dumps({"event": name, "data": data}) + "\n"
+
+    def retrieval(self, documents: List[Document]) -> List[str]:
+        if self.mode == "text":
+            return []
+        return [self.event("retrieval", {"sources": source_ids(documents)})]
+
+    def first_token(self, latency: float) -> List[str]:
+        if self.mode == "text":
+            return []
+        return [self.event("first_token", {"latency": latency})]
+
+    def token(self, text: str) -> List[str]:
+        if not text:
+            return []
+        if self.mode == "text":
+            return [text]
+        self._buffer.append(text)
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return []
+        return self.flush()
+
+    def flush(self) -> List[str]:
+        self._last_flush = time.monotonic()
+        if not self._buffer or self.mode == "text":
+            return []
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        return [self.event("token", {"text": text})]
+
+    def done(self, data: Dict[str, Any]) -> List[str]:
+        if self.mode == "text":
+            return []
+        return self.flush() + [self.event("done", data)]
+
+    @property
+    def media_type(self) -> str:
+        if self.mode == "sse":
+            return "text/event-stream"
+        if self.mode == "ndjson":
+            return "application/x-ndjson"
+        return "text/plain"
@@ -0,0 +1,165 @@
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from core.models import RAGConfig
+from config.settings import settings
+from .instrumentation import CONTEXT_TOKENS
+from .tokens import count_tokens, truncate_to_tokens
+from typing import Any, Dict, FrozenSet, List, Tuple
+import re
+import threading
+
+# Chunk overlaps come from the splitter's chunk_overlap, so only the tail of
+# the earlier chunk needs to be searched
+MAX_OVERLAP_CHARS = 400
+# A cut-off document is only worth sending with at least this much of it left
+MIN_PARTIAL_TOKENS = 64
+
+WORD = re.compile(r"\w+")
+
+def shingles(text: str, size: int = 3) -> FrozenSet[Tuple[str, ...]]:
+    words = WORD.findall(text.lower())
+    if len(words) < size:
+        return frozenset([tuple(words)])
+    return frozenset(tuple(words[i:i + size]) for i in range(len(words) - size + 1))
+
+def jaccard(a: FrozenSet, b: FrozenSet) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def overlap_length(first: str, second: str, min_overlap: int) -> int:
+    """Length of the longest suffix of first that is a prefix of second."""
+    tail = first[-MAX_OVERLAP_CHARS:]
+    probe = second[:min_overlap]
+    if len(probe) < min_overlap:
+        return 0
+    start = tail.find(probe)
+    while start != -1:
+        if second.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+def same_source(a: Document, b: Document) -> bool:
+    return a.metadata.get("source") is not None and a.metadata.get("source") == b.metadata.get("source")
+
+class PackedChunk:
+    def __init__(self, document: Document, text: str):
+        self.document = document
+        self.text = text
+        self.shingles = shingles(text)
+
+class ContextPacker:
+    """
+    Packs retrieved documents into the answer prompt: drops near-duplicate
+    chunks, cuts the text chunks share with their neighbours, orders what is
+    left by score and trims it to the agent's context token budget.
+    """
+
+    def __init__(self, default_budget: int, duplicate_threshold: float, min_overlap: int):
+        self.default_budget = default_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.min_overlap = min_overlap
+        self._agents: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def budget_for(self, config: RAGConfig) -> int:
+        return config.context_token_budget or self.default_budget
+
+    def _dedupe(self, documents: List[Document]) -> List[PackedChunk]:
+        # Stable sort, so unscored documents keep the retriever's order
+        ranked = sorted(documents, key=lambda document: -(document.metadata.get("score") or 0.0))
+        kept: List[PackedChunk] = []
+        for document in ranked:
+            text = document.page_content.strip()
+            for other in kept:
+                if not text:
+                    break
+                if text in other.text:
+                    text = ""
+                    break
+                if same_source(document, other.document):
+                    before = overlap_length(other.text, text, self.min_overlap)
+                    if before:
+                        text = text[before:].lstrip()
+                    after = overlap_length(text, other.text, self.min_overlap)
+                    if after:
+                        text = text[:-after].rstrip()
+            # Nothing, or only a sliver, left after cutting the shared text
+            if not text or (len(text) < self.min_overlap and text != document.page_content.strip()):
+                continue
+            chunk = PackedChunk(document, text)
+            if any(jaccard(chunk.shingles, other.shingles) >= self.duplicate_threshold for other in kept):
+                continue
+            kept.append(chunk)
+        return kept
+
+    def pack(self, documents: List[Document], budget: int) -> Tuple[List[Document], int, int]:
+        """Returns the packed documents and the context tokens before and after packing."""
+        tokens_before = sum(count_tokens(document.page_content) for document in documents)
+        packed: List[Document] = []
+        remaining = budget
+        for chunk in self._dedupe(documents):
+            text = chunk.text
+            tokens = count_tokens(text)
+            if tokens > remaining:
+                if remaining < MIN_PARTIAL_TOKENS:
+                    break
+                text = truncate_to_tokens(text, remaining)
+                tokens = remaining
+            packed.append(Document(
+                page_content=text,
+                metadata=chunk.document.metadata,
+                id=getattr(chunk.document, "id", None)
+            ))
+            remaining -= tokens
+            if remaining <= 0:
+                break
+        return packed, tokens_before, budget - remaining
+
+    def record(self, agent_id: str, documents_in: int, documents_out: int, tokens_before: int, tokens_after: int):
+        CONTEXT_TOKENS.labels(agent_id, "before").inc(tokens_before)
+        CONTEXT_TOKENS.labels(agent_id, "after").inc(tokens_after)
+        with self._lock:
+            agent = self._agents.setdefault(agent_id, {
+                "requests": 0, "documents_in": 0, "documents_out": 0, "tokens_before": 0, "tokens_after": 0
+            })
+            agent["requests"] += 1
+            agent["documents_in"] += documents_in
+            agent["documents_out"] += documents_out
+            agent["tokens_before"] += tokens_before
+            agent["tokens_after"] += tokens_after
+
+    def as_runnable(self, config: RAGConfig) -> Runnable:
+        """Packing stage for a retriever's output. The agent id is read from the run metadata."""
+        budget = self.budget_for(config)
+
+        def pack_context(documents: List[Document], config: RunnableConfig) -> List[Document]:
+            if not settings.CONTEXT_PACKING_ENABLED:
+                return documents
+            packed, tokens_before, tokens_after = self.pack(documents, budget)
+            agent_id = (config.get("metadata") or {}).get("agent_id", "unknown")
+            self.record(agent_id, len(documents), len(packed), tokens_before, tokens_after)
+            return packed
+
+        return RunnableLambda(pack_context, name="pack_context")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            agents = {agent_id: dict(agent) for agent_id, agent in self._agents.items()}
+        tokens_before = sum(agent["tokens_before"] for agent in agents.values())
+        tokens_after = sum(agent["tokens_after"] for agent in agents.values())
+        return {
+            "enabled": settings.CONTEXT_PACKING_ENABLED,
+            "default_budget": self.default_budget,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "reduction": 1 - tokens_after / tokens_before if tokens_before else 0.0,
+            "agents": agents
+        }
+
+context_packer = ContextPacker(
+    settings.CONTEXT_TOKEN_BUDGET,
+    settings.CONTEXT_DUPLICATE_THRESHOLD,
+    settings.CONTEXT_MIN_OVERLAP_CHARS
+)
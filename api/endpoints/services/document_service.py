@@ -4,6 +4,8 @@ from langchain_community.document_loaders import PyPDFLoader, UnstructuredWordDo
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from .embeddings_service import EmbeddingsService
 from .storage_service import StorageService
+from .vector_store_registry import vector_store_registry
+from .bm25_index import bm25_registry
 
 class DocumentService:
     def __init__(
@@ -35,8 +37,12 @@ class DocumentService:
             )
             splits = text_splitter.split_documents(docs)
             
-            vector_store = self.embeddings_service.get_vector_store(collection_name)
-            vector_store.add_documents(splits)
+            handle = self.embeddings_service.get_collection_handle(collection_name)
+            with handle.lock:
+                ids = handle.vector_store.add_documents(splits)
+                # Same ids as Chroma, so hybrid search can fuse both rankings
+                bm25_registry.get(collection_name, handle.vector_store).add(ids, splits)
+            vector_store_registry.record_write(handle)
             
             return True
         except Exception as e:
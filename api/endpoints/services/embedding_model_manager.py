@@ -0,0 +1,202 @@
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+from concurrent.futures import Future
+from collections import OrderedDict
+from config.settings import settings
+from typing import Any, Dict, List
+import asyncio
+import queue
+import threading
+import time
+
+class QueryBatcher:
+    """
+    Collects concurrent embed_query calls for one model and runs them as a
+    single embed_documents forward pass.
+    """
+
+    def __init__(self, model: HuggingFaceEmbeddings, max_batch_size: int, max_wait: float):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.queries = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        with self._lock:
+            if not self._stopped:
+                self._queue.put((text, future))
+                return future
+        # The model was evicted after this caller acquired it
+        try:
+            future.set_result(self.model.embed_query(text))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            self._queue.put(None)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._flush(batch)
+                    return
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = self.model.embed_documents(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.queries += len(batch)
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+class ResidentModel:
+    def __init__(self, model: HuggingFaceEmbeddings, batcher: QueryBatcher, size_bytes: int, load_time: float):
+        self.model = model
+        self.batcher = batcher
+        self.size_bytes = size_bytes
+        self.load_time = load_time
+        self.last_used = time.monotonic()
+
+def estimate_model_bytes(model: HuggingFaceEmbeddings) -> int:
+    client = getattr(model, "_client", None)
+    if client is None or not hasattr(client, "parameters"):
+        return 0
+    return sum(p.numel() * p.element_size() for p in client.parameters())
+
+class EmbeddingModelManager:
+    """
+    Loads each HuggingFace embedding model once per process and shares it
+    between requests. Least recently used models are evicted when the
+    resident models exceed the memory budget.
+    """
+
+    def __init__(self, memory_budget_bytes: int, max_batch_size: int, max_wait: float):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._models: "OrderedDict[str, ResidentModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def get_embeddings(self, model_name: str) -> "ManagedHuggingFaceEmbeddings":
+        return ManagedHuggingFaceEmbeddings(model_name=model_name, manager=self)
+
+    def acquire(self, model_name: str) -> ResidentModel:
+        with self._lock:
+            resident = self._models.get(model_name)
+            if resident is not None:
+                self._models.move_to_end(model_name)
+                resident.last_used = time.monotonic()
+                self.hits += 1
+                return resident
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        # Only one thread loads a given model; the others wait and reuse it
+        with load_lock:
+            with self._lock:
+                resident = self._models.get(model_name)
+                if resident is not None:
+                    self.hits += 1
+                    return resident
+            start_time = time.perf_counter()
+            model = HuggingFaceEmbeddings(model_name=model_name)
+            load_time = time.perf_counter() - start_time
+            resident = ResidentModel(
+                model,
+                QueryBatcher(model, self.max_batch_size, self.max_wait),
+                estimate_model_bytes(model),
+                load_time
+            )
+            with self._lock:
+                self._models[model_name] = resident
+                self.loads += 1
+                self._evict_over_budget(keep=model_name)
+            return resident
+
+    def _evict_over_budget(self, keep: str):
+        while sum(m.size_bytes for m in self._models.values()) > self.memory_budget_bytes:
+            victim = next((name for name in self._models if name != keep), None)
+            if victim is None:
+                break
+            self._models.pop(victim).batcher.stop()
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "resident_bytes": sum(m.size_bytes for m in self._models.values()),
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+                "models": [
+                    {
+                        "model": name,
+                        "size_bytes": m.size_bytes,
+                        "load_time": m.load_time,
+                        "batches": m.batcher.batches,
+                        "queries": m.batcher.queries,
+                    }
+                    for name, m in self._models.items()
+                ]
+            }
+
+class ManagedHuggingFaceEmbeddings(Embeddings):
+    """
+    Lightweight handle that resolves the shared model on every call, so
+    cached vector stores never pin an evicted model in memory.
+    """
+
+    def __init__(self, model_name: str, manager: EmbeddingModelManager):
+        self.model_name = model_name
+        self.manager = manager
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.manager.acquire(self.model_name).model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.manager.acquire(self.model_name).batcher.submit(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        resident = await loop.run_in_executor(None, self.manager.acquire, self.model_name)
+        return await asyncio.wrap_future(resident.batcher.submit(text))
+
+embedding_model_manager = EmbeddingModelManager(
+    settings.EMBEDDING_MODEL_MEMORY_BUDGET_BYTES,
+    settings.EMBEDDING_BATCH_MAX_SIZE,
+    settings.EMBEDDING_BATCH_MAX_WAIT_MS / 1000
+)
@@ -1,13 +1,16 @@
 from langchain_openai import OpenAIEmbeddings
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
+from langchain_core.vectorstores import VectorStore
 from core.models import EmbeddingsConfig
+from .embedding_model_manager import embedding_model_manager
+from .vector_store_registry import vector_store_registry, CollectionHandle
 from typing import Optional
+import hashlib
 import os
 
 class EmbeddingsService:
-    def __init__(self, config: Optional[EmbeddingsConfig] = None):
+    def __init__(self, config: Optional[EmbeddingsConfig] = None, vector_storage: Optional[str] = None):
         self.config = config
+        self.vector_storage = vector_storage
 
     def get_embeddings(self):
         if not self.config:
@@ -18,7 +21,7 @@ class EmbeddingsService:
         print(self.config)
 
         if self.config.embedding_type.lower() == 'huggingface':
-            return HuggingFaceEmbeddings(model_name=self.config.huggingface_model)
+            return embedding_model_manager.get_embeddings(self.config.huggingface_model)
         
         return OpenAIEmbeddings(
             model=self.config.model,
@@ -26,6 +29,18 @@ class EmbeddingsService:
             api_key=self.config.api_key
         )
 
-    def get_vector_store(self, collection_name: str):
-        embeddings = self.get_embeddings()
-        return Chroma(collection_name, embedding_function=embeddings, persist_directory='./db')
+    def cache_key(self) -> str:
+        if not self.config:
+            return "default"
+        return hashlib.sha256(self.config.model_dump_json().encode()).hexdigest()
+
+    def get_collection_handle(self, collection_name: str) -> CollectionHandle:
+        return vector_store_registry.get_handle(
+            collection_name,
+            embeddings=self.get_embeddings(),
+            embeddings_key=self.cache_key(),
+            storage=self.vector_storage
+        )
+
+    def get_vector_store(self, collection_name: str) -> VectorStore:
+        return self.get_collection_handle(collection_name).vector_store
@@ -0,0 +1,92 @@
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from core.models import RAGConfig
+from config.settings import settings
+from .tokens import count_message_tokens, count_tokens
+from typing import Dict, List, Optional, Tuple
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "You maintain a running summary of a conversation between a user and an assistant. "
+     "Update the summary with the new messages. Keep facts the user shared about themselves "
+     "and their business, questions asked, and commitments made. Be concise and write plain text."),
+    ("human", "Current summary:\n{summary}\n\nNew messages:\n{messages}\n\nUpdated summary:"),
+])
+
+SUMMARY_ACKNOWLEDGEMENT = "Understood, I have the context of our earlier conversation."
+
+class HistoryManager:
+    """
+    Fits chat history into a per-agent token budget. The most recent turns
+    are kept verbatim; older turns are represented by a rolling summary that
+    is updated in the background, so the request path never waits on it.
+    """
+
+    def __init__(self, default_budget: int, min_recent_messages: int):
+        self.default_budget = default_budget
+        self.min_recent_messages = min_recent_messages
+
+    def budget_for(self, config: RAGConfig) -> int:
+        return config.history_token_budget or self.default_budget
+
+    def split(
+        self,
+        messages: List[Dict[str, str]],
+        budget: int,
+        summary: Optional[str] = None
+    ) -> Tuple[int, List[Dict[str, str]]]:
+        """
+        Returns (number of oldest messages that do not fit, recent messages
+        kept verbatim). The summary's tokens count against the budget.
+        """
+        remaining = budget - count_tokens(summary)
+        kept = 0
+        for message in reversed(messages):
+            tokens = count_message_tokens(message["content"])
+            if kept >= self.min_recent_messages and tokens > remaining:
+                break
+            remaining -= tokens
+            kept += 1
+        overflow = len(messages) - kept
+        return overflow, messages[overflow:]
+
+    def build(
+        self,
+        messages: List[Dict[str, str]],
+        config: RAGConfig,
+        summary: Optional[str] = None
+    ) -> List[BaseMessage]:
+        _, recent = self.split(messages, self.budget_for(config), summary)
+        history: List[BaseMessage] = []
+        if summary:
+            # The prompts already open with their own system message, and many
+            # backends reject a second one mid-conversation. The summary goes
+            # in as a user turn instead, acknowledged when the next kept
+            # message is not an assistant turn, so roles keep alternating.
+            history.append(HumanMessage(content=f"Summary of our earlier conversation: {summary}"))
+            if not recent or recent[0]["role"] == "user":
+                history.append(AIMessage(content=SUMMARY_ACKNOWLEDGEMENT))
+        history.extend(
+            HumanMessage(content=message["content"]) if message["role"] == "user"
+            else AIMessage(content=message["content"])
+            for message in recent
+        )
+        return history
+
+    async def fold(
+        self,
+        llm: BaseChatModel,
+        summary: Optional[str],
+        messages: List[Dict[str, str]]
+    ) -> str:
+        """Folds older messages into the running summary with one LLM call."""
+        formatted = "\n".join(
+            f"{'User' if message['role'] == 'user' else 'Assistant'}: {message['content']}"
+            for message in messages
+        )
+        chain = SUMMARY_PROMPT | llm | StrOutputParser()
+        return await chain.ainvoke({"summary": summary or "(empty)", "messages": formatted})
+
+history_manager = HistoryManager(settings.HISTORY_TOKEN_BUDGET, settings.HISTORY_MIN_RECENT_MESSAGES)
@@ -0,0 +1,156 @@
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import Counter, Histogram
+from .tokens import count_message_tokens, count_tokens
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+import time
+
+STAGE_TAG_PREFIX = "stage:"
+# Run names of the chains that are timed as a whole
+CHAIN_STAGES = {
+    "contextualize_question": "contextualize",
+    "sql_chain": "sql",
+    "stuff_documents_chain": "answer",
+}
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0)
+
+STAGE_DURATION = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each stage of a chat request",
+    ["agent_id", "chain_type", "stage"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "rag_llm_tokens_total",
+    "Prompt and completion tokens per LLM stage",
+    ["agent_id", "chain_type", "stage", "kind"]
+)
+RETRIEVED_DOCUMENTS = Histogram(
+    "rag_retrieved_documents",
+    "Documents returned per retrieval",
+    ["agent_id", "chain_type"],
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50)
+)
+REQUESTS = Counter(
+    "rag_requests_total",
+    "Chat requests by outcome",
+    ["agent_id", "chain_type", "status"]
+)
+CONTEXT_TOKENS = Counter(
+    "rag_context_tokens_total",
+    "Retrieved context tokens before and after packing",
+    ["agent_id", "phase"]
+)
+LLM_QUEUE_WAIT = Histogram(
+    "rag_llm_queue_wait_seconds",
+    "Time requests waited for an LLM concurrency slot",
+    ["endpoint", "priority"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_ADMISSION_REJECTIONS = Counter(
+    "rag_llm_admission_rejections_total",
+    "Requests rejected by LLM admission control",
+    ["endpoint", "priority", "status"]
+)
+
+def stage_tag(stage: str) -> str:
+    return f"{STAGE_TAG_PREFIX}{stage}"
+
+def observe_stage(agent_id: str, chain_type: str, stage: str, seconds: float):
+    STAGE_DURATION.labels(agent_id, chain_type, stage).observe(seconds)
+
+def count_request(agent_id: str, chain_type: str, status: str):
+    REQUESTS.labels(agent_id, chain_type, status).inc()
+
+class StageMetricsCallbackHandler(AsyncCallbackHandler):
+    """
+    Times the stages of a RAG chain run from LangChain callbacks. Chains are
+    timed by run name (CHAIN_STAGES); LLM calls are attributed to the stage
+    tag of the runnable that made them (stage:contextualize,
+    stage:sql_generation, stage:answer).
+    """
+
+    def __init__(self, agent_id: str, chain_type: str):
+        self.agent_id = agent_id
+        self.chain_type = chain_type
+        self._starts: Dict[UUID, float] = {}
+        self._prompt_tokens: Dict[UUID, int] = {}
+        self._stages: Dict[UUID, str] = {}
+
+    def _stage(self, tags: Optional[List[str]]) -> str:
+        # The innermost tag wins, e.g. contextualize inside the retrieval branch
+        for tag in reversed(tags or []):
+            if tag.startswith(STAGE_TAG_PREFIX):
+                return tag[len(STAGE_TAG_PREFIX):]
+        return "llm"
+
+    def _elapsed(self, run_id: UUID) -> Optional[float]:
+        start = self._starts.pop(run_id, None)
+        return time.perf_counter() - start if start is not None else None
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, tags=None, **kwargs: Any):
+        self._starts[run_id] = time.perf_counter()
+        self._stages[run_id] = self._stage(tags)
+        self._prompt_tokens[run_id] = sum(
+            count_message_tokens(message.content if isinstance(message.content, str) else str(message.content))
+            for batch in messages for message in batch
+        )
+
+    async def on_llm_start(self, serialized, prompts, *, run_id: UUID, tags=None, **kwargs: Any):
+        self._starts[run_id] = time.perf_counter()
+        self._stages[run_id] = self._stage(tags)
+        self._prompt_tokens[run_id] = sum(count_tokens(prompt) for prompt in prompts)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        stage = self._stages.pop(run_id, "llm")
+        elapsed = self._elapsed(run_id)
+        if elapsed is not None:
+            observe_stage(self.agent_id, self.chain_type, f"{stage}_llm", elapsed)
+
+        prompt_tokens = self._prompt_tokens.pop(run_id, 0)
+        completion_tokens = 0
+        usage = None
+        for generations in response.generations:
+            for generation in generations:
+                usage = usage or getattr(getattr(generation, "message", None), "usage_metadata", None)
+                completion_tokens += count_tokens(generation.text)
+        if usage:
+            # Prefer the provider's counts over the local estimate
+            prompt_tokens = usage.get("input_tokens", prompt_tokens)
+            completion_tokens = usage.get("output_tokens", completion_tokens)
+        LLM_TOKENS.labels(self.agent_id, self.chain_type, stage, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(self.agent_id, self.chain_type, stage, "completion").inc(completion_tokens)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._starts.pop(run_id, None)
+        self._stages.pop(run_id, None)
+        self._prompt_tokens.pop(run_id, None)
+
+    async def on_retriever_start(self, serialized, query, *, run_id: UUID, **kwargs: Any):
+        self._starts[run_id] = time.perf_counter()
+
+    async def on_retriever_end(self, documents, *, run_id: UUID, **kwargs: Any):
+        elapsed = self._elapsed(run_id)
+        if elapsed is not None:
+            observe_stage(self.agent_id, self.chain_type, "retrieval", elapsed)
+        RETRIEVED_DOCUMENTS.labels(self.agent_id, self.chain_type).observe(len(documents))
+
+    async def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._starts.pop(run_id, None)
+
+    async def on_chain_start(self, serialized, inputs, *, run_id: UUID, name: Optional[str] = None, **kwargs: Any):
+        stage = CHAIN_STAGES.get(name or kwargs.get("run_name", ""))
+        if stage:
+            self._starts[run_id] = time.perf_counter()
+            self._stages[run_id] = stage
+
+    async def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any):
+        stage = self._stages.pop(run_id, None)
+        elapsed = self._elapsed(run_id)
+        if stage and elapsed is not None:
+            observe_stage(self.agent_id, self.chain_type, stage, elapsed)
+
+    async def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._starts.pop(run_id, None)
+        self._stages.pop(run_id, None)
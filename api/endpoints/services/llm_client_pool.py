@@ -0,0 +1,271 @@
+from langchain_openai import ChatOpenAI
+from langchain_google_genai import ChatGoogleGenerativeAI
+from config.settings import settings
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import hashlib
+import threading
+import time
+import httpx
+
+def key_fingerprint(api_key: Optional[str]) -> str:
+    if not api_key:
+        return ""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.tcp_connects = 0
+        self.tls_handshakes = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "tcp_connects": self.tcp_connects,
+            "tls_handshakes": self.tls_handshakes,
+            "reused_connections": max(self.requests - self.tcp_connects, 0)
+        }
+
+    def trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self.tcp_connects += 1
+        elif event_name == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    async def atrace(self, event_name: str, info: dict):
+        self.trace(event_name, info)
+
+class Endpoint:
+    """Keep-alive HTTP clients shared by every chat model that talks to one base URL."""
+
+    def __init__(self, base_url: Optional[str], max_connections: int, max_keepalive: int, timeout: float, connect_timeout: float):
+        self.base_url = base_url
+        self.stats = EndpointStats()
+        self.last_used = time.monotonic()
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_SECONDS
+        )
+        timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http_client = httpx.Client(
+            http2=settings.LLM_HTTP2,
+            limits=limits,
+            timeout=timeout,
+            event_hooks={"request": [self._on_request]}
+        )
+        self.http_async_client = httpx.AsyncClient(
+            http2=settings.LLM_HTTP2,
+            limits=limits,
+            timeout=timeout,
+            event_hooks={"request": [self._on_async_request]}
+        )
+
+    def _on_request(self, request: httpx.Request):
+        self.stats.requests += 1
+        self.last_used = time.monotonic()
+        request.extensions["trace"] = self.stats.trace
+
+    async def _on_async_request(self, request: httpx.Request):
+        self.stats.requests += 1
+        self.last_used = time.monotonic()
+        request.extensions["trace"] = self.stats.atrace
+
+    async def aclose(self):
+        self.http_client.close()
+        await self.http_async_client.aclose()
+
+class LLMClientPool:
+    """
+    Reuses chat model clients keyed by (api_type, base_url, api key
+    fingerprint, model, temperature). OpenAI-compatible models share one
+    pooled HTTP/2 keep-alive client per endpoint.
+
+    At most max_models clients are kept, least recently used first out.
+    Endpoints idle for idle_timeout, or the least recently used ones beyond
+    max_endpoints, are dropped with their clients; their HTTP clients are
+    closed a request timeout later, once nothing can still be using them.
+    """
+
+    def __init__(self, max_models: int, max_endpoints: int, idle_timeout: float, sweep_interval: float = 60.0):
+        self.max_models = max_models
+        self.max_endpoints = max_endpoints
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._models: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._endpoints: "OrderedDict[Tuple[Optional[str], str], Endpoint]" = OrderedDict()
+        self._retired: List[Tuple[float, Endpoint]] = []
+        self._listeners: List[Callable[[], None]] = []
+        self._closing: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def add_eviction_listener(self, listener: Callable[[], None]):
+        """Called after endpoints are dropped, so holders of their clients can let go of them."""
+        self._listeners.append(listener)
+
+    def _get_endpoint(self, base_url: Optional[str], fingerprint: str, limits: Dict[str, Any]) -> Endpoint:
+        key = (base_url, fingerprint)
+        endpoint = self._endpoints.get(key)
+        if endpoint is None:
+            endpoint = Endpoint(
+                base_url,
+                max_connections=limits.get("max_connections", settings.LLM_MAX_CONNECTIONS),
+                max_keepalive=limits.get("max_keepalive_connections", settings.LLM_MAX_KEEPALIVE_CONNECTIONS),
+                timeout=limits.get("timeout", settings.LLM_TIMEOUT_SECONDS),
+                connect_timeout=limits.get("connect_timeout", settings.LLM_CONNECT_TIMEOUT_SECONDS)
+            )
+            self._endpoints[key] = endpoint
+        self._endpoints.move_to_end(key)
+        endpoint.last_used = time.monotonic()
+        return endpoint
+
+    def _evict(self, now: float) -> Tuple[int, List[Endpoint]]:
+        """
+        Drops idle endpoints and returns how many were dropped together with the
+        retired endpoints that are now safe to close. Called with the lock held.
+        """
+        idle_cutoff = now - self.idle_timeout
+        # Endpoints over the size limit still get a request timeout to finish
+        busy_cutoff = now - settings.LLM_TIMEOUT_SECONDS
+        excess = len(self._endpoints) - self.max_endpoints
+        evicted_keys = []
+        for key, endpoint in self._endpoints.items():
+            if endpoint.last_used < idle_cutoff or (excess > 0 and endpoint.last_used < busy_cutoff):
+                evicted_keys.append(key)
+                excess -= 1
+        for key in evicted_keys:
+            self._retired.append((now, self._endpoints.pop(key)))
+        for model_key in [k for k in self._models if k[0] == "OpenAI" and (k[1], k[2]) in evicted_keys]:
+            del self._models[model_key]
+        self.evictions += len(evicted_keys)
+
+        closable = [endpoint for retired_at, endpoint in self._retired if retired_at < busy_cutoff]
+        self._retired = [(retired_at, endpoint) for retired_at, endpoint in self._retired if retired_at >= busy_cutoff]
+        return len(evicted_keys), closable
+
+    def _after_evict(self, evicted: int, closable: List[Endpoint]):
+        if evicted:
+            for listener in self._listeners:
+                listener()
+        if not closable:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        for endpoint in closable:
+            if loop is None:
+                try:
+                    asyncio.run(endpoint.aclose())
+                except Exception as e:
+                    print(f"Error closing LLM endpoint {endpoint.base_url}: {str(e)}")
+            else:
+                task = loop.create_task(endpoint.aclose())
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+
+    def evict_idle(self) -> int:
+        """Drops endpoints that have not been used within the idle timeout."""
+        with self._lock:
+            now = time.monotonic()
+            self._last_sweep = now
+            evicted, closable = self._evict(now)
+        self._after_evict(evicted, closable)
+        return evicted
+
+    def get_chat_model(
+        self,
+        api_type: str,
+        model: str,
+        api_key: Optional[str],
+        base_url: Optional[str] = None,
+        temperature: Optional[float] = None,
+        limits: Optional[Dict[str, Any]] = None
+    ) -> ChatOpenAI | ChatGoogleGenerativeAI:
+        fingerprint = key_fingerprint(api_key)
+        key = (api_type, base_url, fingerprint, model, temperature)
+        evicted, closable = 0, []
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = now
+                evicted, closable = self._evict(now)
+            chat_model = self._models.get(key)
+            if chat_model is not None:
+                self.hits += 1
+                self._models.move_to_end(key)
+                if api_type == "OpenAI":
+                    self._get_endpoint(base_url, fingerprint, limits or {})
+            else:
+                self.misses += 1
+                chat_model = self._create_chat_model(api_type, model, api_key, base_url, temperature, fingerprint, limits)
+                self._models[key] = chat_model
+                while len(self._models) > self.max_models:
+                    self._models.popitem(last=False)
+        self._after_evict(evicted, closable)
+        return chat_model
+
+    def _create_chat_model(
+        self,
+        api_type: str,
+        model: str,
+        api_key: Optional[str],
+        base_url: Optional[str],
+        temperature: Optional[float],
+        fingerprint: str,
+        limits: Optional[Dict[str, Any]]
+    ) -> ChatOpenAI | ChatGoogleGenerativeAI:
+        if api_type == "OpenAI":
+            endpoint = self._get_endpoint(base_url, fingerprint, limits or {})
+            return ChatOpenAI(
+                model=model,
+                base_url=base_url,
+                api_key=api_key,
+                temperature=temperature,
+                http_client=endpoint.http_client,
+                http_async_client=endpoint.http_async_client
+            )
+        if api_type == "Gemini":
+            # The Gemini client manages its own gRPC channel; reusing the
+            # instance keeps that channel open between requests.
+            return ChatGoogleGenerativeAI(
+                model=model,
+                api_key=api_key
+            )
+        raise ValueError(f"Unsupported API type: {api_type}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": len(self._models),
+                "max_clients": self.max_models,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "retired_endpoints": len(self._retired),
+                "endpoints": [
+                    {"base_url": endpoint.base_url or "default", **endpoint.stats.to_dict()}
+                    for endpoint in self._endpoints.values()
+                ]
+            }
+
+    async def aclose(self):
+        with self._lock:
+            endpoints = list(self._endpoints.values()) + [endpoint for _, endpoint in self._retired]
+            self._endpoints.clear()
+            self._retired.clear()
+            self._models.clear()
+        for endpoint in endpoints:
+            await endpoint.aclose()
+
+llm_client_pool = LLMClientPool(
+    settings.LLM_MAX_CLIENTS,
+    settings.LLM_MAX_ENDPOINTS,
+    settings.LLM_ENDPOINT_IDLE_SECONDS
+)
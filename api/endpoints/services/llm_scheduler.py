@@ -0,0 +1,177 @@
+from config.settings import settings
+from .instrumentation import LLM_QUEUE_WAIT, LLM_ADMISSION_REJECTIONS
+from typing import Any, Dict, List, Optional
+import asyncio
+import heapq
+import itertools
+import time
+
+# Lower values are admitted first
+PRIORITY_CHAT = 0
+PRIORITY_EVALUATION = 1
+PRIORITY_NAMES = {PRIORITY_CHAT: "chat", PRIORITY_EVALUATION: "evaluation"}
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request cannot get an LLM slot. status_code is 429 when the
+    agent is over its own concurrency cap and 503 when the endpoint or the
+    wait queue is saturated.
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: int = 1):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+class Ticket:
+    """A granted LLM slot. Releasing it more than once is a no-op."""
+
+    def __init__(self, scheduler: "LLMScheduler", endpoint: str, agent_id: str):
+        self._scheduler = scheduler
+        self.endpoint = endpoint
+        self.agent_id = agent_id
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._scheduler._release(self)
+
+class Waiter:
+    def __init__(self, priority: int, sequence: int, endpoint: str, endpoint_limit: int, agent_id: str):
+        self.priority = priority
+        self.sequence = sequence
+        self.endpoint = endpoint
+        self.endpoint_limit = endpoint_limit
+        self.agent_id = agent_id
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "Waiter") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+class LLMScheduler:
+    """
+    Admission control in front of the upstream LLMs. A request holds one slot
+    for the whole chain run; slots are capped per endpoint and per agent, and
+    requests that cannot run wait in a bounded priority queue until their
+    deadline.
+    """
+
+    def __init__(self, endpoint_limit: int, agent_limit: int, max_queue: int):
+        self.endpoint_limit = endpoint_limit
+        self.agent_limit = agent_limit
+        self.max_queue = max_queue
+        self._active_endpoints: Dict[str, int] = {}
+        self._active_agents: Dict[str, int] = {}
+        self._waiting: List[Waiter] = []
+        self._sequence = itertools.count()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = {429: 0, 503: 0}
+        self.wait_time = 0.0
+
+    def _can_run(self, endpoint: str, endpoint_limit: int, agent_id: str) -> bool:
+        return (
+            self._active_endpoints.get(endpoint, 0) < endpoint_limit
+            and self._active_agents.get(agent_id, 0) < self.agent_limit
+        )
+
+    def _grant(self, endpoint: str, agent_id: str) -> Ticket:
+        self._active_endpoints[endpoint] = self._active_endpoints.get(endpoint, 0) + 1
+        self._active_agents[agent_id] = self._active_agents.get(agent_id, 0) + 1
+        self.admitted += 1
+        return Ticket(self, endpoint, agent_id)
+
+    def _reject(self, status_code: int, detail: str, endpoint: str, priority: int) -> AdmissionRejected:
+        self.rejected[status_code] += 1
+        LLM_ADMISSION_REJECTIONS.labels(endpoint, PRIORITY_NAMES.get(priority, str(priority)), str(status_code)).inc()
+        return AdmissionRejected(status_code, detail)
+
+    async def acquire(
+        self,
+        endpoint: str,
+        agent_id: str,
+        priority: int = PRIORITY_CHAT,
+        timeout: Optional[float] = None,
+        endpoint_limit: Optional[int] = None
+    ) -> Ticket:
+        endpoint_limit = endpoint_limit or self.endpoint_limit
+        priority_name = PRIORITY_NAMES.get(priority, str(priority))
+        if self._can_run(endpoint, endpoint_limit, agent_id):
+            LLM_QUEUE_WAIT.labels(endpoint, priority_name).observe(0.0)
+            return self._grant(endpoint, agent_id)
+
+        if len(self._waiting) >= self.max_queue:
+            raise self._reject(503, "LLM queue is full, try again later", endpoint, priority)
+
+        waiter = Waiter(priority, next(self._sequence), endpoint, endpoint_limit, agent_id)
+        heapq.heappush(self._waiting, waiter)
+        self.queued += 1
+        start = time.perf_counter()
+        try:
+            ticket = await asyncio.wait_for(waiter.future, timeout or settings.LLM_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self._remove(waiter)
+            if self._active_agents.get(agent_id, 0) >= self.agent_limit:
+                raise self._reject(429, "Too many concurrent requests for this agent", endpoint, priority)
+            raise self._reject(503, "LLM endpoint is saturated, try again later", endpoint, priority)
+        except asyncio.CancelledError:
+            self._remove(waiter)
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.wait_time += waited
+            LLM_QUEUE_WAIT.labels(endpoint, priority_name).observe(waited)
+        return ticket
+
+    def _remove(self, waiter: Waiter):
+        if waiter in self._waiting:
+            self._waiting.remove(waiter)
+            heapq.heapify(self._waiting)
+        # Granted between the deadline and the cancellation
+        if waiter.future.done() and not waiter.future.cancelled():
+            waiter.future.result().release()
+
+    def _release(self, ticket: Ticket):
+        self._active_endpoints[ticket.endpoint] -= 1
+        if not self._active_endpoints[ticket.endpoint]:
+            del self._active_endpoints[ticket.endpoint]
+        self._active_agents[ticket.agent_id] -= 1
+        if not self._active_agents[ticket.agent_id]:
+            del self._active_agents[ticket.agent_id]
+        self._dispatch()
+
+    def _dispatch(self):
+        # Highest priority first; waiters blocked by their own agent or
+        # endpoint cap do not hold back the ones behind them
+        remaining = []
+        for waiter in sorted(self._waiting):
+            if waiter.future.done():
+                continue
+            if self._can_run(waiter.endpoint, waiter.endpoint_limit, waiter.agent_id):
+                waiter.future.set_result(self._grant(waiter.endpoint, waiter.agent_id))
+            else:
+                remaining.append(waiter)
+        self._waiting = remaining
+        heapq.heapify(self._waiting)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "endpoint_limit": self.endpoint_limit,
+            "agent_limit": self.agent_limit,
+            "active_endpoints": dict(self._active_endpoints),
+            "active_agents": len(self._active_agents),
+            "waiting": len(self._waiting),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+            "average_wait": self.wait_time / self.queued if self.queued else 0.0
+        }
+
+llm_scheduler = LLMScheduler(
+    settings.LLM_ENDPOINT_MAX_CONCURRENCY,
+    settings.LLM_AGENT_MAX_CONCURRENCY,
+    settings.LLM_QUEUE_MAX_SIZE
+)
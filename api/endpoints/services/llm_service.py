@@ -1,6 +1,8 @@
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 from core.models import LLMConfig, RAGConfig
+from .llm_client_pool import llm_client_pool, key_fingerprint
+from typing import Optional, Tuple
 import os
 
 class LLMService:
@@ -9,7 +11,6 @@ class LLMService:
 
     def get_llm(self, config: RAGConfig) -> ChatOpenAI | ChatGoogleGenerativeAI:
         if config.advancedLLMConfig:
-            print(config.advancedLLMConfig.api_key)
             return self._get_llm_advanced(config.advancedLLMConfig)
         
         model_name = config.llm
@@ -19,24 +20,52 @@ class LLMService:
             raise ValueError(f"Model {model_name} not found in configuration")
         
         if model_config["api_type"] == "OpenAI":
-            return ChatOpenAI(
+            return llm_client_pool.get_chat_model(
+                "OpenAI",
                 model=model_name,
                 base_url=model_config.get("base_url"),
                 api_key=os.getenv(model_config["api_key_env"]),
-                temperature=model_config.get("temperature", 0.7)
+                temperature=model_config.get("temperature", 0.7),
+                limits=model_config.get("limits")
             )
         elif model_config["api_type"] == "Gemini":
-            return ChatGoogleGenerativeAI(
+            return llm_client_pool.get_chat_model(
+                "Gemini",
                 model=model_name,
                 api_key=os.getenv(model_config["api_key_env"])
             )
         else:
             raise ValueError(f"Unsupported API type: {model_config['api_type']}")
 
+    def get_endpoint(self, config: RAGConfig) -> Tuple[str, Optional[int]]:
+        """
+        Returns the name of the upstream endpoint the agent's LLM calls go to
+        and its concurrency cap from the models config, if one is set.
+        """
+        if config.advancedLLMConfig:
+            llm_config = config.advancedLLMConfig
+            return self._endpoint_name(llm_config.api_type, llm_config.base_url, llm_config.api_key), None
+
+        model_config = self.models_config.get(config.llm)
+        if not model_config:
+            raise ValueError(f"Model {config.llm} not found in configuration")
+        limits = model_config.get("limits") or {}
+        return self._endpoint_name(
+            model_config["api_type"],
+            model_config.get("base_url"),
+            os.getenv(model_config["api_key_env"])
+        ), limits.get("max_concurrency")
+
+    @staticmethod
+    def _endpoint_name(api_type: str, base_url: Optional[str], api_key: Optional[str]) -> str:
+        # Keys are rate limited separately, so they count as separate endpoints
+        return f"{api_type}:{base_url or 'default'}:{key_fingerprint(api_key)}"
+
     def _get_llm_advanced(self, config: LLMConfig):
-        return ChatOpenAI(
+        return llm_client_pool.get_chat_model(
+            "OpenAI",
             model=config.model,
             base_url=config.base_url,
             api_key=config.api_key,
             temperature=config.temperature
-        )
\ No newline at end of file
+        )
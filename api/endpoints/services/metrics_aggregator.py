@@ -0,0 +1,126 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from config.settings import settings
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import bisect
+
+# Upper bounds in seconds of the latency histogram buckets. The last bucket
+# catches everything slower. Changing these invalidates stored histograms.
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0]
+LATENCY_METRICS = ("first_token_latency", "total_response_time")
+PERCENTILES = (50, 95, 99)
+
+def bucket_index(seconds: float) -> int:
+    return bisect.bisect_left(LATENCY_BUCKETS, seconds)
+
+def histogram_percentile(histogram: Dict[str, int], percentile: float) -> Optional[float]:
+    """Estimates a percentile by interpolating inside the bucket that contains it."""
+    counts = [histogram.get(str(index), 0) for index in range(len(LATENCY_BUCKETS) + 1)]
+    total = sum(counts)
+    if not total:
+        return None
+    rank = total * percentile / 100
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            lower = LATENCY_BUCKETS[index - 1] if index > 0 else 0.0
+            if index == len(LATENCY_BUCKETS):
+                return lower
+            upper = LATENCY_BUCKETS[index]
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+    return LATENCY_BUCKETS[-1]
+
+def merge_histograms(histograms: List[Dict[str, int]]) -> Dict[str, int]:
+    merged: Dict[str, int] = {}
+    for histogram in histograms:
+        for index, count in histogram.items():
+            merged[index] = merged.get(index, 0) + count
+    return merged
+
+def summarize(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds mean and percentile fields derived from the stored sums and histograms."""
+    timed_calls = document.get("timed_calls", 0)
+    for metric in LATENCY_METRICS:
+        histogram = document.get(f"{metric}_histogram")
+        if histogram is None:
+            # Written before histograms existed; the stored mean is all we have
+            continue
+        if timed_calls:
+            document[metric] = document.get(f"{metric}_sum", 0.0) / timed_calls
+        for percentile in PERCENTILES:
+            document[f"{metric}_p{percentile}"] = histogram_percentile(histogram, percentile)
+    return document
+
+class MetricsAggregator:
+    """
+    Collects per-agent, per-day counters and latency histograms in memory
+    and flushes them with one unordered bulk of atomic $inc upserts, so
+    concurrent requests and workers never overwrite each other.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[str, datetime], Dict[str, float]] = {}
+        self.flushes = 0
+        self.flush_errors = 0
+
+    def _increments(self, agent_id: str) -> Dict[str, float]:
+        current_date = datetime.utcnow().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        return self._pending.setdefault((agent_id, current_date), {})
+
+    def increment(self, agent_id: str, field: str, value: float = 1):
+        increments = self._increments(agent_id)
+        increments[field] = increments.get(field, 0) + value
+
+    def record_call(
+        self,
+        agent_id: str,
+        first_token_latency: Optional[float] = None,
+        total_response_time: Optional[float] = None
+    ):
+        self.increment(agent_id, "calls")
+        if first_token_latency is None or total_response_time is None:
+            return
+        self.increment(agent_id, "timed_calls")
+        for metric, seconds in zip(LATENCY_METRICS, (first_token_latency, total_response_time)):
+            self.increment(agent_id, f"{metric}_sum", seconds)
+            self.increment(agent_id, f"{metric}_histogram.{bucket_index(seconds)}")
+
+    async def flush(self, db: AsyncIOMotorDatabase):
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        operations = [
+            UpdateOne(
+                {"agent_id": agent_id, "date": date},
+                {"$inc": increments},
+                upsert=True
+            )
+            for (agent_id, date), increments in pending.items()
+        ]
+        try:
+            await db.metrics.bulk_write(operations, ordered=False)
+            self.flushes += 1
+        except Exception as e:
+            self.flush_errors += 1
+            print(f"Error flushing metrics: {str(e)}")
+            # Put the increments back so the next flush retries them
+            for key, increments in pending.items():
+                merged = self._pending.setdefault(key, {})
+                for field, value in increments.items():
+                    merged[field] = merged.get(field, 0) + value
+
+    async def run(self, db: AsyncIOMotorDatabase):
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush(db)
+        finally:
+            await self.flush(db)
+
+metrics_aggregator = MetricsAggregator(settings.METRICS_FLUSH_INTERVAL_SECONDS)
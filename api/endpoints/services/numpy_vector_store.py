@@ -0,0 +1,594 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from config.settings import settings
+from .retrievers import matches_filter
+from .bm25_index import check_collection_name
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import json
+import numpy as np
+import os
+import shutil
+import threading
+import uuid
+
+NUMPY_MODES = ("float32", "int8", "binary")
+QUANTIZED_MODES = ("int8", "binary")
+# Rows scored per block, so the float32 copy of a block stays small
+BLOCK_ROWS = 4096
+# Compaction is not worth a rewrite for a handful of dead rows
+MIN_COMPACTION_ROWS = 64
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 codes and the scales that map them back."""
+    peaks = np.abs(vectors).max(axis=1)
+    peaks[peaks == 0] = 1.0
+    scales = (peaks / 127).astype(np.float32)
+    codes = np.clip(np.round(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    return np.packbits(vectors > 0, axis=1)
+
+def maximal_marginal_relevance(query: np.ndarray, vectors: np.ndarray, lambda_mult: float, k: int) -> List[int]:
+    if not len(vectors):
+        return []
+    relevance = vectors @ query
+    selected = [int(np.argmax(relevance))]
+    while len(selected) < min(k, len(vectors)):
+        redundancy = (vectors @ vectors[selected].T).max(axis=1)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        selected.append(int(np.argmax(scores)))
+    return selected
+
+class Snapshot(NamedTuple):
+    directory: Path
+    ids: List[str]
+    offsets: List[int]
+    codes: Optional[np.ndarray]
+    scales: Optional[np.ndarray]
+    vectors: Optional[np.ndarray]
+    dead: np.ndarray
+
+class NumpyIndex:
+    """
+    On-disk store of one collection. The normalized float32 vectors are
+    memory-mapped and chunk text and metadata live in a JSON lines side file.
+    In float32 mode every search is an exact blocked scan of the mapped
+    vectors. In int8 and binary mode, quantized codes (int8 with per-vector
+    scales, or packed sign bits) stay in memory for the first pass, and only
+    the candidates being rescored are read from the mapped vectors.
+
+    Writes only append: re-added ids and deletions turn earlier rows into
+    dead rows, which compaction drops by rewriting the live rows into a new
+    generation. The row count is the shortest of the data files, so a write
+    cut short is dropped on the next load.
+    """
+
+    def __init__(self, directory: Path, mode: str, compaction_threshold: float = 0.2):
+        self.directory = directory
+        self.mode = mode
+        self.compaction_threshold = compaction_threshold
+        self.dimension = 0
+        self.generation = 0
+        self.compactions = 0
+        # Row of each live id; only used by writers
+        self._positions: Dict[str, int] = {}
+        # Swapped whole on every write, so searches never see a partial append
+        self._snapshot = self._empty_snapshot()
+        self._lock = threading.Lock()
+        # Readers per generation directory; a stale generation is removed
+        # once nobody reads it
+        self._pins: Dict[Path, int] = {}
+        self._pins_lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        snapshot = self._snapshot
+        return len(snapshot.ids) - int(np.count_nonzero(snapshot.dead))
+
+    @property
+    def dead_rows(self) -> int:
+        return int(np.count_nonzero(self._snapshot.dead))
+
+    @property
+    def code_width(self) -> int:
+        if self.mode == "int8":
+            return self.dimension
+        return (self.dimension + 7) // 8 if self.mode == "binary" else 0
+
+    @property
+    def bytes_per_vector(self) -> int:
+        # float32 scans page the whole mapped file in
+        if self.mode == "float32":
+            return self.dimension * 4
+        return self.code_width + (4 if self.mode == "int8" else 0)
+
+    @property
+    def resident_bytes(self) -> int:
+        return len(self._snapshot.ids) * self.bytes_per_vector
+
+    def _generation_directory(self, generation: int) -> Path:
+        # Generation 0 lives in the index directory itself
+        return self.directory if not generation else self.directory / f"generation-{generation}"
+
+    def _empty_snapshot(self) -> Snapshot:
+        return Snapshot(self._generation_directory(self.generation), [], [], None, None, None, np.zeros(0, dtype=bool))
+
+    def _write_meta(self):
+        # Replaced atomically: the meta file decides which generation is current
+        path = self.directory / "meta.json"
+        temporary = self.directory / "meta.json.tmp"
+        temporary.write_text(json.dumps({"mode": self.mode, "dimension": self.dimension, "generation": self.generation}))
+        os.replace(temporary, path)
+
+    @staticmethod
+    def _read(path: Path, dtype) -> np.ndarray:
+        return np.fromfile(path, dtype=dtype) if path.exists() else np.empty(0, dtype=dtype)
+
+    def _load(self):
+        meta_path = self.directory / "meta.json"
+        if not meta_path.exists():
+            return
+        meta = json.loads(meta_path.read_text())
+        # The stored mode wins over the configured one
+        self.mode = meta["mode"]
+        self.dimension = meta["dimension"]
+        self.generation = meta.get("generation", 0)
+        directory = self._generation_directory(self.generation)
+
+        ids, offsets = [], []
+        documents_end = 0
+        documents_path = directory / "documents.jsonl"
+        if documents_path.exists():
+            with documents_path.open("rb") as f:
+                offset = 0
+                for line in f:
+                    if line.endswith(b"\n"):
+                        ids.append(json.loads(line)["id"])
+                        offsets.append(offset)
+                        documents_end = offset + len(line)
+                    offset += len(line)
+
+        vectors_path = directory / "vectors.f32"
+        count = min(len(ids), vectors_path.stat().st_size // (self.dimension * 4) if vectors_path.exists() else 0)
+        codes = scales = None
+        if self.mode in QUANTIZED_MODES:
+            codes = self._read(directory / "codes.bin", np.int8 if self.mode == "int8" else np.uint8)
+            codes = codes[:len(codes) // self.code_width * self.code_width].reshape(-1, self.code_width)
+            count = min(count, len(codes))
+        if self.mode == "int8":
+            scales = self._read(directory / "scales.f32", np.float32)
+            count = min(count, len(scales))
+            scales = scales[:count]
+        if codes is not None:
+            codes = codes[:count]
+        if count < len(offsets):
+            documents_end = offsets[count]
+        ids, offsets = ids[:count], offsets[:count]
+        self._truncate(directory, count, documents_end)
+
+        # Later rows of an id replace earlier ones; deleted rows are journaled
+        dead = np.zeros(count, dtype=bool)
+        for row, document_id in enumerate(ids):
+            previous = self._positions.get(document_id)
+            if previous is not None:
+                dead[previous] = True
+            self._positions[document_id] = row
+        deleted = self._read(directory / "deleted.bin", np.int64)
+        for row in deleted[deleted < count].tolist():
+            dead[row] = True
+            if self._positions.get(ids[row]) == row:
+                del self._positions[ids[row]]
+
+        self._snapshot = Snapshot(directory, ids, offsets, codes, scales, self._map_vectors(directory, count), dead)
+        self._remove_stale_generations()
+
+    def _truncate(self, directory: Path, count: int, documents_end: int):
+        """Cuts off what a write cut short left behind, so later appends line up with the rows."""
+        sizes = {"documents.jsonl": documents_end, "vectors.f32": count * self.dimension * 4}
+        if self.mode in QUANTIZED_MODES:
+            sizes["codes.bin"] = count * self.code_width
+        if self.mode == "int8":
+            sizes["scales.f32"] = count * 4
+        deleted_path = directory / "deleted.bin"
+        if deleted_path.exists():
+            sizes["deleted.bin"] = deleted_path.stat().st_size // 8 * 8
+        for name, size in sizes.items():
+            path = directory / name
+            if path.exists() and path.stat().st_size > size:
+                with path.open("r+b") as f:
+                    f.truncate(size)
+
+    def _map_vectors(self, directory: Path, count: int) -> Optional[np.ndarray]:
+        if not count:
+            return None
+        return np.memmap(directory / "vectors.f32", dtype=np.float32, mode="r", shape=(count, self.dimension))
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        if self.mode == "int8":
+            return quantize_int8(vectors)
+        if self.mode == "binary":
+            return quantize_binary(vectors), None
+        return None, None
+
+    def add_vectors(
+        self,
+        ids: List[str],
+        vectors: np.ndarray,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]]
+    ):
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            if not self.dimension:
+                self.dimension = vectors.shape[1]
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._write_meta()
+            if vectors.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-d vectors, got {vectors.shape[1]}-d")
+
+            current = self._snapshot
+            directory = current.directory
+            codes, scales = self._quantize(vectors)
+            if scales is not None:
+                with (directory / "scales.f32").open("ab") as f:
+                    scales.tofile(f)
+            if codes is not None:
+                with (directory / "codes.bin").open("ab") as f:
+                    codes.tofile(f)
+            with (directory / "vectors.f32").open("ab") as f:
+                vectors.tofile(f)
+            offsets = []
+            with (directory / "documents.jsonl").open("ab") as f:
+                for document_id, text, metadata in zip(ids, texts, metadatas):
+                    offsets.append(f.tell())
+                    record = {"id": document_id, "text": text, "metadata": metadata or {}}
+                    f.write((json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+
+            count = len(current.ids) + len(ids)
+            dead = np.concatenate([current.dead, np.zeros(len(ids), dtype=bool)])
+            for row, document_id in enumerate(ids, start=len(current.ids)):
+                previous = self._positions.get(document_id)
+                if previous is not None:
+                    dead[previous] = True
+                self._positions[document_id] = row
+            self._snapshot = Snapshot(
+                directory,
+                current.ids + list(ids),
+                current.offsets + offsets,
+                codes if current.codes is None else np.concatenate([current.codes, codes]),
+                scales if current.scales is None else np.concatenate([current.scales, scales]),
+                self._map_vectors(directory, count),
+                dead
+            )
+            self._maybe_compact()
+
+    def delete(self, ids: Iterable[str]) -> int:
+        with self._lock:
+            rows = [self._positions.pop(document_id) for document_id in ids if document_id in self._positions]
+            if not rows:
+                return 0
+            current = self._snapshot
+            with (current.directory / "deleted.bin").open("ab") as f:
+                np.asarray(rows, dtype=np.int64).tofile(f)
+            dead = current.dead.copy()
+            dead[rows] = True
+            self._snapshot = current._replace(dead=dead)
+            self._maybe_compact()
+            return len(rows)
+
+    def _maybe_compact(self):
+        snapshot = self._snapshot
+        dead = int(np.count_nonzero(snapshot.dead))
+        if dead >= MIN_COMPACTION_ROWS and dead > self.compaction_threshold * len(snapshot.ids):
+            self._compact()
+
+    def compact(self):
+        with self._lock:
+            if np.count_nonzero(self._snapshot.dead):
+                self._compact()
+
+    def _compact(self):
+        """Rewrites the live rows into the next generation. Called with the write lock held."""
+        current = self._snapshot
+        live = np.flatnonzero(~current.dead)
+        generation = self.generation + 1
+        directory = self._generation_directory(generation)
+        shutil.rmtree(directory, ignore_errors=True)
+        directory.mkdir(parents=True)
+
+        with (directory / "vectors.f32").open("wb") as f:
+            for start in range(0, len(live), BLOCK_ROWS):
+                np.asarray(current.vectors[live[start:start + BLOCK_ROWS]]).tofile(f)
+        codes = current.codes[live] if current.codes is not None else None
+        scales = current.scales[live] if current.scales is not None else None
+        if codes is not None:
+            codes.tofile(str(directory / "codes.bin"))
+        if scales is not None:
+            scales.tofile(str(directory / "scales.f32"))
+        offsets = []
+        with (current.directory / "documents.jsonl").open("rb") as source, (directory / "documents.jsonl").open("wb") as f:
+            for row in live.tolist():
+                source.seek(current.offsets[row])
+                offsets.append(f.tell())
+                f.write(source.readline())
+
+        ids = [current.ids[row] for row in live.tolist()]
+        self._positions = {document_id: row for row, document_id in enumerate(ids)}
+        snapshot = Snapshot(
+            directory, ids, offsets, codes, scales,
+            self._map_vectors(directory, len(ids)), np.zeros(len(ids), dtype=bool)
+        )
+        # Swapped together, so a reader leaving never sees the new generation
+        # number while the old one is still current
+        with self._pins_lock:
+            self.generation = generation
+            self._snapshot = snapshot
+        self._write_meta()
+        self.compactions += 1
+        self._remove_stale_generations()
+
+    def _remove_stale_generations(self):
+        """Removes the generations before the current one that no reader has pinned."""
+        with self._pins_lock:
+            for generation in range(self.generation):
+                directory = self._generation_directory(generation)
+                if directory not in self._pins:
+                    self._remove_generation(generation, directory)
+
+    @staticmethod
+    def _remove_generation(generation: int, directory: Path):
+        if generation:
+            shutil.rmtree(directory, ignore_errors=True)
+        else:
+            for name in ("vectors.f32", "codes.bin", "scales.f32", "documents.jsonl", "deleted.bin"):
+                (directory / name).unlink(missing_ok=True)
+
+    def _first_pass(self, snapshot: Snapshot, query: np.ndarray, candidates: int) -> np.ndarray:
+        count = len(snapshot.ids)
+        dead = snapshot.dead
+        live = count - int(np.count_nonzero(dead))
+        if candidates >= live:
+            return np.flatnonzero(~dead)
+        scores = np.empty(count, dtype=np.float32)
+        if self.mode == "binary":
+            query_bits = quantize_binary(query[None, :])[0]
+        for start in range(0, count, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, count)
+            if self.mode == "float32":
+                scores[start:end] = np.asarray(snapshot.vectors[start:end]) @ query
+            elif self.mode == "int8":
+                scores[start:end] = (snapshot.codes[start:end].astype(np.float32) @ query) * snapshot.scales[start:end]
+            else:
+                # Negated Hamming distance between the sign bits
+                scores[start:end] = -POPCOUNT[np.bitwise_xor(snapshot.codes[start:end], query_bits)].sum(axis=1, dtype=np.int32)
+        scores[dead] = -np.inf
+        return np.argpartition(-scores, candidates - 1)[:candidates]
+
+    @contextmanager
+    def pinned(self) -> Iterator[Snapshot]:
+        """
+        The current generation and rows. Rows are only meaningful within the
+        snapshot they came from, so readers pass it along; its files are kept
+        until the block exits, however many compactions happen meanwhile.
+        """
+        with self._pins_lock:
+            snapshot = self._snapshot
+            self._pins[snapshot.directory] = self._pins.get(snapshot.directory, 0) + 1
+        try:
+            yield snapshot
+        finally:
+            with self._pins_lock:
+                self._pins[snapshot.directory] -= 1
+                released = not self._pins[snapshot.directory]
+                if released:
+                    del self._pins[snapshot.directory]
+            if released and snapshot.directory != self._snapshot.directory:
+                self._remove_stale_generations()
+
+    def search(self, snapshot: Snapshot, query: np.ndarray, candidates: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the snapshot's candidate rows ordered by exact cosine
+        similarity, their similarities and their full-precision vectors.
+        """
+        if snapshot.vectors is None:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, np.empty(0, dtype=np.float32), np.empty((0, self.dimension), dtype=np.float32)
+        # Sorted rows keep the memory-mapped reads sequential
+        rows = np.sort(self._first_pass(snapshot, query, candidates))
+        full = np.asarray(snapshot.vectors[rows])
+        exact = full @ query
+        order = np.argsort(-exact)
+        return rows[order], exact[order], full[order]
+
+    def live_rows(self, snapshot: Snapshot) -> np.ndarray:
+        return np.flatnonzero(~snapshot.dead)
+
+    def documents(self, snapshot: Snapshot, rows: Iterable[int]) -> List[Document]:
+        rows = list(rows)
+        if not rows:
+            return []
+        documents = []
+        with (snapshot.directory / "documents.jsonl").open("rb") as f:
+            for row in rows:
+                f.seek(snapshot.offsets[row])
+                record = json.loads(f.readline())
+                documents.append(Document(page_content=record["text"], metadata=record["metadata"], id=snapshot.ids[row]))
+        return documents
+
+    def vectors(self, snapshot: Snapshot, rows: Iterable[int]) -> np.ndarray:
+        rows = list(rows)
+        if not rows:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.asarray(snapshot.vectors[rows])
+
+_indexes: Dict[str, NumpyIndex] = {}
+_indexes_lock = threading.Lock()
+
+def numpy_store_path(collection_name: str) -> Path:
+    """
+    Directory of the collection's store. Stores of the earlier quantized
+    backend have the same layout and are served from QUANTIZED_STORE_DIR
+    until the collection has one under NUMPY_STORE_DIR.
+    """
+    check_collection_name(collection_name)
+    path = Path(settings.NUMPY_STORE_DIR) / collection_name
+    legacy = Path(settings.QUANTIZED_STORE_DIR) / collection_name
+    if not path.exists() and legacy.exists():
+        return legacy
+    return path
+
+def drop_index(collection_name: str):
+    """Forgets the collection's index and deletes its store, including one left in QUANTIZED_STORE_DIR."""
+    check_collection_name(collection_name)
+    with _indexes_lock:
+        for directory in (Path(settings.NUMPY_STORE_DIR) / collection_name, Path(settings.QUANTIZED_STORE_DIR) / collection_name):
+            index = _indexes.pop(str(directory), None)
+            if index is None:
+                shutil.rmtree(directory, ignore_errors=True)
+                continue
+            # Waits for a write in progress
+            with index._lock:
+                shutil.rmtree(directory, ignore_errors=True)
+
+def open_index(collection_name: str, mode: str) -> NumpyIndex:
+    """One index per collection and process, shared by every embedding function's store."""
+    directory = numpy_store_path(collection_name)
+    with _indexes_lock:
+        index = _indexes.get(str(directory))
+        if index is None:
+            index = NumpyIndex(directory, mode, settings.VECTOR_COMPACTION_THRESHOLD)
+            _indexes[str(directory)] = index
+        return index
+
+class NumpyVectorStore(VectorStore):
+    """
+    LangChain vector store over a NumpyIndex. For quantized indexes the first
+    pass picks rescore_multiplier * k candidates, which are rescored exactly
+    against the full-precision vectors. Scores are cosine similarities.
+    """
+
+    def __init__(self, index: NumpyIndex, embedding: Embeddings, rescore_multiplier: int = 4):
+        self.index = index
+        self._embedding = embedding
+        self.rescore_multiplier = rescore_multiplier
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return lambda score: score
+
+    def _pool(self, k: int) -> int:
+        # float32 scores are already exact
+        return k * self.rescore_multiplier if self.index.mode in QUANTIZED_MODES else k
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = np.asarray(self._embedding.embed_documents(texts), dtype=np.float32)
+        self.index.add_vectors(ids, vectors, texts, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            return False
+        self.index.delete(ids)
+        return True
+
+    def _query_vector(self, query: str) -> np.ndarray:
+        return normalize_rows(np.asarray(self._embedding.embed_query(query), dtype=np.float32))
+
+    def _candidates(self, query: np.ndarray, count: int, filter: Optional[Dict[str, Any]]):
+        # A filter is applied after rescoring, so over-fetch for it
+        with self.index.pinned() as snapshot:
+            rows, scores, vectors = self.index.search(snapshot, query, count * (4 if filter else 1))
+            documents = self.index.documents(snapshot, rows)
+        if filter:
+            keep = [i for i, document in enumerate(documents) if matches_filter(document.metadata, filter)][:count]
+            return [documents[i] for i in keep], scores[keep], vectors[keep]
+        return documents, scores, vectors
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        documents, scores, _ = self._candidates(self._query_vector(query), self._pool(k), filter)
+        return [(document, float(score)) for document, score in zip(documents[:k], scores[:k])]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        query_vector = self._query_vector(query)
+        documents, _, vectors = self._candidates(query_vector, self._pool(fetch_k), filter)
+        documents, vectors = documents[:fetch_k], vectors[:fetch_k]
+        return [documents[i] for i in maximal_marginal_relevance(query_vector, vectors, lambda_mult, k)]
+
+    def get(
+        self,
+        include: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """Chroma-compatible paging over the live chunks."""
+        with self.index.pinned() as snapshot:
+            rows = self.index.live_rows(snapshot)[offset:offset + limit if limit else None]
+            documents = self.index.documents(snapshot, rows)
+            result = {
+                "ids": [document.id for document in documents],
+                "documents": [document.page_content for document in documents],
+                "metadatas": [document.metadata for document in documents]
+            }
+            if include and "embeddings" in include:
+                result["embeddings"] = self.index.vectors(snapshot, rows)
+        return result
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        collection_name: str = "default",
+        mode: str = "float32",
+        **kwargs: Any
+    ) -> "NumpyVectorStore":
+        store = cls(open_index(collection_name, mode), embedding)
+        store.add_texts(texts, metadatas, **kwargs)
+        return store
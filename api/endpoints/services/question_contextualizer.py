@@ -0,0 +1,130 @@
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from collections import OrderedDict
+from config.settings import settings
+from .instrumentation import stage_tag
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import json
+import re
+import threading
+
+# Words that usually point back into the conversation ("how much does *it* cost?")
+REFERENCE_WORDS = {
+    "it", "its", "it's", "itself", "this", "that", "these", "those", "they", "them",
+    "their", "theirs", "he", "him", "his", "she", "her", "hers", "there", "above",
+    "previous", "former", "latter", "same", "one", "ones", "else", "other", "more"
+}
+# Openers of elliptical follow-ups ("and for enterprises?", "what about pricing?")
+CONTINUATION_STARTERS = {"and", "also", "but", "so", "then", "or", "why", "how about", "what about", "what else"}
+MIN_STANDALONE_WORDS = 3
+
+def _words(text: str):
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+def is_standalone(question: str) -> bool:
+    """Cheap local check whether a follow-up can be retrieved on without rewriting."""
+    words = _words(question)
+    if len(words) < MIN_STANDALONE_WORDS:
+        return False
+    opener = " ".join(words[:2])
+    if words[0] in CONTINUATION_STARTERS or opener in CONTINUATION_STARTERS:
+        return False
+    return not any(word in REFERENCE_WORDS for word in words)
+
+def history_key(namespace: str, chat_history, question: str) -> str:
+    messages = [
+        (getattr(message, "type", None), getattr(message, "content", message))
+        for message in chat_history
+    ]
+    payload = json.dumps([namespace, messages, question], default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class QuestionContextualizer:
+    """
+    Decides whether a question needs the contextualization LLM call, caches
+    rewrites by a hash of the history, and counts which path was taken.
+    """
+
+    PATHS = ("no_history", "standalone", "cached_rewrite", "rewrite")
+
+    def __init__(self, max_rewrites: int):
+        self.max_rewrites = max_rewrites
+        self._rewrites: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.paths = {path: 0 for path in self.PATHS}
+
+    def resolve(self, inputs: Dict[str, Any], namespace: str = "") -> Tuple[str, Optional[str], str]:
+        """Returns (path, question or None if a rewrite is needed, cache key)."""
+        question = inputs["input"]
+        chat_history = inputs.get("chat_history") or []
+        if not chat_history:
+            return "no_history", question, ""
+        if settings.CONTEXTUALIZE_SKIP_STANDALONE and is_standalone(question):
+            return "standalone", question, ""
+        key = history_key(namespace, chat_history, question)
+        with self._lock:
+            rewrite = self._rewrites.get(key)
+            if rewrite is not None:
+                self._rewrites.move_to_end(key)
+                return "cached_rewrite", rewrite, key
+        return "rewrite", None, key
+
+    def store(self, key: str, rewrite: str):
+        with self._lock:
+            self._rewrites[key] = rewrite
+            self._rewrites.move_to_end(key)
+            while len(self._rewrites) > self.max_rewrites:
+                self._rewrites.popitem(last=False)
+
+    def record(self, path: str):
+        with self._lock:
+            self.paths[path] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(self.paths.values())
+            return {
+                "paths": dict(self.paths),
+                "llm_calls_skipped": total - self.paths["rewrite"],
+                "cached_rewrites": len(self._rewrites)
+            }
+
+question_contextualizer = QuestionContextualizer(settings.CONTEXTUALIZE_CACHE_SIZE)
+
+def create_contextualizing_retriever(
+    llm: BaseChatModel,
+    retriever: BaseRetriever,
+    prompt: ChatPromptTemplate
+) -> Runnable:
+    """
+    Drop-in replacement for create_history_aware_retriever that only calls
+    the LLM to rewrite questions that depend on the chat history.
+    """
+    rewrite_chain = (prompt | llm | StrOutputParser()).with_config(tags=[stage_tag("contextualize")])
+    # Agents with different contextualization prompts must not share rewrites
+    namespace = hashlib.sha256(repr(prompt.messages).encode()).hexdigest()
+
+    def contextualize(inputs: Dict[str, Any], config: RunnableConfig) -> str:
+        path, question, key = question_contextualizer.resolve(inputs, namespace)
+        if question is None:
+            question = rewrite_chain.invoke(inputs, config)
+            question_contextualizer.store(key, question)
+        question_contextualizer.record(path)
+        return question
+
+    async def acontextualize(inputs: Dict[str, Any], config: RunnableConfig) -> str:
+        path, question, key = question_contextualizer.resolve(inputs, namespace)
+        if question is None:
+            question = await rewrite_chain.ainvoke(inputs, config)
+            question_contextualizer.store(key, question)
+        question_contextualizer.record(path)
+        return question
+
+    return (
+        RunnableLambda(contextualize, afunc=acontextualize, name="contextualize_question")
+        | retriever
+    ).with_config(run_name="chat_retriever_chain")
@@ -1,16 +1,28 @@
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
-from core.models import RAGConfig
+from core.models import RAGConfig, RetrievalProfile
 from .llm_service import LLMService
 from .embeddings_service import EmbeddingsService
+from .sql_registry import sql_database_registry
+from .branch_timer import timed_branch
+from .question_contextualizer import create_contextualizing_retriever
+from .instrumentation import stage_tag
+from .context_packer import context_packer
+from .retrievers import HybridRetriever, ScoredVectorStoreRetriever
+from .bm25_index import bm25_registry
+from .reranker import reranker
+from config.settings import settings
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda, RunnableParallel
 from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
-from langchain_community.utilities import SQLDatabase
 from operator import itemgetter
 from langchain_core.output_parsers import JsonOutputParser
 
+SQL_NOT_REQUIRED = '$$NOT REQUIRED$$'
+SQL_UNAVAILABLE = 'The database could not be queried in time, answer from the retrieved documents'
+
 class RAGService:
     def __init__(
         self,
@@ -77,6 +89,12 @@ class RAGService:
             "just reformulate it if needed and otherwise return it as is."
         )
     
+    @staticmethod
+    def resolve_chain_type(config: RAGConfig, chain_type=None) -> str:
+        if chain_type:
+            return chain_type
+        return 'RAG + SQL' if config.sql_config else 'RAG ONLY'
+
     def get_chain(self, config: RAGConfig, chain_type=None):
         if chain_type:
             if chain_type == 'RAG ONLY':
@@ -92,10 +110,34 @@ class RAGService:
                 return self.get_rag_chain(config)
 
 
+    def get_retriever(self, config: RAGConfig) -> BaseRetriever:
+        vector_store = self.embeddings_service.get_vector_store(config.collection)
+        profile = config.retrieval or RetrievalProfile()
+        k = profile.k or settings.RETRIEVAL_K
+        options = {
+            "mmr_lambda": profile.mmr_lambda,
+            "score_threshold": profile.score_threshold,
+            "filter": profile.filter
+        }
+        # Reranking over-fetches candidates and keeps the best top_n
+        if config.rerank:
+            options.update(reranker=reranker, top_n=config.rerank_top_n or profile.k or settings.RERANK_TOP_N)
+            k = settings.RERANK_FETCH_K
+            reranker.warm()
+        if not settings.HYBRID_SEARCH_ENABLED:
+            return ScoredVectorStoreRetriever(vector_store=vector_store, k=k, fetch_k=profile.fetch_k, **options)
+        return HybridRetriever(
+            vector_store=vector_store,
+            bm25_index=bm25_registry.get(config.collection, vector_store),
+            k=k,
+            fetch_k=max(profile.fetch_k or settings.HYBRID_FETCH_K, k),
+            rrf_k=settings.HYBRID_RRF_K,
+            **options
+        )
+
     def get_rag_chain(self, config: RAGConfig):
         llm = self.llm_service.get_llm(config)
-        vector_store = self.embeddings_service.get_vector_store(config.collection)
-        retriever = vector_store.as_retriever()
+        retriever = self.get_retriever(config)
         contextualize_q_system_prompt = self.DEFAULT_CONTEXTUALIZATION_PROMPT
         if config.contextualization_prompt:
             contextualize_q_system_prompt = config.contextualization_prompt
@@ -106,9 +148,9 @@ class RAGService:
             ("human", "{input}"),
         ])
 
-        history_aware_retriever = create_history_aware_retriever(
+        history_aware_retriever = create_contextualizing_retriever(
             llm, retriever, contextualize_q_prompt
-        )
+        ) | context_packer.as_runnable(config)
 
         qa_prompt = ChatPromptTemplate.from_messages([
             ("system", config.system_prompt or self.DEFAULT_SYSTEM_PROMPT),
@@ -116,7 +158,7 @@ class RAGService:
             ("human", "{input}"),
         ])
 
-        question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+        question_answer_chain = create_stuff_documents_chain(llm, qa_prompt).with_config(tags=[stage_tag("answer")])
         return create_retrieval_chain(history_aware_retriever, question_answer_chain)
     
     # TODO: Try using LangChain SQL Database Tool (Need a LLM with function calling support)
@@ -126,8 +168,7 @@ class RAGService:
         if not sql_config:
             return 
         llm = self.llm_service.get_llm(config)
-        sql_uri = f'postgresql://{sql_config.username}:{sql_config.password}@{sql_config.url}/{sql_config.db_name}'
-        sql_db = SQLDatabase.from_uri(sql_uri)
+        sql_db = sql_database_registry.get_database(sql_config)
         execute_query = QuerySQLDataBaseTool(db=sql_db)
         
         sql_prompt = PromptTemplate(
@@ -146,44 +187,37 @@ class RAGService:
             )
         )
 
-        def get_table_info(db: SQLDatabase):
-            return db.run(
-                '''
-                SELECT
-                    table_name || ': [' || string_agg(column_name, ', ') || ']' AS table_columns
-                FROM
-                    information_schema.columns
-                WHERE
-                    table_schema = 'public'  
-                GROUP BY
-                    table_name
-                ORDER BY
-                    table_name;
-                '''
-            )
-        
         def process_sql_input(inputs):
             return {
                 "input": inputs["input"],
                 "chat_history": inputs.get("chat_history", []),
-                "table_info": get_table_info(sql_db)
+                "table_info": sql_database_registry.get_table_info(sql_config, inputs["input"])
             }
 
-        # Create two parallel chains
         sql_generation_chain = (
             RunnableLambda(process_sql_input)
-            | sql_prompt
-            | llm
-            | StrOutputParser()
-        )
-        
-        execution_chain = sql_generation_chain | execute_query
-        
-        # Combine them using RunnableParallel
-        chain = RunnableParallel(
-            sql_query=sql_generation_chain,
-            query_results=execution_chain
+            | (sql_prompt | llm | StrOutputParser()).with_config(tags=[stage_tag("sql_generation")])
+            | RunnableLambda(str.strip)
         )
+
+        # The query is generated once and the same query is executed, unless
+        # the LLM says the database is not needed
+        def execute_sql(inputs):
+            if SQL_NOT_REQUIRED in inputs["sql_query"]:
+                return SQL_NOT_REQUIRED
+            return execute_query.invoke(inputs["sql_query"])
+
+        async def aexecute_sql(inputs):
+            if SQL_NOT_REQUIRED in inputs["sql_query"]:
+                return SQL_NOT_REQUIRED
+            return await execute_query.ainvoke(inputs["sql_query"])
+
+        chain = (
+            {"sql_query": sql_generation_chain}
+            | RunnablePassthrough.assign(
+                query_results=RunnableLambda(execute_sql, afunc=aexecute_sql)
+            )
+        ).with_config(run_name="sql_chain")
         
         return chain
 
@@ -193,8 +227,7 @@ class RAGService:
             return 
         llm = self.llm_service.get_llm(config)
         sql_chain = self.get_sql_chain(config)
-        vector_store = self.embeddings_service.get_vector_store(config.collection)
-        retriever = vector_store.as_retriever()
+        retriever = self.get_retriever(config)
         
         contextualize_q_system_prompt = self.DEFAULT_CONTEXTUALIZATION_PROMPT
         if config.contextualization_prompt:
@@ -206,7 +239,10 @@ class RAGService:
             ("human", "{input}"),
         ])
         
-        retriever_chain = create_history_aware_retriever(llm, retriever, contextualize_q_prompt)
+        retriever_chain = (
+            create_contextualizing_retriever(llm, retriever, contextualize_q_prompt)
+            | context_packer.as_runnable(config)
+        )
         
         qa_prompt = ChatPromptTemplate.from_messages([
             ("system", config.system_prompt or f'''
@@ -221,22 +257,41 @@ class RAGService:
             ("human", "Question: {input}\nSQL Query: {sql_query}\nSQL Result: {sql_result}\nRetrieved Documents: {context}"),
         ])
         
+        # Retrieval and SQL are independent, so they run concurrently. A slow
+        # or failing branch is replaced by a fallback instead of failing the answer.
+        retrieval_branch = timed_branch(
+            "retrieval",
+            retriever_chain,
+            settings.RETRIEVAL_BRANCH_TIMEOUT_SECONDS,
+            lambda inputs: []
+        )
+        sql_branch = timed_branch(
+            "sql",
+            sql_chain,
+            settings.SQL_BRANCH_TIMEOUT_SECONDS,
+            lambda inputs: {"sql_query": "", "query_results": SQL_UNAVAILABLE}
+        )
+
         def combine_inputs(inputs):
-            results = sql_chain.invoke(inputs)
-            sql_query = results['sql_query']
-            sql_result = results['query_results']
+            sql_query = inputs["sql"]["sql_query"]
+            sql_result = inputs["sql"]["query_results"]
             return {
                 "sql_query": sql_query,
-                "sql_result": sql_result if '$$NOT REQUIRED$$' not in sql_result else 'The question does not require data from the database',
+                "sql_result": sql_result if SQL_NOT_REQUIRED not in sql_result else 'The question does not require data from the database',
                 "context": inputs["context"],
                 "input": inputs["input"],
                 "chat_history": inputs.get("chat_history", [])
             }
         
         chain = (
-            {"context" : retriever_chain, "input": itemgetter("input"), "chat_history": itemgetter("chat_history")}
+            RunnableParallel(
+                context=retrieval_branch,
+                sql=sql_branch,
+                input=itemgetter("input"),
+                chat_history=itemgetter("chat_history")
+            )
             | RunnableLambda(combine_inputs)
-            | create_stuff_documents_chain(llm, qa_prompt)
+            | create_stuff_documents_chain(llm, qa_prompt).with_config(tags=[stage_tag("answer")])
         )
 
         return chain
@@ -0,0 +1,186 @@
+from core.models import RAGConfig
+from config.settings import settings
+from .chain_cache import config_hash
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+
+Event = Tuple[str, Any]
+Producer = Callable[[Callable[[str, Any], None]], Awaitable[None]]
+
+class CoalescingOverflow(Exception):
+    """Raised to a subscriber that fell further behind the shared generation than the buffer allows."""
+
+def request_key(agent_id: str, config: RAGConfig, messages: List[Dict[str, str]], history_summary: Optional[str] = None) -> str:
+    payload = json.dumps(
+        [agent_id, config_hash(config), history_summary, [[m["role"], m["content"]] for m in messages]],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class Flight:
+    """
+    One upstream generation whose events are fanned out to every subscriber.
+    Events are buffered from the start so late joiners replay them; once the
+    buffer exceeds max_events the flight stops accepting joiners and only
+    keeps events that some subscriber has not read yet.
+    """
+
+    def __init__(self, key: Optional[str], max_events: int, on_closed: Callable[["Flight"], None]):
+        self.key = key
+        self.max_events = max_events
+        self.joinable = key is not None
+        self._on_closed = on_closed
+        self._events: List[Event] = []
+        self._offset = 0
+        self._cursors: Dict[int, int] = {}
+        self._next_subscriber = 0
+        self._changed = asyncio.Event()
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, produce: Producer, on_done: Optional[Callable[[], None]] = None):
+        self._task = asyncio.create_task(self._run(produce))
+        if on_done is not None:
+            # Also runs when the task is cancelled before produce was entered
+            self._task.add_done_callback(lambda task: on_done())
+
+    async def _run(self, produce: Producer):
+        try:
+            await produce(self.publish)
+        except asyncio.CancelledError:
+            self._error = asyncio.CancelledError()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+            self._close()
+            self._changed.set()
+
+    def _close(self):
+        if self.joinable:
+            self.joinable = False
+            self._on_closed(self)
+
+    def publish(self, kind: str, payload: Any):
+        self._events.append((kind, payload))
+        if len(self._events) > self.max_events:
+            self._close()
+            self._trim()
+        self._changed.set()
+
+    def _trim(self):
+        end = self._offset + len(self._events)
+        # Detach subscribers that would hold more than max_events open
+        for subscriber, cursor in list(self._cursors.items()):
+            if 0 <= cursor < end - self.max_events:
+                self._cursors[subscriber] = -1
+        live = [cursor for cursor in self._cursors.values() if cursor >= 0]
+        drop = (min(live) if live else end) - self._offset
+        del self._events[:drop]
+        self._offset += drop
+
+    def subscribe(self) -> "Subscription":
+        subscriber = self._next_subscriber
+        self._next_subscriber += 1
+        self._cursors[subscriber] = self._offset
+        return Subscription(self, subscriber)
+
+    async def next_event(self, subscriber: int) -> Event:
+        while True:
+            cursor = self._cursors.get(subscriber, -1)
+            if cursor < 0:
+                raise CoalescingOverflow("Client fell behind the shared generation")
+            index = cursor - self._offset
+            if index < len(self._events):
+                self._cursors[subscriber] = cursor + 1
+                return self._events[index]
+            if self._done:
+                if self._error is not None:
+                    raise self._error
+                raise StopAsyncIteration
+            self._changed.clear()
+            await self._changed.wait()
+
+    def leave(self, subscriber: int):
+        self._cursors.pop(subscriber, None)
+        if not self._cursors and not self._done and self._task is not None:
+            # Nobody is listening any more, so stop the upstream generation
+            self._close()
+            self._task.cancel()
+
+class Subscription:
+    def __init__(self, flight: Flight, subscriber: int):
+        self.flight = flight
+        self.subscriber = subscriber
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Event:
+        return await self.flight.next_event(self.subscriber)
+
+    async def aclose(self):
+        self.flight.leave(self.subscriber)
+
+class RequestCoalescer:
+    """
+    Single-flight for chat generations: concurrent requests with the same key
+    subscribe to one upstream generation instead of each starting their own.
+    """
+
+    def __init__(self, enabled: bool, max_events: int):
+        self.enabled = enabled
+        self.max_events = max_events
+        self._flights: Dict[str, Flight] = {}
+        self.flights = 0
+        self.joined = 0
+        self.late_joins = 0
+
+    def in_flight(self, key: str) -> bool:
+        flight = self._flights.get(key)
+        return self.enabled and flight is not None and flight.joinable
+
+    def join(
+        self,
+        key: Optional[str],
+        produce: Producer,
+        on_done: Optional[Callable[[], None]] = None
+    ) -> Tuple[Subscription, bool]:
+        """
+        Returns a subscription to the flight for key and whether this request
+        leads it. on_done is called once a flight this request leads has ended.
+        """
+        flight = self._flights.get(key) if self.enabled and key else None
+        if flight is not None and flight.joinable:
+            self.joined += 1
+            if flight._events:
+                self.late_joins += 1
+            return flight.subscribe(), False
+
+        flight = Flight(key if self.enabled else None, self.max_events, self._closed)
+        if flight.joinable:
+            self._flights[key] = flight
+        self.flights += 1
+        subscription = flight.subscribe()
+        flight.start(produce, on_done)
+        return subscription, True
+
+    def _closed(self, flight: Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "flights": self.flights,
+            "joined": self.joined,
+            "late_joins": self.late_joins,
+            "coalesce_rate": self.joined / (self.flights + self.joined) if self.flights + self.joined else 0.0,
+            "max_buffered_events": self.max_events
+        }
+
+request_coalescer = RequestCoalescer(settings.COALESCE_ENABLED, settings.COALESCE_MAX_BUFFERED_EVENTS)
@@ -0,0 +1,134 @@
+from langchain_core.documents import Document
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config.settings import settings
+from typing import Any, Dict, List, Optional
+import asyncio
+import threading
+import time
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs with a small local cross-encoder on CPU. The
+    model is loaded once per process on the scoring thread. Every call has a
+    hard deadline; when it passes, or the scorer is backed up, the candidates
+    keep their retrieval order.
+    """
+
+    def __init__(self, model_name: str, batch_size: int, timeout: float, max_pending: int):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._model: Optional[Any] = None
+        self._load_lock = threading.Lock()
+        # One scoring thread: torch already uses every core for a batch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.reranked = 0
+        self.scored = 0
+        self.fallbacks = {"timeout": 0, "busy": 0, "error": 0}
+        self.scoring_time = 0.0
+
+    def _get_model(self):
+        with self._load_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, device="cpu")
+            return self._model
+
+    def warm(self):
+        """Starts loading the model so the first rerank is not spent waiting for it."""
+        if self._model is None:
+            self._executor.submit(self._get_model)
+
+    def _score(self, query: str, texts: List[str]) -> List[float]:
+        try:
+            model = self._get_model()
+            start = time.perf_counter()
+            scores = model.predict([(query, text) for text in texts], batch_size=self.batch_size)
+            with self._lock:
+                self.scored += 1
+                self.scoring_time += time.perf_counter() - start
+            return [float(score) for score in scores]
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _submit(self, query: str, documents: List[Document]) -> Optional[Future]:
+        with self._lock:
+            self.calls += 1
+            if self._pending >= self.max_pending:
+                self.fallbacks["busy"] += 1
+                return None
+            self._pending += 1
+        return self._executor.submit(self._score, query, [document.page_content for document in documents])
+
+    def _ranked(self, documents: List[Document], scores: List[float], top_n: int) -> List[Document]:
+        with self._lock:
+            self.reranked += 1
+        ranked = sorted(zip(documents, scores), key=lambda item: item[1], reverse=True)[:top_n]
+        return [
+            Document(
+                page_content=document.page_content,
+                metadata={**document.metadata, "score": score, "retrieval_score": document.metadata.get("score")},
+                id=getattr(document, "id", None)
+            )
+            for document, score in ranked
+        ]
+
+    def _fallback(self, reason: str, documents: List[Document], top_n: int) -> List[Document]:
+        with self._lock:
+            self.fallbacks[reason] += 1
+        return documents[:top_n]
+
+    def rerank(self, query: str, documents: List[Document], top_n: int) -> List[Document]:
+        if len(documents) <= 1:
+            return documents[:top_n]
+        future = self._submit(query, documents)
+        if future is None:
+            return documents[:top_n]
+        try:
+            return self._ranked(documents, future.result(timeout=self.timeout), top_n)
+        except FutureTimeoutError:
+            return self._fallback("timeout", documents, top_n)
+        except Exception as e:
+            print(f"Error reranking documents: {str(e)}")
+            return self._fallback("error", documents, top_n)
+
+    async def arerank(self, query: str, documents: List[Document], top_n: int) -> List[Document]:
+        if len(documents) <= 1:
+            return documents[:top_n]
+        future = self._submit(query, documents)
+        if future is None:
+            return documents[:top_n]
+        try:
+            # shield: a timed out batch still finishes on the scoring thread
+            scores = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+            return self._ranked(documents, scores, top_n)
+        except asyncio.TimeoutError:
+            return self._fallback("timeout", documents, top_n)
+        except Exception as e:
+            print(f"Error reranking documents: {str(e)}")
+            return self._fallback("error", documents, top_n)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "loaded": self._model is not None,
+                "pending": self._pending,
+                "calls": self.calls,
+                "reranked": self.reranked,
+                "fallbacks": dict(self.fallbacks),
+                "average_scoring_time": self.scoring_time / self.scored if self.scored else 0.0,
+                "timeout": self.timeout
+            }
+
+reranker = CrossEncoderReranker(
+    settings.RERANK_MODEL,
+    settings.RERANK_BATCH_SIZE,
+    settings.RERANK_TIMEOUT_MS / 1000,
+    settings.RERANK_MAX_PENDING
+)
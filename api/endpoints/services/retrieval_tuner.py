@@ -0,0 +1,86 @@
+from core.models import RAGConfig, RetrievalProfile
+from config.settings import settings
+from .bm25_index import tokenize
+from .context_packer import context_packer
+from .tokens import count_tokens
+from typing import Any, Dict, List, Optional
+import itertools
+import numpy as np
+import time
+
+SWEPT_PARAMETERS = ("k", "fetch_k", "mmr_lambda", "score_threshold")
+DEFAULT_GRID = {
+    "k": [2, 3, 4, 6, 8],
+    "mmr_lambda": [None, 0.5],
+    "score_threshold": [None, 0.3]
+}
+MAX_PROFILES = 64
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its of on or our "
+    "so that the their there this to was we what when where which who will with you your".split()
+)
+
+def profile_grid(grid: Optional[Dict[str, List[Any]]], base: Optional[RetrievalProfile] = None) -> List[RetrievalProfile]:
+    """
+    Expands a grid of parameter values into profiles. Parameters missing from
+    the grid keep the agent's current value; the agent's filter is kept as is.
+    """
+    base = base or RetrievalProfile()
+    grid = grid or DEFAULT_GRID
+    values = [grid.get(name) or [getattr(base, name)] for name in SWEPT_PARAMETERS]
+    profiles = []
+    for combination in itertools.product(*values):
+        parameters = dict(zip(SWEPT_PARAMETERS, combination))
+        # The score threshold does not apply to MMR, so these would repeat the MMR profile
+        if parameters["mmr_lambda"] is not None and parameters["score_threshold"] is not None:
+            continue
+        profiles.append(RetrievalProfile(**parameters, filter=base.filter))
+    return profiles
+
+def answer_recall(answer: str, texts: List[str]) -> float:
+    """Share of the reference answer's content terms that appear in the retrieved text."""
+    terms = {term for term in tokenize(answer) if term not in STOPWORDS}
+    if not terms:
+        return 1.0
+    retrieved = set(tokenize(" ".join(texts)))
+    return len(terms & retrieved) / len(terms)
+
+async def evaluate_profile(
+    rag_service: Any,
+    config: RAGConfig,
+    profile: RetrievalProfile,
+    qa_pairs: List[Dict[str, str]]
+) -> Dict[str, Any]:
+    """Retrieves for every question with the profile and measures what the answer step would receive."""
+    if not qa_pairs:
+        raise ValueError("qa_pairs must not be empty")
+    retriever = rag_service.get_retriever(config.model_copy(update={"retrieval": profile}))
+    budget = context_packer.budget_for(config)
+    recalls, context_tokens, documents, latencies = [], [], [], []
+    for qa_pair in qa_pairs:
+        start = time.perf_counter()
+        retrieved = await retriever.ainvoke(qa_pair["question"])
+        latencies.append(time.perf_counter() - start)
+        if settings.CONTEXT_PACKING_ENABLED:
+            retrieved, _, tokens = context_packer.pack(retrieved, budget)
+        else:
+            tokens = sum(count_tokens(document.page_content) for document in retrieved)
+        recalls.append(answer_recall(qa_pair["answer"], [document.page_content for document in retrieved]))
+        context_tokens.append(tokens)
+        documents.append(len(retrieved))
+    return {
+        "profile": profile.model_dump(exclude_none=True),
+        "recall": float(np.mean(recalls)),
+        "context_tokens": float(np.mean(context_tokens)),
+        "documents": float(np.mean(documents)),
+        "latency": float(np.mean(latencies)),
+        "latency_p95": float(np.percentile(latencies, 95))
+    }
+
+def recommend(results: List[Dict[str, Any]], tolerance: float) -> Optional[Dict[str, Any]]:
+    """The cheapest profile whose recall is within tolerance of the best one."""
+    if not results:
+        return None
+    best_recall = max(result["recall"] for result in results)
+    candidates = [result for result in results if result["recall"] >= best_recall - tolerance]
+    return min(candidates, key=lambda result: (result["context_tokens"], result["latency"]))
@@ -0,0 +1,191 @@
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from .bm25_index import BM25Index
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+
+def with_score(document: Document, score: float) -> Document:
+    return Document(
+        page_content=document.page_content,
+        metadata={**document.metadata, "score": score},
+        id=getattr(document, "id", None)
+    )
+
+def ordered(compare: Callable[[Any, Any], bool]) -> Callable[[Any, Any], bool]:
+    # Like Chroma, a missing or non-comparable value matches no range
+    def check(value: Any, operand: Any) -> bool:
+        try:
+            return value is not None and compare(value, operand)
+        except TypeError:
+            return False
+    return check
+
+FILTER_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": ordered(lambda value, operand: value > operand),
+    "$gte": ordered(lambda value, operand: value >= operand),
+    "$lt": ordered(lambda value, operand: value < operand),
+    "$lte": ordered(lambda value, operand: value <= operand),
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+def matches_filter(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """
+    Evaluates a Chroma-style metadata filter for results that did not come
+    from Chroma. Raises ValueError for operators it does not know rather than
+    letting every result through.
+    """
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported filter operator: {key}")
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                compare = FILTER_OPERATORS.get(operator)
+                if compare is None:
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+                if not compare(value, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+def mmr_scored(documents: List[Document]) -> List[Tuple[Document, float]]:
+    # MMR returns no scores; its rank order stands in so packing keeps it
+    return [(document, 1.0 - rank / len(documents)) for rank, document in enumerate(documents)]
+
+class ScoredVectorStoreRetriever(BaseRetriever):
+    """
+    Similarity retriever that keeps each document's relevance score in
+    metadata["score"]. A retrieval profile can switch it to MMR over fetch_k
+    candidates, drop results under a relevance threshold and filter on
+    metadata. With a reranker, k candidates are fetched and the reranker
+    keeps the best top_n of them.
+    """
+
+    vector_store: VectorStore
+    k: int = 4
+    fetch_k: Optional[int] = None
+    mmr_lambda: Optional[float] = None
+    score_threshold: Optional[float] = None
+    filter: Optional[Dict[str, Any]] = None
+    reranker: Optional[Any] = None
+    top_n: Optional[int] = None
+
+    def _scored(self, results: List[Tuple[Document, float]]) -> List[Document]:
+        return [with_score(document, score) for document, score in results]
+
+    def _filter_kwargs(self) -> Dict[str, Any]:
+        return {"filter": self.filter} if self.filter else {}
+
+    def _similarity_kwargs(self) -> Dict[str, Any]:
+        kwargs = self._filter_kwargs()
+        if self.score_threshold is not None:
+            kwargs["score_threshold"] = self.score_threshold
+        return kwargs
+
+    def _dense(self, query: str, k: int, pool: int) -> List[Tuple[Document, float]]:
+        if self.mmr_lambda is None:
+            return self.vector_store.similarity_search_with_relevance_scores(query, k=k, **self._similarity_kwargs())
+        return mmr_scored(self.vector_store.max_marginal_relevance_search(
+            query, k=k, fetch_k=pool, lambda_mult=self.mmr_lambda, **self._filter_kwargs()
+        ))
+
+    async def _adense(self, query: str, k: int, pool: int) -> List[Tuple[Document, float]]:
+        if self.mmr_lambda is None:
+            return await self.vector_store.asimilarity_search_with_relevance_scores(query, k=k, **self._similarity_kwargs())
+        return mmr_scored(await self.vector_store.amax_marginal_relevance_search(
+            query, k=k, fetch_k=pool, lambda_mult=self.mmr_lambda, **self._filter_kwargs()
+        ))
+
+    def _search(self, query: str) -> List[Document]:
+        return self._scored(self._dense(query, self.k, self.fetch_k or self.k * 4))
+
+    async def _asearch(self, query: str) -> List[Document]:
+        return self._scored(await self._adense(query, self.k, self.fetch_k or self.k * 4))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        documents = self._search(query)
+        if self.reranker is None:
+            return documents
+        return self.reranker.rerank(query, documents, self.top_n or self.k)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        documents = await self._asearch(query)
+        if self.reranker is None:
+            return documents
+        return await self.reranker.arerank(query, documents, self.top_n or self.k)
+
+def fusion_key(document: Document) -> str:
+    # Chunk text rather than id: older Chroma results come back without ids
+    return document.page_content
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int) -> List[Document]:
+    """Merges ranked lists by summing 1 / (rrf_k + rank) per document."""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = fusion_key(document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, document)
+    top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+    return [with_score(documents[key], score) for key, score in top]
+
+class HybridRetriever(ScoredVectorStoreRetriever):
+    """
+    Queries the vector store and the collection's BM25 index concurrently
+    and merges both rankings by reciprocal rank fusion. Exact terms like
+    product names and SKUs that dense search ranks poorly are recovered by
+    BM25, so a small k keeps its recall. score_threshold drops dense
+    candidates only: BM25 scores are unbounded and not comparable to it, so
+    BM25 hits are fused unthresholded.
+    """
+
+    bm25_index: BM25Index
+    fetch_k: Optional[int] = 20
+    rrf_k: int = 60
+
+    @property
+    def candidates(self) -> int:
+        return self.fetch_k or 20
+
+    def _sparse(self, query: str) -> List[Tuple[Document, float]]:
+        if not self.filter:
+            return self.bm25_index.search(query, self.candidates)
+        # BM25 does not know the filter, so over-fetch and filter afterwards
+        results = self.bm25_index.search(query, self.candidates * 4)
+        return [result for result in results if matches_filter(result[0].metadata, self.filter)][:self.candidates]
+
+    def _fuse(self, dense: List[Tuple[Document, float]], sparse: List[Tuple[Document, float]]) -> List[Document]:
+        if self.score_threshold is not None and self.mmr_lambda is None:
+            # Stores that ignore the score_threshold kwarg still get it applied
+            dense = [(document, score) for document, score in dense if score >= self.score_threshold]
+        return reciprocal_rank_fusion(
+            [[document for document, _ in dense], [document for document, _ in sparse]],
+            self.k,
+            self.rrf_k
+        )
+
+    def _search(self, query: str) -> List[Document]:
+        dense = self._dense(query, self.candidates, self.candidates * 2)
+        return self._fuse(dense, self._sparse(query))
+
+    async def _asearch(self, query: str) -> List[Document]:
+        dense, sparse = await asyncio.gather(
+            self._adense(query, self.candidates, self.candidates * 2),
+            asyncio.to_thread(self._sparse, query)
+        )
+        return self._fuse(dense, sparse)
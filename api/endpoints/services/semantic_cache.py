@@ -0,0 +1,156 @@
+from langchain_core.embeddings import Embeddings
+from collections import OrderedDict
+from core.models import RAGConfig
+from config.settings import settings
+from .chain_cache import config_hash
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import threading
+import time
+
+class CachedAnswer:
+    def __init__(self, question: str, vector: np.ndarray, answer: str, generation_time: float):
+        self.question = question
+        self.vector = vector
+        self.answer = answer
+        self.generation_time = generation_time
+        self.created_at = time.monotonic()
+        self.hits = 0
+
+class AgentAnswers:
+    def __init__(self, config_hash: str):
+        self.config_hash = config_hash
+        # Recency order for eviction; the matrix rows keep their own order
+        self.entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._rows: List[str] = []
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._rows = list(self.entries)
+            self._matrix = np.stack([self.entries[key].vector for key in self._rows])
+        return self._matrix
+
+    def row_key(self, row: int) -> str:
+        return self._rows[row]
+
+    def changed(self):
+        """Called when entries are added or removed, not when they are reordered."""
+        self._matrix = None
+
+def normalize(vector: List[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class SemanticAnswerCache:
+    """
+    Per-agent cache of generated answers looked up by embedding similarity
+    of the standalone question. Entries expire after a TTL, the least
+    recently hit entries are evicted past the size bound, and an agent's
+    entries are dropped when its documents or config change. Agents with a
+    SQL database are never cached: their answers depend on live rows.
+    """
+
+    def __init__(self, threshold: float, ttl: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._agents: Dict[str, AgentAnswers] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.saved_latency = 0.0
+
+    @staticmethod
+    def applies_to(config: RAGConfig) -> bool:
+        return config.sql_config is None
+
+    async def lookup(
+        self,
+        agent_id: str,
+        config: RAGConfig,
+        embeddings: Embeddings,
+        question: str
+    ) -> Tuple[Optional[CachedAnswer], np.ndarray]:
+        """Returns the best cached answer above the threshold (or None) and the question vector."""
+        vector = normalize(await embeddings.aembed_query(question))
+        with self._lock:
+            self.lookups += 1
+            answers = self._agents.get(agent_id)
+            if answers is None or answers.config_hash != config_hash(config):
+                self._agents.pop(agent_id, None)
+                return None, vector
+            self._expire(answers)
+            if not answers.entries:
+                return None, vector
+            scores = answers.matrix() @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None, vector
+            key = answers.row_key(best)
+            entry = answers.entries[key]
+            answers.entries.move_to_end(key)
+            entry.hits += 1
+            self.hits += 1
+            return entry, vector
+
+    def record_saved_latency(self, seconds: float):
+        with self._lock:
+            self.saved_latency += max(seconds, 0.0)
+
+    def store(
+        self,
+        agent_id: str,
+        config: RAGConfig,
+        question: str,
+        vector: np.ndarray,
+        answer: str,
+        generation_time: float
+    ):
+        if not answer:
+            return
+        current_hash = config_hash(config)
+        with self._lock:
+            answers = self._agents.get(agent_id)
+            if answers is None or answers.config_hash != current_hash:
+                answers = AgentAnswers(current_hash)
+                self._agents[agent_id] = answers
+            if answers.entries and answers.matrix().shape[1] != vector.shape[0]:
+                # The embeddings model changed under the same config hash
+                answers.entries.clear()
+            answers.entries[question] = CachedAnswer(question, vector, answer, generation_time)
+            answers.entries.move_to_end(question)
+            while len(answers.entries) > self.max_entries:
+                answers.entries.popitem(last=False)
+            answers.changed()
+
+    def _expire(self, answers: AgentAnswers):
+        cutoff = time.monotonic() - self.ttl
+        expired = [key for key, entry in answers.entries.items() if entry.created_at < cutoff]
+        for key in expired:
+            del answers.entries[key]
+        if expired:
+            answers.changed()
+
+    def invalidate(self, agent_id: str):
+        with self._lock:
+            self._agents.pop(agent_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "agents": len(self._agents),
+                "entries": sum(len(answers.entries) for answers in self._agents.values()),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "saved_latency": self.saved_latency,
+                "threshold": self.threshold
+            }
+
+semantic_cache = SemanticAnswerCache(
+    settings.SEMANTIC_CACHE_THRESHOLD,
+    settings.SEMANTIC_CACHE_TTL_SECONDS,
+    settings.SEMANTIC_CACHE_MAX_ENTRIES
+)
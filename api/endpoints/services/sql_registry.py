@@ -0,0 +1,191 @@
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy import inspect, text
+from sqlalchemy.pool import StaticPool
+from collections import OrderedDict
+from core.models import SQLConfig
+from config.settings import settings
+from typing import Any, Callable, Dict, List, Optional
+import hashlib
+import re
+import threading
+import time
+
+POSTGRES_SCHEMA_QUERY = '''
+    SELECT
+        table_name, string_agg(column_name, ', ' ORDER BY ordinal_position)
+    FROM
+        information_schema.columns
+    WHERE
+        table_schema = 'public'
+    GROUP BY
+        table_name
+    ORDER BY
+        table_name;
+'''
+
+def sql_config_key(sql_config: SQLConfig) -> str:
+    return hashlib.sha256(sql_config.model_dump_json().encode()).hexdigest()
+
+def postgres_uri(sql_config: SQLConfig) -> str:
+    return f'postgresql://{sql_config.username}:{sql_config.password}@{sql_config.url}/{sql_config.db_name}'
+
+def engine_args(sql_uri: str) -> Dict[str, Any]:
+    if sql_uri.startswith("sqlite"):
+        # One shared connection, so an in-memory database outlives a checkout
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": settings.SQL_POOL_SIZE,
+        "max_overflow": settings.SQL_MAX_OVERFLOW,
+        "pool_recycle": settings.SQL_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": True,
+    }
+
+def _tokens(value: str) -> set:
+    # Splits snake_case and camelCase identifiers as well as plain words
+    value = re.sub(r'([a-z])([A-Z])', r'\1 \2', value)
+    return {token for token in re.split(r'[^a-zA-Z0-9]+', value.lower()) if len(token) > 1}
+
+class SQLDatabaseEntry:
+    def __init__(self, db: SQLDatabase):
+        self.db = db
+        self.lock = threading.Lock()
+        self.schema: Optional[Dict[str, List[str]]] = None
+        self.schema_loaded_at = 0.0
+
+class SQLDatabaseRegistry:
+    """
+    Keeps one pooled SQLAlchemy engine per SQLConfig and caches the
+    table/column summary used in the SQL generation prompt. uri_for maps a
+    config to its SQLAlchemy URI.
+    """
+
+    def __init__(
+        self,
+        max_engines: int,
+        schema_ttl: float,
+        prune_threshold: int,
+        max_tables: int,
+        uri_for: Callable[[SQLConfig], str] = postgres_uri
+    ):
+        self.max_engines = max_engines
+        self.uri_for = uri_for
+        self.schema_ttl = schema_ttl
+        self.prune_threshold = prune_threshold
+        self.max_tables = max_tables
+        self._entries: "OrderedDict[str, SQLDatabaseEntry]" = OrderedDict()
+        # Guards the dicts only; engines are created under a per-key lock so
+        # a slow driver does not stall requests for other databases
+        self._lock = threading.Lock()
+        self._opening: Dict[str, threading.Lock] = {}
+        self.schema_loads = 0
+        self.schema_hits = 0
+
+    def get_entry(self, sql_config: SQLConfig) -> SQLDatabaseEntry:
+        key = sql_config_key(sql_config)
+        with self._lock:
+            entry = self._cached(key)
+            if entry is not None:
+                return entry
+            opening = self._opening.setdefault(key, threading.Lock())
+        evicted = []
+        try:
+            with opening:
+                with self._lock:
+                    # Created by the request this one waited for
+                    entry = self._cached(key)
+                    if entry is not None:
+                        return entry
+                sql_uri = self.uri_for(sql_config)
+                db = SQLDatabase.from_uri(
+                    sql_uri,
+                    engine_args=engine_args(sql_uri),
+                    # The prompt uses our cached summary, skip LangChain's reflection
+                    lazy_table_reflection=True,
+                )
+                entry = SQLDatabaseEntry(db)
+                with self._lock:
+                    self._entries[key] = entry
+                    while len(self._entries) > self.max_engines:
+                        evicted.append(self._entries.popitem(last=False)[1])
+        finally:
+            with self._lock:
+                if self._opening.get(key) is opening:
+                    del self._opening[key]
+        for old in evicted:
+            old.db._engine.dispose()
+        return entry
+
+    def _cached(self, key: str) -> Optional[SQLDatabaseEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def get_database(self, sql_config: SQLConfig) -> SQLDatabase:
+        return self.get_entry(sql_config).db
+
+    def _load_schema(self, db: SQLDatabase) -> Dict[str, List[str]]:
+        engine = db._engine
+        if engine.dialect.name == "postgresql":
+            with engine.connect() as connection:
+                rows = connection.execute(text(POSTGRES_SCHEMA_QUERY)).fetchall()
+            return {table: columns.split(', ') for table, columns in rows}
+        inspector = inspect(engine)
+        return {
+            table: [column["name"] for column in inspector.get_columns(table)]
+            for table in inspector.get_table_names()
+        }
+
+    def get_schema(self, sql_config: SQLConfig, refresh: bool = False) -> Dict[str, List[str]]:
+        entry = self.get_entry(sql_config)
+        with entry.lock:
+            expired = time.monotonic() - entry.schema_loaded_at > self.schema_ttl
+            if refresh or entry.schema is None or expired:
+                entry.schema = self._load_schema(entry.db)
+                entry.schema_loaded_at = time.monotonic()
+                self.schema_loads += 1
+            else:
+                self.schema_hits += 1
+            return entry.schema
+
+    def refresh(self, sql_config: SQLConfig) -> Dict[str, List[str]]:
+        return self.get_schema(sql_config, refresh=True)
+
+    def prune_schema(self, schema: Dict[str, List[str]], question: str) -> Dict[str, List[str]]:
+        """Keeps only the tables whose names or columns overlap with the question on large schemas."""
+        if len(schema) <= self.prune_threshold:
+            return schema
+        question_tokens = _tokens(question)
+        scores = {}
+        for table, columns in schema.items():
+            table_tokens = _tokens(table)
+            column_tokens = set().union(*(_tokens(column) for column in columns)) if columns else set()
+            scores[table] = 3 * len(question_tokens & table_tokens) + len(question_tokens & column_tokens)
+        relevant = sorted(
+            (table for table in schema if scores[table] > 0),
+            key=lambda table: scores[table],
+            reverse=True
+        )[:self.max_tables]
+        if not relevant:
+            return schema
+        return {table: schema[table] for table in sorted(relevant)}
+
+    def get_table_info(self, sql_config: SQLConfig, question: str = "") -> str:
+        schema = self.prune_schema(self.get_schema(sql_config), question)
+        return "\n".join(f"{table}: [{', '.join(columns)}]" for table, columns in schema.items())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "engines": len(self._entries),
+                "schema_loads": self.schema_loads,
+                "schema_hits": self.schema_hits,
+                "pools": [entry.db._engine.pool.status() for entry in self._entries.values()]
+            }
+
+sql_database_registry = SQLDatabaseRegistry(
+    settings.SQL_MAX_ENGINES,
+    settings.SQL_SCHEMA_TTL_SECONDS,
+    settings.SQL_SCHEMA_PRUNE_THRESHOLD,
+    settings.SQL_SCHEMA_MAX_TABLES
+)
@@ -0,0 +1,39 @@
+from functools import lru_cache
+from typing import Optional
+
+# Per-message overhead of chat formatting (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken is not installed or its BPE file cannot be fetched offline
+        print(f"Falling back to approximate token counts: {str(e)}")
+        return None
+
+def count_tokens(text: Optional[str]) -> int:
+    """Counts tokens locally. Exact for OpenAI models, a close estimate for others."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(content: Optional[str]) -> int:
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+def truncate_to_tokens(text: Optional[str], max_tokens: int) -> str:
+    """Returns the longest prefix of text that fits in max_tokens."""
+    if not text or max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
@@ -0,0 +1,278 @@
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from config.settings import settings
+from .numpy_vector_store import NUMPY_MODES, NumpyVectorStore, drop_index, numpy_store_path, open_index
+from .bm25_index import bm25_registry
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+from chromadb.config import Settings as ChromaSettings
+import chromadb
+import threading
+import time
+
+# Rough per-vector overhead of the HNSW graph and sqlite rows on top of the
+# raw float32 embedding.
+VECTOR_OVERHEAD_BYTES = 256
+
+@dataclass
+class CollectionHandle:
+    vector_store: VectorStore
+    persist_directory: str
+    collection_name: str
+    lock: threading.RLock = field(default_factory=threading.RLock)
+    last_used: float = field(default_factory=time.monotonic)
+    vector_count: int = 0
+    dimension: int = 0
+    # Set for NumPy-backed collections
+    bytes_per_vector: Optional[int] = None
+
+    @property
+    def storage(self) -> str:
+        if isinstance(self.vector_store, NumpyVectorStore):
+            return self.vector_store.index.mode
+        return "chroma"
+
+    @property
+    def estimated_bytes(self) -> int:
+        if self.bytes_per_vector is not None:
+            return self.vector_count * self.bytes_per_vector
+        return self.vector_count * (self.dimension * 4 + VECTOR_OVERHEAD_BYTES)
+
+class VectorStoreRegistry:
+    """
+    Keeps one persistent Chroma client per persist directory and caches
+    collection handles so requests do not reopen the sqlite/HNSW files or
+    NumPy stores.
+    """
+
+    def __init__(
+        self,
+        memory_limit_bytes: int,
+        idle_timeout: float,
+        sweep_interval: float = 60.0
+    ):
+        self.memory_limit_bytes = memory_limit_bytes
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._clients: Dict[str, Any] = {}
+        self._clients_lock = threading.Lock()
+        self._handles: Dict[Tuple[str, str, str, str], CollectionHandle] = {}
+        # Guards the dicts only; stores are opened under a per-key lock so
+        # a slow open does not stall requests for other collections
+        self._lock = threading.RLock()
+        self._opening: Dict[Tuple[str, str, str, str], threading.Lock] = {}
+        self._invalidations: Dict[str, int] = {}
+        self._last_sweep = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_client(self, persist_directory: str):
+        with self._clients_lock:
+            client = self._clients.get(persist_directory)
+            if client is None:
+                client = chromadb.PersistentClient(
+                    path=persist_directory,
+                    settings=ChromaSettings(
+                        anonymized_telemetry=False,
+                        # Let Chroma unload least recently used segments
+                        # once resident collections exceed the budget
+                        chroma_segment_cache_policy="LRU",
+                        chroma_memory_limit_bytes=self.memory_limit_bytes,
+                    ),
+                )
+                self._clients[persist_directory] = client
+            return client
+
+    def get_handle(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        embeddings_key: str,
+        persist_directory: Optional[str] = None,
+        storage: Optional[str] = None
+    ) -> CollectionHandle:
+        persist_directory = persist_directory or settings.CHROMA_PERSIST_DIR
+        storage = storage or settings.VECTOR_STORAGE_MODE
+        # Agents sharing a collection may ask for different backends
+        key = (persist_directory, collection_name, embeddings_key, storage)
+        self._maybe_sweep()
+        with self._lock:
+            handle = self._cached(key)
+            if handle is not None:
+                return handle
+            opening = self._opening.setdefault(key, threading.Lock())
+        try:
+            with opening:
+                with self._lock:
+                    # Opened by the request this one waited for
+                    handle = self._cached(key)
+                    if handle is not None:
+                        return handle
+                    self.misses += 1
+                    invalidations = self._invalidations.get(collection_name, 0)
+                vector_store = self._open_vector_store(collection_name, embeddings, persist_directory, storage)
+                handle = CollectionHandle(vector_store, persist_directory, collection_name)
+                self._refresh_accounting(handle)
+                with self._lock:
+                    if self._invalidations.get(collection_name, 0) != invalidations:
+                        # Dropped while it was being opened; serve this
+                        # request without caching a handle on deleted data
+                        return handle
+                    # Writers and readers of the same collection share one lock even
+                    # when they use different embedding functions. Handles opened on
+                    # the other backend before this one was created are stale
+                    for other_key, other in list(self._handles.items()):
+                        if other.persist_directory == persist_directory and other.collection_name == collection_name:
+                            if (other.storage == "chroma") != (handle.storage == "chroma"):
+                                del self._handles[other_key]
+                            else:
+                                handle.lock = other.lock
+                    self._handles[key] = handle
+                    return handle
+        finally:
+            with self._lock:
+                if self._opening.get(key) is opening:
+                    del self._opening[key]
+
+    def _cached(self, key: Tuple[str, str, str, str]) -> Optional[CollectionHandle]:
+        handle = self._handles.get(key)
+        if handle is not None:
+            self.hits += 1
+            handle.last_used = time.monotonic()
+        return handle
+
+    def _has_chroma_data(self, collection_name: str, persist_directory: str) -> bool:
+        try:
+            return self.get_client(persist_directory).get_collection(collection_name).count() > 0
+        except Exception:
+            return False
+
+    def _open_vector_store(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        persist_directory: str,
+        storage: str
+    ) -> VectorStore:
+        """
+        Collections with a NumPy store are always served from it. Otherwise the
+        agent's storage mode, or VECTOR_STORAGE_MODE, picks the backend for
+        collections Chroma holds no data for; existing Chroma collections are
+        left as they are.
+        """
+        numpy_backed = numpy_store_path(collection_name).exists() or (
+            storage in NUMPY_MODES
+            and not self._has_chroma_data(collection_name, persist_directory)
+        )
+        if numpy_backed:
+            return NumpyVectorStore(
+                open_index(collection_name, storage if storage in NUMPY_MODES else "float32"),
+                embeddings,
+                settings.QUANTIZED_RESCORE_MULTIPLIER
+            )
+        return Chroma(
+            collection_name,
+            embedding_function=embeddings,
+            client=self.get_client(persist_directory),
+        )
+
+    def record_write(self, handle: CollectionHandle):
+        handle.last_used = time.monotonic()
+        self._refresh_accounting(handle)
+
+    def _refresh_accounting(self, handle: CollectionHandle):
+        if isinstance(handle.vector_store, NumpyVectorStore):
+            index = handle.vector_store.index
+            handle.vector_count = len(index)
+            handle.dimension = index.dimension
+            handle.bytes_per_vector = index.bytes_per_vector
+            return
+        try:
+            collection = handle.vector_store._collection
+            handle.vector_count = collection.count()
+            if handle.vector_count and not handle.dimension:
+                sample = collection.get(limit=1, include=["embeddings"])
+                embeddings = sample.get("embeddings")
+                if embeddings is not None and len(embeddings):
+                    handle.dimension = len(embeddings[0])
+        except Exception as e:
+            print(f"Error reading collection stats for {handle.collection_name}: {str(e)}")
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        self.evict_idle()
+
+    def evict_idle(self, idle_timeout: Optional[float] = None) -> int:
+        """Drops handles that have not been used within the idle timeout."""
+        idle_timeout = self.idle_timeout if idle_timeout is None else idle_timeout
+        cutoff = time.monotonic() - idle_timeout
+        with self._lock:
+            idle_keys = [key for key, handle in self._handles.items() if handle.last_used < cutoff]
+            for key in idle_keys:
+                del self._handles[key]
+            self.evictions += len(idle_keys)
+            return len(idle_keys)
+
+    def invalidate(self, collection_name: str):
+        with self._lock:
+            self._invalidations[collection_name] = self._invalidations.get(collection_name, 0) + 1
+            for key in [k for k in self._handles if k[1] == collection_name]:
+                del self._handles[key]
+
+    def drop_collection(self, collection_name: str, persist_directory: Optional[str] = None):
+        """
+        Deletes the collection's vectors from Chroma and its NumPy store, and
+        forgets its cached handles and BM25 index, so a collection recreated
+        under the same name starts empty.
+        """
+        persist_directory = persist_directory or settings.CHROMA_PERSIST_DIR
+        self.invalidate(collection_name)
+        client = self.get_client(persist_directory)
+        try:
+            client.get_collection(collection_name)
+        except Exception:
+            pass
+        else:
+            client.delete_collection(collection_name)
+        drop_index(collection_name)
+        bm25_registry.drop(collection_name)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            collections = [
+                {
+                    "persist_directory": handle.persist_directory,
+                    "collection": handle.collection_name,
+                    "storage": handle.storage,
+                    "vectors": handle.vector_count,
+                    "dimension": handle.dimension,
+                    "estimated_bytes": handle.estimated_bytes,
+                    "idle_seconds": now - handle.last_used
+                }
+                for handle in self._handles.values()
+            ]
+            return {
+                "clients": len(self._clients),
+                "opening": len(self._opening),
+                "handles": len(self._handles),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "estimated_bytes": sum({
+                    (c["persist_directory"], c["collection"]): c["estimated_bytes"]
+                    for c in collections
+                }.values()),
+                "memory_limit_bytes": self.memory_limit_bytes,
+                "collections": collections
+            }
+
+vector_store_registry = VectorStoreRegistry(
+    settings.CHROMA_MEMORY_LIMIT_BYTES,
+    settings.CHROMA_IDLE_TIMEOUT_SECONDS
+)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Unit tests import the service modules directly, as the API does when run
+# from api/endpoints. Install api/endpoints/requirements.txt, then run from
+# api/tests: python -m pytest -q
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "endpoints"))
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+import ssl
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "endpoints"))
+
+from langchain_openai import ChatOpenAI
+from services.llm_client_pool import LLMClientPool
+
+# Streams a short completion from a local OpenAI-compatible stub and compares
+# time to first token for a fresh ChatOpenAI per request against the pool.
+#
+# Plain HTTP measures TCP connect savings. To include the TLS handshake, pass a
+# self-signed certificate and trust it for the client:
+#   STUB_CERTFILE=cert.pem STUB_KEYFILE=key.pem SSL_CERT_FILE=cert.pem python llm_pool_bench.py
+# (set LLM_HTTP2=false, the stub only speaks HTTP/1.1)
+HOST = "localhost"
+PORT = int(os.environ.get("STUB_PORT", 8765))
+CERTFILE = os.environ.get("STUB_CERTFILE")
+KEYFILE = os.environ.get("STUB_KEYFILE")
+NUM_REQUESTS = int(os.environ.get("NUM_REQUESTS", 100))
+TOKENS = ["Hello", " from", " the", " stub", "."]
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in TOKENS:
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: str):
+        payload = data.encode()
+        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+        self.wfile.flush()
+
+def start_stub_server():
+    server = ThreadingHTTPServer((HOST, PORT), StubHandler)
+    scheme = "http"
+    if CERTFILE and KEYFILE:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(CERTFILE, KEYFILE)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://{HOST}:{PORT}/v1"
+
+async def time_to_first_token(llm):
+    start = time.perf_counter()
+    async for _ in llm.astream("Hi"):
+        return (time.perf_counter() - start) * 1000
+
+async def run(name, get_llm):
+    latencies = []
+    for _ in range(NUM_REQUESTS):
+        latencies.append(await time_to_first_token(get_llm()))
+    latencies.sort()
+    print(f"\n{name}")
+    print(f"  requests: {NUM_REQUESTS}")
+    print(f"  TTFT p50: {statistics.median(latencies):.2f} ms")
+    print(f"  TTFT p95: {latencies[int(len(latencies) * 0.95) - 1]:.2f} ms")
+
+async def main():
+    server, base_url = start_stub_server()
+    pool = LLMClientPool()
+    try:
+        await run(
+            "Before: new ChatOpenAI per request",
+            lambda: ChatOpenAI(model="stub", base_url=base_url, api_key="stub-key")
+        )
+        await run(
+            "After: pooled keep-alive client",
+            lambda: pool.get_chat_model("OpenAI", model="stub", base_url=base_url, api_key="stub-key")
+        )
+        print(f"\nPool stats: {json.dumps(pool.stats(), indent=2)}")
+    finally:
+        await pool.aclose()
+        server.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Compares the old per-request client against one shared pooled client.
+# Run against a local mongod: MONGO_URI=mongodb://localhost:27017 python mongo_pool_bench.py
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = "rag_bench"
+NUM_REQUESTS = int(os.environ.get("NUM_REQUESTS", 200))
+CONCURRENCY = int(os.environ.get("CONCURRENCY", 10))
+
+class MongoPoolBenchmark:
+    def __init__(self):
+        self.agent_id = str(uuid.uuid4())
+        self.shared_client = AsyncIOMotorClient(MONGO_URI, maxPoolSize=CONCURRENCY)
+
+    async def setup(self):
+        db = self.shared_client[DB_NAME]
+        await db.agents.create_index("id")
+        await db.agents.insert_one({"id": self.agent_id, "user_id": "bench_user", "config": {}})
+
+    async def teardown(self):
+        await self.shared_client.drop_database(DB_NAME)
+        self.shared_client.close()
+
+    async def per_request_client(self):
+        # What get_db used to do on every request
+        client = AsyncIOMotorClient(MONGO_URI)
+        try:
+            await client[DB_NAME].agents.find_one({"id": self.agent_id})
+        finally:
+            client.close()
+
+    async def shared_pool_client(self):
+        await self.shared_client[DB_NAME].agents.find_one({"id": self.agent_id})
+
+    async def run(self, name, request):
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+        latencies = []
+
+        async def timed():
+            async with semaphore:
+                start = time.perf_counter()
+                await request()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(timed() for _ in range(NUM_REQUESTS)))
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        print(f"\n{name}")
+        print(f"  requests: {NUM_REQUESTS}, concurrency: {CONCURRENCY}")
+        print(f"  throughput: {NUM_REQUESTS / elapsed:.1f} req/s")
+        print(f"  p50: {statistics.median(latencies):.2f} ms")
+        print(f"  p95: {latencies[int(len(latencies) * 0.95) - 1]:.2f} ms")
+        print(f"  p99: {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms")
+
+    async def run_all(self):
+        await self.setup()
+        try:
+            # Warm the shared pool so the comparison reflects steady state
+            await self.shared_pool_client()
+            await self.run("Before: new client per request", self.per_request_client)
+            await self.run("After: shared pooled client", self.shared_pool_client)
+        finally:
+            await self.teardown()
+
+if __name__ == "__main__":
+    asyncio.run(MongoPoolBenchmark().run_all())
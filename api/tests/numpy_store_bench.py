@@ -0,0 +1,109 @@
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import chromadb
+import numpy as np
+from chromadb.config import Settings as ChromaSettings
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "endpoints"))
+
+from services.numpy_vector_store import QUANTIZED_MODES, NumpyIndex, normalize_rows
+from services.vector_store_registry import VECTOR_OVERHEAD_BYTES
+
+# Compares recall@k, memory and single-threaded QPS of the NumPy store
+# (float32, int8 and binary) against plain Chroma, on clustered synthetic
+# embeddings, and how long a fresh NumPy index takes to open. Recall is
+# measured against exact brute-force search.
+#   NUM_VECTORS=100000 DIMENSION=1536 RESCORE_MULTIPLIER=4 python numpy_store_bench.py
+NUM_VECTORS = int(os.environ.get("NUM_VECTORS", 20000))
+DIMENSION = int(os.environ.get("DIMENSION", 768))
+NUM_QUERIES = int(os.environ.get("NUM_QUERIES", 200))
+NUM_CLUSTERS = int(os.environ.get("NUM_CLUSTERS", 100))
+K = int(os.environ.get("K", 4))
+RESCORE_MULTIPLIER = int(os.environ.get("RESCORE_MULTIPLIER", 4))
+BATCH_SIZE = 2000
+
+def directory_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+class QuantizedStoreBenchmark:
+    def __init__(self, workdir: Path):
+        self.workdir = workdir
+        rng = np.random.default_rng(0)
+        # Chunk embeddings cluster by topic; queries land near existing chunks
+        centers = rng.normal(size=(NUM_CLUSTERS, DIMENSION))
+        assignments = rng.integers(0, NUM_CLUSTERS, NUM_VECTORS)
+        self.vectors = normalize_rows(centers[assignments] + rng.normal(scale=0.6, size=(NUM_VECTORS, DIMENSION)))
+        picks = rng.integers(0, NUM_VECTORS, NUM_QUERIES)
+        self.queries = normalize_rows(self.vectors[picks] + rng.normal(scale=0.05, size=(NUM_QUERIES, DIMENSION)))
+        self.ids = [str(i) for i in range(NUM_VECTORS)]
+        self.truth = [set(np.argsort(-(self.vectors @ query))[:K].tolist()) for query in self.queries]
+
+    def recall(self, results) -> float:
+        return float(np.mean([len(set(rows) & truth) / K for rows, truth in zip(results, self.truth)]))
+
+    def run_chroma(self):
+        path = self.workdir / "chroma"
+        client = chromadb.PersistentClient(path=str(path), settings=ChromaSettings(anonymized_telemetry=False))
+        collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+        for start in range(0, NUM_VECTORS, BATCH_SIZE):
+            end = start + BATCH_SIZE
+            collection.add(
+                ids=self.ids[start:end],
+                embeddings=self.vectors[start:end].tolist(),
+                documents=[f"chunk {i}" for i in range(start, min(end, NUM_VECTORS))]
+            )
+        results = []
+        start = time.perf_counter()
+        for query in self.queries:
+            found = collection.query(query_embeddings=[query.tolist()], n_results=K)
+            results.append([int(i) for i in found["ids"][0]])
+        elapsed = time.perf_counter() - start
+        self.report("chroma", results, elapsed, NUM_VECTORS * (DIMENSION * 4 + VECTOR_OVERHEAD_BYTES), directory_bytes(path))
+
+    def run_numpy(self, mode: str):
+        path = self.workdir / mode
+        index = NumpyIndex(path, mode)
+        for start in range(0, NUM_VECTORS, BATCH_SIZE):
+            end = start + BATCH_SIZE
+            index.add_vectors(
+                self.ids[start:end],
+                self.vectors[start:end],
+                [f"chunk {i}" for i in range(start, min(end, NUM_VECTORS))],
+                [{} for _ in range(start, min(end, NUM_VECTORS))]
+            )
+        # What a fresh process pays to open the collection
+        start = time.perf_counter()
+        index = NumpyIndex(path, mode)
+        print(f"{mode:>7}: opened in {(time.perf_counter() - start) * 1000:.1f} ms")
+        pool = K * RESCORE_MULTIPLIER if mode in QUANTIZED_MODES else K
+        results = []
+        start = time.perf_counter()
+        for query in self.queries:
+            with index.pinned() as snapshot:
+                rows, _, _ = index.search(snapshot, query, pool)
+                results.append([int(document.id) for document in index.documents(snapshot, rows[:K])])
+        elapsed = time.perf_counter() - start
+        self.report(mode, results, elapsed, index.resident_bytes, directory_bytes(path))
+
+    def report(self, name: str, results, elapsed: float, resident_bytes: int, disk_bytes: int):
+        print(
+            f"{name:>7}: recall@{K} {self.recall(results):.3f}  "
+            f"qps {NUM_QUERIES / elapsed:8.1f}  "
+            f"resident {resident_bytes / 1024 ** 2:8.1f} MiB  "
+            f"disk {disk_bytes / 1024 ** 2:8.1f} MiB"
+        )
+
+def main():
+    print(f"{NUM_VECTORS} vectors, {DIMENSION} dimensions, {NUM_QUERIES} queries, rescoring {K * RESCORE_MULTIPLIER}")
+    with tempfile.TemporaryDirectory() as workdir:
+        benchmark = QuantizedStoreBenchmark(Path(workdir))
+        benchmark.run_chroma()
+        for mode in ("float32", "int8", "binary"):
+            benchmark.run_numpy(mode)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import pytest
+from langchain_core.documents import Document
+from services.bm25_index import BM25Index, BM25IndexRegistry, tokenize
+
+class FakeVectorStore:
+    """Chroma's get() paging over a fixed list of chunks."""
+
+    def __init__(self, texts):
+        self.ids = [f"chunk-{number}" for number in range(len(texts))]
+        self.texts = texts
+
+    def get(self, include=None, limit=None, offset=0):
+        end = offset + limit if limit else None
+        return {
+            "ids": self.ids[offset:end],
+            "documents": self.texts[offset:end],
+            "metadatas": [{"source": id} for id in self.ids[offset:end]]
+        }
+
+TEXTS = [
+    "The ab-120 router ships with firmware v2.1",
+    "Routers and switches for small offices",
+    "Replacement power supply for the ab-120, 9.99 dollars",
+]
+
+def built_index(path, texts=TEXTS):
+    index = BM25Index(path)
+    index.build()
+    index.add([f"chunk-{number}" for number in range(len(texts))], [Document(page_content=text) for text in texts])
+    return index
+
+def test_tokenize_keeps_skus_and_their_parts():
+    assert tokenize("AB-120 v2.1") == ["ab-120", "ab", "120", "v2.1", "v2", "1"]
+
+def test_exact_terms_rank_first(tmp_path):
+    index = built_index(tmp_path / "products.jsonl")
+    results = index.search("ab-120 power supply", 3)
+    assert [document.id for document, _ in results] == ["chunk-2", "chunk-0"]
+    assert results[0][1] > results[1][1]
+
+def test_index_is_reloaded_from_its_file(tmp_path):
+    built_index(tmp_path / "products.jsonl")
+    reloaded = BM25Index(tmp_path / "products.jsonl")
+    reloaded.build()
+    assert len(reloaded) == 3
+    assert reloaded.search("firmware", 1)[0][0].id == "chunk-0"
+
+def test_unbuilt_index_finds_nothing_and_keeps_writes(tmp_path):
+    index = BM25Index(tmp_path / "products.jsonl")
+    index.add(["chunk-0"], [Document(page_content=TEXTS[0])])
+    assert index.search("firmware", 1) == []
+    assert not index.path.exists()
+    index.build()
+    assert index.search("firmware", 1)[0][0].id == "chunk-0"
+
+def test_registry_backfills_from_the_vector_store(tmp_path):
+    registry = BM25IndexRegistry(str(tmp_path))
+    index = registry.get("products", FakeVectorStore(TEXTS))
+    registry.wait("products", timeout=5)
+    assert len(index) == 3
+    assert index.search("switches", 1)[0][0].metadata == {"source": "chunk-1"}
+    assert (tmp_path / "products.jsonl").exists()
+
+def test_stale_index_of_a_dropped_collection_is_rebuilt(tmp_path):
+    built_index(tmp_path / "products.jsonl")
+    registry = BM25IndexRegistry(str(tmp_path))
+    index = registry.get("products", FakeVectorStore([]))
+    registry.wait("products", timeout=5)
+    assert len(index) == 0
+
+def test_drop_deletes_the_index(tmp_path):
+    registry = BM25IndexRegistry(str(tmp_path))
+    registry.get("products", FakeVectorStore(TEXTS))
+    registry.wait("products", timeout=5)
+    registry.drop("products")
+    assert not (tmp_path / "products.jsonl").exists()
+    assert "products" not in registry.stats()["collections"]
+
+@pytest.mark.parametrize("name", ["../agents", "a/b", "a\\b", ""])
+def test_collection_names_cannot_leave_the_index_dir(tmp_path, name):
+    with pytest.raises(ValueError):
+        BM25IndexRegistry(str(tmp_path)).get(name)
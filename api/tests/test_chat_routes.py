@@ -0,0 +1,61 @@
+import asyncio
+from fastapi import BackgroundTasks
+from core.models import ChatRequestWithID, RAGConfig
+from config.settings import settings
+from api.routes import chat as chat_routes
+from services.chat_store import chat_store
+from test_chat_store import FakeDatabase
+
+CONFIG = RAGConfig(llm="model", embeddings_model="embeddings", collection="docs")
+
+class FakeRequest:
+    def __init__(self, accept):
+        self.headers = {"accept": accept}
+
+    async def is_disconnected(self):
+        return False
+
+class FakeLLMService:
+    def get_endpoint(self, config):
+        return "endpoint", None
+
+def answer_chain():
+    async def astream(inputs, config=None):
+        for part in ["Paris is ", "the capital."]:
+            yield {"answer": part}
+
+    chain = type("Chain", (), {})()
+    chain.astream = astream
+    return chain
+
+def patch_chain(monkeypatch):
+    async def get_config(db, agent_id):
+        return CONFIG
+
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", False)
+    monkeypatch.setattr(chat_routes.agent_config_cache, "get_config", get_config)
+    monkeypatch.setattr(chat_routes, "get_embeddings_service", lambda *args: None)
+    monkeypatch.setattr(chat_routes, "get_rag_service", lambda *args: None)
+    monkeypatch.setattr(chat_routes.chain_cache, "get_or_build", lambda *args: answer_chain())
+
+async def consume(response, background_tasks):
+    body = "".join([chunk async for chunk in response.body_iterator])
+    await background_tasks()
+    return body
+
+def test_chat_with_id_stores_plain_text_even_when_sse_is_accepted(monkeypatch):
+    patch_chain(monkeypatch)
+
+    async def scenario():
+        db, background_tasks = FakeDatabase(), BackgroundTasks()
+        response = await chat_routes.chatwithid(
+            "chat", "agent", ChatRequestWithID(message="What is the capital of France?"),
+            background_tasks, FakeRequest("text/event-stream"), db, FakeLLMService()
+        )
+        assert response.media_type == "text/plain"
+        assert await consume(response, background_tasks) == "Paris is the capital."
+        session = await chat_store.get_session(db, "chat")
+        messages = await chat_store.get_messages(db, session)
+        assert [message["content"] for message in messages] == ["What is the capital of France?", "Paris is the capital."]
+
+    asyncio.run(scenario())
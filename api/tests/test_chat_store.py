@@ -0,0 +1,177 @@
+import asyncio
+import copy
+import pytest
+from pymongo.errors import DuplicateKeyError
+from services.chat_store import ChatStore, upsert_with_retry
+
+MISSING = object()
+
+def matches(document, query):
+    for key, condition in query.items():
+        value = document.get(key, MISSING)
+        if isinstance(condition, dict):
+            for operator, argument in condition.items():
+                if operator == "$exists" and (value is not MISSING) != argument:
+                    return False
+                if operator == "$gte" and (value is MISSING or value < argument):
+                    return False
+                if operator == "$lte" and (value is MISSING or value > argument):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+def project(document, projection):
+    document = copy.deepcopy(document)
+    for key, spec in (projection or {}).items():
+        if isinstance(spec, dict) and "$slice" in spec and key in document:
+            skip, limit = spec["$slice"] if isinstance(spec["$slice"], list) else (0, spec["$slice"])
+            document[key] = document[key][skip:skip + limit]
+    return document
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, key, direction):
+        self.documents.sort(key=lambda document: document[key], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length):
+        return self.documents
+
+class FakeCollection:
+    """The subset of a Motor collection ChatStore uses; each update is atomic, like Mongo's."""
+
+    def __init__(self):
+        self.documents = []
+
+    def _apply(self, document, update):
+        for key, value in update.get("$set", {}).items():
+            document[key] = value
+        for key, value in update.get("$inc", {}).items():
+            document[key] = document.get(key, 0) + value
+        for key in update.get("$unset", {}):
+            document.pop(key, None)
+        for key, spec in update.get("$push", {}).items():
+            items = document.setdefault(key, [])
+            items.extend(copy.deepcopy(spec["$each"]))
+            for field in spec.get("$sort", {}):
+                items.sort(key=lambda item: item[field])
+
+    async def _update(self, query, update, upsert):
+        # Yield first, so concurrent callers interleave between operations
+        await asyncio.sleep(0)
+        for document in self.documents:
+            if matches(document, query):
+                self._apply(document, update)
+                return document
+        if upsert:
+            document = {key: value for key, value in query.items() if not isinstance(value, dict)}
+            document.update(update.get("$setOnInsert", {}))
+            self._apply(document, update)
+            self.documents.append(document)
+            return document
+        return None
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None, projection=None):
+        document = await self._update(query, update, upsert)
+        return project(document, projection) if document is not None else None
+
+    async def update_one(self, query, update, upsert=False):
+        await self._update(query, update, upsert)
+
+    async def find_one(self, query, projection=None):
+        for document in self.documents:
+            if matches(document, query):
+                return project(document, projection)
+        return None
+
+    def find(self, query, projection=None):
+        return FakeCursor([copy.deepcopy(document) for document in self.documents if matches(document, query)])
+
+    async def insert_one(self, document):
+        self.documents.append(copy.deepcopy(document))
+
+class FakeDatabase:
+    def __init__(self):
+        self.chats = FakeCollection()
+        self.chat_buckets = FakeCollection()
+
+def turn(number):
+    return [
+        {"role": "user", "content": f"question {number}"},
+        {"role": "assistant", "content": f"answer {number}"},
+    ]
+
+async def all_messages(store, db, uid, skip=0, limit=None):
+    session = await store.get_session(db, uid)
+    return await store.get_messages(db, session, skip, limit)
+
+def test_positions_continue_across_buckets():
+    async def scenario():
+        store, db = ChatStore(bucket_size=3), FakeDatabase()
+        for number in range(4):
+            count = await store.append(db, "chat", "agent", turn(number))
+        assert count == 8
+        assert len(db.chat_buckets.documents) == 3
+        messages = await all_messages(store, db, "chat")
+        assert [message["content"] for message in messages] == [
+            text for number in range(4) for text in (f"question {number}", f"answer {number}")
+        ]
+        window = await all_messages(store, db, "chat", skip=2, limit=4)
+        assert [message["content"] for message in window] == ["question 1", "answer 1", "question 2", "answer 2"]
+
+    asyncio.run(scenario())
+
+def test_concurrent_turns_get_disjoint_positions():
+    async def scenario():
+        store, db = ChatStore(bucket_size=4), FakeDatabase()
+        await asyncio.gather(*(store.append(db, "chat", "agent", turn(number)) for number in range(10)))
+        assert len(db.chats.documents) == 1
+        assert db.chats.documents[0]["message_count"] == 20
+        positions = [
+            message["position"]
+            for bucket in db.chat_buckets.documents
+            for message in bucket["messages"]
+        ]
+        assert sorted(positions) == list(range(20))
+        messages = await all_messages(store, db, "chat")
+        # Each turn's question is directly followed by its answer
+        for question, answer in zip(messages[::2], messages[1::2]):
+            assert question["content"].replace("question", "answer") == answer["content"]
+
+    asyncio.run(scenario())
+
+def test_legacy_inline_session_is_migrated_on_append():
+    async def scenario():
+        store, db = ChatStore(bucket_size=2), FakeDatabase()
+        await db.chats.insert_one({"uid": "chat", "messages": turn(0) + turn(1)})
+        legacy = await all_messages(store, db, "chat", skip=1, limit=2)
+        assert [message["content"] for message in legacy] == ["answer 0", "question 1"]
+
+        assert await store.append(db, "chat", "agent", turn(2)) == 6
+        messages = await all_messages(store, db, "chat")
+        assert [message["content"] for message in messages][-2:] == ["question 2", "answer 2"]
+        assert "messages" not in db.chats.documents[0]
+
+    asyncio.run(scenario())
+
+def test_upsert_is_retried_after_losing_a_race():
+    attempts = []
+
+    async def operation():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise DuplicateKeyError("E11000 duplicate key error")
+        return "updated"
+
+    assert asyncio.run(upsert_with_retry(operation)) == "updated"
+    assert len(attempts) == 2
+
+def test_upsert_gives_up_after_repeated_conflicts():
+    async def operation():
+        raise DuplicateKeyError("E11000 duplicate key error")
+
+    with pytest.raises(DuplicateKeyError):
+        asyncio.run(upsert_with_retry(operation))
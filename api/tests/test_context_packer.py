@@ -0,0 +1,54 @@
+from langchain_core.documents import Document
+from services.context_packer import ContextPacker, MIN_PARTIAL_TOKENS
+from services.tokens import count_tokens
+
+def words(start, end, prefix="word"):
+    return " ".join(f"{prefix}{number}" for number in range(start, end))
+
+def chunk(text, score, source="guide.pdf"):
+    return Document(page_content=text, metadata={"source": source, "score": score})
+
+def packer():
+    return ContextPacker(default_budget=4000, duplicate_threshold=0.8, min_overlap=20)
+
+def test_documents_are_ordered_by_score():
+    documents = [chunk(words(0, 20, "low"), 0.2), chunk(words(0, 20, "high"), 0.9), chunk(words(0, 20, "mid"), 0.5)]
+    packed, _, _ = packer().pack(documents, 4000)
+    assert [document.metadata["score"] for document in packed] == [0.9, 0.5, 0.2]
+
+def test_near_duplicates_and_contained_chunks_are_dropped():
+    text = words(0, 100)
+    documents = [
+        chunk(text, 0.9),
+        chunk(words(0, 100).replace("word99", "other99"), 0.8, source="copy.pdf"),
+        chunk(words(10, 30), 0.7, source="excerpt.pdf"),
+    ]
+    packed, _, _ = packer().pack(documents, 4000)
+    assert [document.page_content for document in packed] == [text]
+
+def test_overlap_with_a_neighbouring_chunk_is_cut():
+    documents = [chunk(words(0, 60), 0.9), chunk(words(40, 100), 0.8)]
+    packed, tokens_before, tokens_after = packer().pack(documents, 4000)
+    assert [document.page_content for document in packed] == [words(0, 60), words(60, 100)]
+    assert tokens_after < tokens_before
+
+def test_overlap_is_kept_across_sources():
+    documents = [chunk(words(0, 60), 0.9), chunk(words(40, 100), 0.8, source="other.pdf")]
+    packed, _, _ = packer().pack(documents, 4000)
+    assert packed[1].page_content == words(40, 100)
+
+def test_context_is_trimmed_to_the_budget():
+    first, second = words(0, 200, "first"), words(0, 400, "second")
+    documents = [chunk(first, 0.9), chunk(second, 0.8, source="other.pdf")]
+
+    budget = count_tokens(first) + MIN_PARTIAL_TOKENS * 2
+    packed, _, tokens_after = packer().pack(documents, budget)
+    assert len(packed) == 2
+    assert second.startswith(packed[1].page_content)
+    assert tokens_after == budget
+
+    # Too little left for a useful part of the second chunk
+    budget = count_tokens(first) + MIN_PARTIAL_TOKENS - 1
+    packed, _, tokens_after = packer().pack(documents, budget)
+    assert [document.page_content for document in packed] == [first]
+    assert tokens_after == count_tokens(first)
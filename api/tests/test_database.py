@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from pymongo.errors import OperationFailure
+from core import database
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length=None):
+        return self.documents[:length]
+
+class IndexedCollection:
+    """Holds one index per key list, like the server does, over plain documents."""
+
+    def __init__(self, documents, indexes):
+        self.documents = documents
+        self.indexes = dict(indexes)
+
+    async def create_index(self, keys, unique=False):
+        key = tuple(keys)
+        if key in self.indexes:
+            if self.indexes[key] != unique:
+                raise OperationFailure("Index already exists with different options", code=85)
+            return
+        values = [tuple(document.get(field) for field, _ in keys) for document in self.documents]
+        if unique and len(set(values)) < len(values):
+            raise OperationFailure("E11000 duplicate key error", code=11000)
+        self.indexes[key] = unique
+
+    async def drop_index(self, keys):
+        del self.indexes[tuple(keys)]
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        fields = list(pipeline[0]["$group"]["_id"])
+        counts = {}
+        for document in self.documents:
+            value = tuple(document.get(field) for field in fields)
+            counts[value] = counts.get(value, 0) + 1
+        return FakeCursor([
+            {"_id": dict(zip(fields, value)), "count": count} for value, count in counts.items() if count > 1
+        ])
+
+UID = [("uid", 1)]
+
+def test_plain_index_is_made_unique():
+    collection = IndexedCollection([{"uid": "a"}, {"uid": "b"}], {tuple(UID): False})
+    asyncio.run(database.rebuild_index(collection, UID, {"unique": True}))
+    assert collection.indexes == {tuple(UID): True}
+
+def test_index_is_kept_when_duplicates_prevent_a_unique_one():
+    collection = IndexedCollection([{"uid": "a"}, {"uid": "a"}], {tuple(UID): False})
+    with pytest.raises(RuntimeError, match="2 documents share"):
+        asyncio.run(database.rebuild_index(collection, UID, {"unique": True}))
+    assert collection.indexes == {tuple(UID): False}
+
+def test_ensure_indexes_fails_without_a_unique_index(monkeypatch):
+    collections = {}
+
+    def collection(name):
+        documents = [{"uid": "a"}, {"uid": "a"}] if name == "chats" else []
+        return collections.setdefault(name, IndexedCollection(documents, {tuple(UID): False} if name == "chats" else {}))
+
+    db = type("Database", (), {"__getitem__": lambda self, name: collection(name)})()
+    with pytest.raises(RuntimeError, match="chats"):
+        asyncio.run(database.ensure_indexes(db))
+    # Every other index was still created
+    assert collections["chat_buckets"].indexes
+    assert collections["chats"].indexes == {tuple(UID): False}
@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from services.llm_scheduler import LLMScheduler, AdmissionRejected, PRIORITY_CHAT, PRIORITY_EVALUATION
+
+def test_waiters_are_admitted_by_priority():
+    async def scenario():
+        scheduler = LLMScheduler(endpoint_limit=1, agent_limit=8, max_queue=8)
+        running = await scheduler.acquire("endpoint", "agent")
+        order = []
+
+        async def wait(name, priority):
+            ticket = await scheduler.acquire("endpoint", "agent", priority, timeout=1)
+            order.append(name)
+            ticket.release()
+
+        waiters = [
+            asyncio.create_task(wait("evaluation", PRIORITY_EVALUATION)),
+            asyncio.create_task(wait("chat", PRIORITY_CHAT)),
+        ]
+        await asyncio.sleep(0)
+        running.release()
+        await asyncio.gather(*waiters)
+        assert order == ["chat", "evaluation"]
+        assert scheduler.stats()["active_agents"] == 0
+
+    asyncio.run(scenario())
+
+def test_full_queue_is_rejected_with_503():
+    async def scenario():
+        scheduler = LLMScheduler(endpoint_limit=1, agent_limit=8, max_queue=1)
+        running = await scheduler.acquire("endpoint", "agent")
+        waiter = asyncio.create_task(scheduler.acquire("endpoint", "agent", timeout=1))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await scheduler.acquire("endpoint", "agent", timeout=1)
+        assert rejected.value.status_code == 503
+        running.release()
+        (await waiter).release()
+
+    asyncio.run(scenario())
+
+def test_agent_over_its_cap_times_out_with_429():
+    async def scenario():
+        scheduler = LLMScheduler(endpoint_limit=8, agent_limit=1, max_queue=8)
+        running = await scheduler.acquire("endpoint", "agent")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await scheduler.acquire("endpoint", "agent", timeout=0.01)
+        assert rejected.value.status_code == 429
+        # Other agents on the same endpoint are not held back
+        (await scheduler.acquire("endpoint", "other", timeout=0.01)).release()
+        running.release()
+        assert scheduler.stats()["waiting"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+from config.settings import settings
+from services.numpy_vector_store import NumpyIndex, drop_index, open_index
+
+DIMENSION = 8
+
+def add_basis(index, numbers, prefix="doc"):
+    index.add_vectors(
+        [f"{prefix}-{number}" for number in numbers],
+        np.eye(DIMENSION, dtype=np.float32)[numbers],
+        [f"text {number}" for number in numbers],
+        [{"number": number} for number in numbers]
+    )
+
+def top_id(index, number):
+    with index.pinned() as snapshot:
+        rows, scores, _ = index.search(snapshot, np.eye(DIMENSION, dtype=np.float32)[number], 1)
+        return index.documents(snapshot, rows[:1])[0].id, float(scores[0])
+
+def snapshot_ids(index, snapshot):
+    return [document.id for document in index.documents(snapshot, index.live_rows(snapshot))]
+
+def live_ids(index):
+    with index.pinned() as snapshot:
+        return snapshot_ids(index, snapshot)
+
+@pytest.mark.parametrize("mode", ["float32", "int8", "binary"])
+def test_search_returns_the_exact_nearest_row(tmp_path, mode):
+    index = NumpyIndex(tmp_path / "collection", mode)
+    add_basis(index, list(range(DIMENSION)))
+    assert len(index) == DIMENSION
+    document_id, score = top_id(index, 3)
+    assert document_id == "doc-3"
+    assert score == pytest.approx(1.0)
+
+def test_readded_and_deleted_ids_become_dead_rows(tmp_path):
+    index = NumpyIndex(tmp_path / "collection", "float32")
+    add_basis(index, [0, 1, 2])
+    # doc-1 is re-added with another vector
+    index.add_vectors(["doc-1"], np.eye(DIMENSION, dtype=np.float32)[[5]], ["text 1 again"], [{}])
+    assert index.delete(["doc-2", "missing"]) == 1
+    assert len(index) == 2
+    assert index.dead_rows == 2
+    assert sorted(live_ids(index)) == ["doc-0", "doc-1"]
+    assert top_id(index, 5)[0] == "doc-1"
+
+def test_compaction_writes_a_new_generation(tmp_path):
+    directory = tmp_path / "collection"
+    index = NumpyIndex(directory, "int8")
+    add_basis(index, list(range(DIMENSION)))
+    index.delete(["doc-0", "doc-1"])
+
+    index.compact()
+    assert index.generation == 1
+    assert index.dead_rows == 0
+    assert live_ids(index) == [f"doc-{number}" for number in range(2, DIMENSION)]
+    assert top_id(index, 4)[0] == "doc-4"
+    # Nobody reads generation 0 any more
+    assert not (directory / "documents.jsonl").exists()
+
+def test_pinned_snapshot_survives_compactions_until_released(tmp_path):
+    directory = tmp_path / "collection"
+    index = NumpyIndex(directory, "float32")
+    add_basis(index, list(range(DIMENSION)))
+    index.delete(["doc-0"])
+
+    with index.pinned() as held:
+        expected = snapshot_ids(index, held)
+        index.compact()
+        index.delete(["doc-1"])
+        index.compact()
+        assert index.generation == 2
+        # Rows of the held snapshot still resolve against its generation
+        assert snapshot_ids(index, held) == expected
+        assert not (directory / "generation-1").exists()
+
+    assert not (directory / "documents.jsonl").exists()
+    assert live_ids(index) == [f"doc-{number}" for number in range(2, DIMENSION)]
+
+def test_index_is_reloaded_with_deletions_and_generation(tmp_path):
+    directory = tmp_path / "collection"
+    index = NumpyIndex(directory, "binary")
+    add_basis(index, list(range(4)))
+    index.compact()
+    add_basis(index, [4, 5])
+    index.delete(["doc-2"])
+
+    reloaded = NumpyIndex(directory, "float32")
+    assert reloaded.mode == "binary"
+    assert reloaded.generation == index.generation
+    assert sorted(live_ids(reloaded)) == ["doc-0", "doc-1", "doc-3", "doc-4", "doc-5"]
+    assert top_id(reloaded, 5)[0] == "doc-5"
+
+def test_write_cut_short_is_ignored_on_load(tmp_path):
+    directory = tmp_path / "collection"
+    add_basis(NumpyIndex(directory, "float32"), [0, 1])
+    with (directory / "documents.jsonl").open("ab") as f:
+        f.write(b'{"id": "doc-2", "te')
+    with (directory / "vectors.f32").open("ab") as f:
+        np.ones(DIMENSION // 2, dtype=np.float32).tofile(f)
+
+    reloaded = NumpyIndex(directory, "float32")
+    assert len(reloaded) == 2
+    # Appends continue after the rows that were complete
+    add_basis(reloaded, [2])
+    assert top_id(NumpyIndex(directory, "float32"), 2)[0] == "doc-2"
+
+def test_dropped_collection_is_recreated_empty(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "NUMPY_STORE_DIR", str(tmp_path / "numpy"))
+    monkeypatch.setattr(settings, "QUANTIZED_STORE_DIR", str(tmp_path / "quantized"))
+    add_basis(open_index("products", "float32"), [0, 1])
+    drop_index("products")
+    assert not (tmp_path / "numpy" / "products").exists()
+    assert len(open_index("products", "float32")) == 0
@@ -0,0 +1,39 @@
+import asyncio
+from services.request_coalescer import RequestCoalescer
+
+def test_on_done_runs_when_the_flight_is_cancelled_before_it_starts():
+    async def scenario():
+        started, done = [], []
+
+        async def produce(publish):
+            started.append(True)
+
+        coalescer = RequestCoalescer(enabled=True, max_events=16)
+        events, leader = coalescer.join("key", produce, lambda: done.append(True))
+        assert leader
+        # The client leaves before the flight task was ever scheduled
+        await events.aclose()
+        await asyncio.wait([events.flight._task])
+        await asyncio.sleep(0)
+        assert not started
+        assert done == [True]
+        assert not coalescer.in_flight("key")
+
+    asyncio.run(scenario())
+
+def test_on_done_runs_once_the_flight_has_finished():
+    async def scenario():
+        done = []
+
+        async def produce(publish):
+            publish("token", "hello")
+
+        coalescer = RequestCoalescer(enabled=True, max_events=16)
+        events, _ = coalescer.join("key", produce, lambda: done.append(True))
+        follower, leader = coalescer.join("key", produce, lambda: done.append(False))
+        assert not leader
+        assert [event async for event in events] == [("token", "hello")]
+        await asyncio.sleep(0)
+        assert done == [True]
+
+    asyncio.run(scenario())
@@ -0,0 +1,45 @@
+import pytest
+from langchain_core.documents import Document
+from services.retrievers import matches_filter, reciprocal_rank_fusion
+
+def ranking(*texts):
+    return [Document(page_content=text) for text in texts]
+
+def test_fusion_favours_documents_both_rankings_agree_on():
+    dense = ranking("a", "b", "c")
+    sparse = ranking("c", "d", "a")
+    fused = reciprocal_rank_fusion([dense, sparse], k=3, rrf_k=60)
+    assert [document.page_content for document in fused] == ["a", "c", "b"]
+    assert fused[0].metadata["score"] == 1 / 61 + 1 / 63
+
+def test_fusion_keeps_the_first_copy_and_caps_at_k():
+    dense = [Document(page_content="a", metadata={"source": "dense"})]
+    sparse = [Document(page_content="a", metadata={"source": "sparse"}), Document(page_content="b")]
+    fused = reciprocal_rank_fusion([dense, sparse], k=1, rrf_k=60)
+    assert len(fused) == 1
+    assert fused[0].metadata["source"] == "dense"
+
+def test_fusion_with_an_empty_ranking_keeps_the_other_order():
+    fused = reciprocal_rank_fusion([ranking("a", "b"), []], k=4, rrf_k=60)
+    assert [document.page_content for document in fused] == ["a", "b"]
+
+METADATA = {"source": "manual.pdf", "page": 12, "year": 2023}
+
+@pytest.mark.parametrize("where, expected", [
+    ({"source": "manual.pdf"}, True),
+    ({"page": {"$gt": 12}}, False),
+    ({"page": {"$gte": 12, "$lt": 20}}, True),
+    ({"year": {"$lte": 2022}}, False),
+    ({"missing": {"$gt": 0}}, False),
+    ({"source": {"$gt": 3}}, False),
+    ({"source": {"$in": ["manual.pdf", "faq.pdf"]}}, True),
+    ({"$or": [{"page": {"$lt": 5}}, {"year": {"$ne": 2020}}]}, True),
+    ({"$and": [{"page": 12}, {"source": {"$nin": ["manual.pdf"]}}]}, False),
+])
+def test_matches_filter(where, expected):
+    assert matches_filter(METADATA, where) is expected
+
+@pytest.mark.parametrize("where", [{"page": {"$regex": "1"}}, {"$not": {"page": 12}}])
+def test_unknown_filter_operators_are_rejected(where):
+    with pytest.raises(ValueError):
+        matches_filter(METADATA, where)
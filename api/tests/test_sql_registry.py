@@ -0,0 +1,104 @@
+from sqlalchemy import text
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from core.models import SQLConfig
+from services.sql_registry import SQLDatabaseRegistry
+
+def sql_config(db_name: str = "shop") -> SQLConfig:
+    return SQLConfig(url="localhost", username="user", password="secret", db_name=db_name)
+
+def sqlite_registry(**kwargs) -> SQLDatabaseRegistry:
+    options = {"max_engines": 4, "schema_ttl": 600, "prune_threshold": 30, "max_tables": 15}
+    options.update(kwargs)
+    return SQLDatabaseRegistry(**options, uri_for=lambda config: "sqlite://")
+
+def execute(registry: SQLDatabaseRegistry, config: SQLConfig, statement: str):
+    with registry.get_database(config)._engine.begin() as connection:
+        connection.execute(text(statement))
+
+def test_schema_is_cached_until_refresh():
+    registry = sqlite_registry()
+    config = sql_config()
+    execute(registry, config, "CREATE TABLE orders (id INTEGER, customer_id INTEGER)")
+    assert registry.get_schema(config) == {"orders": ["id", "customer_id"]}
+
+    execute(registry, config, "CREATE TABLE customers (id INTEGER, name TEXT)")
+    assert "customers" not in registry.get_schema(config)
+    assert registry.schema_loads == 1
+    assert registry.schema_hits == 1
+
+    assert registry.refresh(config)["customers"] == ["id", "name"]
+    assert registry.schema_loads == 2
+
+def test_expired_schema_is_reloaded():
+    registry = sqlite_registry(schema_ttl=0)
+    config = sql_config()
+    execute(registry, config, "CREATE TABLE orders (id INTEGER)")
+    registry.get_schema(config)
+    execute(registry, config, "CREATE TABLE customers (id INTEGER)")
+    assert set(registry.get_schema(config)) == {"orders", "customers"}
+    assert registry.schema_loads == 2
+
+def test_engines_are_reused_and_evicted():
+    registry = sqlite_registry(max_engines=1)
+    first = registry.get_entry(sql_config("first"))
+    assert registry.get_entry(sql_config("first")) is first
+    registry.get_entry(sql_config("second"))
+    assert registry.get_entry(sql_config("first")) is not first
+    assert registry.stats()["engines"] == 1
+
+def test_small_schemas_are_not_pruned():
+    registry = sqlite_registry(prune_threshold=3)
+    schema = {"orders": ["id"], "customers": ["id"]}
+    assert registry.prune_schema(schema, "how many orders") == schema
+
+def test_prune_keeps_tables_matching_the_question():
+    registry = sqlite_registry(prune_threshold=2, max_tables=2)
+    schema = {
+        "orders": ["id", "customer_id", "total"],
+        "customers": ["id", "fullName"],
+        "audit_log": ["id", "event"],
+        "inventory": ["sku", "quantity"],
+    }
+    pruned = registry.prune_schema(schema, "Which customers placed orders with the largest total?")
+    assert list(pruned) == ["customers", "orders"]
+
+    # Column matches count too, split from camelCase
+    assert list(registry.prune_schema(schema, "full name of everyone")) == ["customers"]
+
+def test_prune_falls_back_to_the_full_schema():
+    registry = sqlite_registry(prune_threshold=1)
+    schema = {"orders": ["id"], "customers": ["id"]}
+    assert registry.prune_schema(schema, "hello there") == schema
+
+def test_table_info_lists_pruned_tables():
+    registry = sqlite_registry(prune_threshold=1, max_tables=1)
+    config = sql_config()
+    execute(registry, config, "CREATE TABLE orders (id INTEGER, total REAL)")
+    execute(registry, config, "CREATE TABLE customers (id INTEGER)")
+    assert registry.get_table_info(config, "sum of order total") == "orders: [id, total]"
+
+def test_slow_engine_does_not_block_other_databases():
+    started, release, created = threading.Event(), threading.Event(), []
+
+    def uri_for(config):
+        created.append(config.db_name)
+        if config.db_name == "slow":
+            started.set()
+            assert release.wait(5)
+        return "sqlite://"
+
+    registry = SQLDatabaseRegistry(max_engines=4, schema_ttl=600, prune_threshold=30, max_tables=15, uri_for=uri_for)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        slow = [pool.submit(registry.get_entry, sql_config("slow")) for _ in range(2)]
+        try:
+            assert started.wait(5)
+            # Created while the "slow" engine is still being set up
+            assert pool.submit(registry.get_entry, sql_config("fast")).result(5) is not None
+        finally:
+            release.set()
+        entries = [future.result(5) for future in slow]
+
+    # Both requests for "slow" share the one engine that was created
+    assert entries[0] is entries[1]
+    assert created.count("slow") == 1
@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from services.vector_store_registry import VectorStoreRegistry
+
+class SlowOpen:
+    """Stands in for _open_vector_store, holding opens of one collection until released."""
+
+    def __init__(self, slow_collection):
+        self.slow_collection = slow_collection
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.opened = []
+
+    def __call__(self, collection_name, embeddings, persist_directory, storage):
+        self.opened.append(collection_name)
+        if collection_name == self.slow_collection:
+            self.started.set()
+            assert self.release.wait(5)
+        return object()
+
+def registry_with(monkeypatch, open_store):
+    registry = VectorStoreRegistry(memory_limit_bytes=0, idle_timeout=60)
+    monkeypatch.setattr(registry, "_open_vector_store", open_store)
+    monkeypatch.setattr(registry, "_refresh_accounting", lambda handle: None)
+    return registry
+
+def test_slow_open_does_not_block_other_collections(monkeypatch):
+    open_store = SlowOpen("slow")
+    registry = registry_with(monkeypatch, open_store)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        slow = [pool.submit(registry.get_handle, "slow", None, "embeddings", "/data", "chroma") for _ in range(2)]
+        try:
+            assert open_store.started.wait(5)
+            # Served while "slow" is still being opened
+            fast = pool.submit(registry.get_handle, "fast", None, "embeddings", "/data", "chroma")
+            assert fast.result(5).collection_name == "fast"
+        finally:
+            open_store.release.set()
+        handles = [future.result(5) for future in slow]
+
+    # Both requests for "slow" share the one store that was opened
+    assert handles[0] is handles[1]
+    assert open_store.opened.count("slow") == 1
+    assert registry.misses == 2 and registry.hits == 1
+
+def test_collection_invalidated_while_opening_is_not_cached(monkeypatch):
+    open_store = SlowOpen("docs")
+    registry = registry_with(monkeypatch, open_store)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        opening = pool.submit(registry.get_handle, "docs", None, "embeddings", "/data", "chroma")
+        assert open_store.started.wait(5)
+        registry.invalidate("docs")
+        open_store.release.set()
+        opening.result(5)
+
+    assert registry.stats()["handles"] == 0